@@ -0,0 +1,805 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from .mock_mediawiki import MockMediaWikiServer
+
+USER_AGENT = "Geopolitical-Map-Benchmark/1.0"
+
+# ==============================================================================
+# BENCHMARK 1: CATEGORY CRAWLER
+# ==============================================================================
+def benchmark_crawler(
+    concurrency_levels: Iterable[int] = (1, 2, 4, 8, 16),
+    latency: float = 0.05,
+    max_depth: int = 2,
+    requests_per_second: float = None
+):
+    """
+    Crawls a synthetic category tree served by a local mock MediaWiki API and prints
+    wall-clock time per worker count. max_workers=1 is the original serial walk and
+    every other level is checked to produce exactly the same rows.
+    """
+    from .create_wikipedia_index import collect_category_titles
+
+    results = []
+    with MockMediaWikiServer(latency=latency) as server:
+        root = server.wiki["root"]
+        baseline = None
+        for workers in concurrency_levels:
+            start = time.perf_counter()
+            titles = collect_category_titles(
+                root,
+                max_depth,
+                USER_AGENT,
+                max_workers=workers,
+                requests_per_second=requests_per_second,
+                api_url=server.url
+            )
+            elapsed = time.perf_counter() - start
+            if baseline is None:
+                baseline = titles
+            results.append({
+                "workers": workers,
+                "seconds": elapsed,
+                "titles": len(titles),
+                "identical": titles == baseline
+            })
+
+    print(f"\n{'workers':>8} {'seconds':>9} {'speedup':>8} {'titles':>7} identical")
+    for r in results:
+        speedup = results[0]["seconds"] / r["seconds"]
+        print(f"{r['workers']:>8} {r['seconds']:>9.2f} {speedup:>7.1f}x {r['titles']:>7} {r['identical']}")
+    return results
+
+
+# ==============================================================================
+# BENCHMARK 2: ARTICLE DOWNLOADER
+# ==============================================================================
+def benchmark_downloader(
+    concurrency_levels: Iterable[int] = (1, 2, 4, 8),
+    latency: float = 0.2,
+    error_rate: float = 0.02,
+    max_response_chars: int = None
+):
+    """
+    Downloads every page of the synthetic wiki from the mock API, first with the
+    previous serial loop (one 50-title batch at a time, 0.1 s sleep, no continuation
+    or retry) and then with download_batches at each worker count. The mock injects
+    503/429/maxlag errors (and truncates responses when max_response_chars is set),
+    so the baseline also shows how many titles it silently loses.
+    """
+    import requests
+    from .wikipedia_downloader_cleaner import download_batches
+
+    results = []
+    with MockMediaWikiServer(
+        latency=latency,
+        error_rate=error_rate,
+        max_response_chars=max_response_chars
+    ) as server:
+        titles = list(server.wiki["pages"])
+
+        session = requests.Session()
+        start = time.perf_counter()
+        got = set()
+        for i in range(0, len(titles), 50):
+            params = {"action": "query", "prop": "revisions", "titles": "|".join(titles[i:i + 50]),
+                      "rvprop": "content", "format": "json", "rvslots": "main"}
+            try:
+                response = session.get(server.url, params=params, timeout=15)
+                response.raise_for_status()
+                for page in response.json().get("query", {}).get("pages", {}).values():
+                    if page.get("revisions"):
+                        got.add(page["title"])
+            except Exception:
+                pass
+            time.sleep(0.1)
+        results.append({"mode": "serial (baseline)", "seconds": time.perf_counter() - start,
+                        "downloaded": len(got)})
+
+        for workers in concurrency_levels:
+            start = time.perf_counter()
+            got = set()
+            for result in download_batches(
+                titles,
+                api_url=server.url,
+                max_workers=workers,
+                requests_per_second=None,
+                backoff_base=0.05
+            ):
+                got.update(e["title"] for e in result["entries"])
+            results.append({"mode": f"{workers} worker(s)", "seconds": time.perf_counter() - start,
+                            "downloaded": len(got)})
+
+    print(f"\n{'mode':>18} {'seconds':>9} {'speedup':>8} {'downloaded':>11}")
+    for r in results:
+        speedup = results[0]["seconds"] / r["seconds"]
+        print(f"{r['mode']:>18} {r['seconds']:>9.2f} {speedup:>7.1f}x {r['downloaded']:>6}/{len(titles)}")
+    return results
+
+
+# ==============================================================================
+# BENCHMARK 3: WIKITEXT CLEANER
+# ==============================================================================
+def _iter_raw_articles(raw_file: str, limit: int = None):
+    with open(raw_file, 'r', encoding='utf-8') as f:
+        for i, line in enumerate(f):
+            if limit is not None and i >= limit:
+                break
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def synthetic_wikitext(paragraphs: int = 200, nesting: int = 6) -> str:
+    """A relations-style article with refs, nested templates, links, files and tables."""
+    nested = "x"
+    for level in range(nesting):
+        nested = f"{{{{tpl{level}|a=[[Link{level}|label]]|b={nested}}}}}"
+    paragraph = (
+        "'''A-B relations''' are the [[Foreign relations|relations]] between [[A]] and [[B]]."
+        "<ref name=\"r\">{{cite web|url=https://example.org/x|title=T}}</ref> Trade grew "
+        f"&ndash; see https://example.com/y.{nested}<!-- note -->\n"
+        "[[File:Flag.png|thumb|The [[flag]] of A]]\n"
+        "{| class=\"wikitable\"\n|-\n| 1962 || Event\n|}\n"
+        "== Section ==\n* [[Treaty of Friendship]] signed.\n\n"
+    )
+    return paragraph * paragraphs + "== References ==\n{{reflist}}\n[[Category:A]]\n"
+
+
+def compare_cleaners(
+    raw_file: str = "rag_corpus_raw.jsonl",
+    limit: int = None,
+    report_file: str = "cleaner_diff_report.txt",
+    worst: int = 20
+):
+    """
+    Differential test of clean_wikitext against clean_wikitext_logic over a raw corpus.
+
+    HTML comments are stripped from the legacy input first, since its comment step is
+    a no-op and removing them is an intended change. Prints how many articles match
+    exactly and the mean word-level similarity, and writes unified diffs of the
+    `worst` articles to `report_file`.
+    """
+    import difflib
+    import re
+    from .wikipedia_downloader_cleaner import clean_wikitext, clean_wikitext_logic
+
+    comment_re = re.compile(r'<!--.*?-->', re.DOTALL)
+    identical = 0
+    similarities = []
+    diffs = []
+
+    for article in _iter_raw_articles(raw_file, limit):
+        raw = article["raw_content"]
+        legacy = clean_wikitext_logic(comment_re.sub('', raw))
+        new = clean_wikitext(raw)
+        if legacy == new:
+            identical += 1
+            similarities.append(1.0)
+            continue
+        ratio = difflib.SequenceMatcher(None, legacy.split(), new.split()).ratio()
+        similarities.append(ratio)
+        diffs.append((ratio, article["title"], legacy, new))
+
+    total = len(similarities)
+    if not total:
+        print(f"No articles found in {raw_file}")
+        return None
+
+    diffs.sort(key=lambda d: d[0])
+    with open(report_file, 'w', encoding='utf-8') as f:
+        for ratio, title, legacy, new in diffs[:worst]:
+            f.write(f"### {title} (similarity {ratio:.3f})\n")
+            f.writelines(difflib.unified_diff(
+                legacy.splitlines(keepends=True), new.splitlines(keepends=True),
+                fromfile="clean_wikitext_logic", tofile="clean_wikitext"
+            ))
+            f.write("\n")
+
+    summary = {
+        "articles": total,
+        "identical": identical,
+        "mean_similarity": sum(similarities) / total,
+        "min_similarity": min(similarities)
+    }
+    print(f"{identical}/{total} identical, mean word similarity {summary['mean_similarity']:.4f}, "
+          f"min {summary['min_similarity']:.4f}. Worst diffs in {report_file}")
+    return summary
+
+
+def benchmark_cleaner(raw_file: str = "rag_corpus_raw.jsonl", limit: int = None, repeat: int = 3):
+    """
+    Throughput in MB/s of raw wikitext for both cleaners, best of `repeat` runs.
+    Falls back to synthetic_wikitext() when raw_file does not exist.
+    """
+    import os
+    from .wikipedia_downloader_cleaner import clean_wikitext, clean_wikitext_logic
+
+    if os.path.exists(raw_file):
+        texts = [a["raw_content"] for a in _iter_raw_articles(raw_file, limit)]
+    else:
+        print(f"{raw_file} not found, using synthetic articles.")
+        texts = [synthetic_wikitext(nesting=n) for n in (2, 6, 12) for _ in range(10)]
+    megabytes = sum(len(t.encode('utf-8')) for t in texts) / 1e6
+
+    results = {}
+    for name, cleaner in (("clean_wikitext_logic", clean_wikitext_logic), ("clean_wikitext", clean_wikitext)):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for text in texts:
+                cleaner(text)
+            best = min(best, time.perf_counter() - start)
+        results[name] = megabytes / best
+        print(f"{name:>22}: {results[name]:8.2f} MB/s ({megabytes:.1f} MB in {best:.2f} s)")
+    return results
+
+
+# ==============================================================================
+# BENCHMARK 4: CHUNKER
+# ==============================================================================
+def benchmark_chunker(
+    clean_file: str = "rag_corpus_clean.txt",
+    limit: int = None,
+    concurrency_levels: Iterable[int] = (1, 2, 4)
+):
+    """
+    Compares TokenWindowChunker with the LangChain tiktoken splitter on the clean
+    corpus (or cleaned synthetic articles when clean_file does not exist).
+
+    Prints tokens/s for each splitter and chunk-boundary agreement with LangChain:
+    the share of documents split identically and the mean Jaccard overlap of their
+    chunk sets. The native chunker is measured twice, with its default separators and
+    with LangChain's (no sentence level), since sentence boundaries move cut points on
+    purpose. Finally chunk_records is timed at each worker count.
+    """
+    import os
+    from .chunk_handler import (
+        LANGCHAIN_SEPARATORS, TokenWindowChunker, chunk_records, make_splitter, read_clean_corpus
+    )
+    from .wikipedia_downloader_cleaner import clean_wikitext
+
+    if os.path.exists(clean_file):
+        docs = [r["text"] for r in read_clean_corpus(clean_file)][:limit]
+    else:
+        print(f"{clean_file} not found, using synthetic articles.")
+        docs = [clean_wikitext(synthetic_wikitext(paragraphs=p)) for p in (5, 20, 60) for _ in range(10)]
+
+    native = TokenWindowChunker()
+    n_tokens = sum(len(native.encoding.encode(d, disallowed_special=())) for d in docs)
+    splitters = [
+        ("langchain", make_splitter("langchain")),
+        ("native", native),
+        ("native (langchain seps)", TokenWindowChunker(separators=LANGCHAIN_SEPARATORS)),
+    ]
+
+    outputs = {}
+    print(f"\n{len(docs)} documents, {n_tokens} tokens")
+    print(f"{'splitter':>24} {'seconds':>8} {'tokens/s':>10} {'chunks':>7} {'same docs':>10} {'jaccard':>8}")
+    for name, splitter in splitters:
+        start = time.perf_counter()
+        outputs[name] = [splitter.split_text(d) for d in docs]
+        elapsed = time.perf_counter() - start
+
+        same, jaccard = 0, 0.0
+        for ours, reference in zip(outputs[name], outputs["langchain"]):
+            same += ours == reference
+            a, b = set(ours), set(reference)
+            jaccard += len(a & b) / len(a | b) if a | b else 1.0
+        print(f"{name:>24} {elapsed:>8.2f} {n_tokens / elapsed:>10.0f} "
+              f"{sum(map(len, outputs[name])):>7} {same / len(docs):>9.1%} {jaccard / len(docs):>8.3f}")
+
+    records = [{"title": f"doc{i}", "revid": None, "text": d} for i, d in enumerate(docs)]
+    baseline = None
+    print(f"\n{'workers':>8} {'seconds':>8} {'tokens/s':>10} identical")
+    for workers in concurrency_levels:
+        start = time.perf_counter()
+        chunks = [c["id"] for c in chunk_records(records, workers=workers)]
+        elapsed = time.perf_counter() - start
+        baseline = baseline or chunks
+        print(f"{workers:>8} {elapsed:>8.2f} {n_tokens / elapsed:>10.0f} {chunks == baseline}")
+    return outputs
+
+
+# ==============================================================================
+# BENCHMARK 5: EMBEDDING BACKENDS
+# ==============================================================================
+def benchmark_embedding_backends(
+    chunk_file: str = "rag_corpus_chunked.arrow",
+    limit: int = 2000,
+    backends: Iterable[str] = ("local", "pool", "onnx"),
+    k: int = 10
+):
+    """
+    Encodes the first `limit` chunks with every embedding backend and prints
+    sentences/s plus drift against the in-process model:
+        cosine     - mean and minimum cosine similarity of each chunk's vector
+        overlap@k  - share of the top-k chunks retrieved for each title used as a
+                     query that match the local backend's top-k
+    """
+    import itertools
+    import numpy as np
+    from .embedding_backends import make_encoder
+    from .qdrant_handler import iter_chunk_file
+
+    chunks = list(itertools.islice(iter_chunk_file(chunk_file), limit))
+    texts = [c.get("text", "") for c in chunks]
+    queries = list(dict.fromkeys(c.get("title") or "" for c in chunks))[:200]
+    print(f"\n{len(texts)} chunks, {len(queries)} title queries")
+
+    results = {}
+    reference = None
+    print(f"{'backend':>8} {'sentences/s':>12} {'cos mean':>9} {'cos min':>8} {f'overlap@{k}':>11}")
+    for backend in backends:
+        try:
+            encoder = make_encoder(backend)
+        except Exception as e:
+            print(f"{backend:>8} unavailable: {e}")
+            continue
+        encoder.encode(texts[:32])  # warm-up (pool start, ONNX session)
+        start = time.perf_counter()
+        vectors = encoder.encode(texts)
+        elapsed = time.perf_counter() - start
+        query_vectors = encoder.encode(queries)
+        encoder.close()
+
+        top = np.argsort(-(query_vectors @ vectors.T), axis=1)[:, :k]
+        if reference is None:
+            reference = (vectors, top)
+        cosine = np.sum(vectors * reference[0], axis=1) / (
+            np.linalg.norm(vectors, axis=1) * np.linalg.norm(reference[0], axis=1)
+        )
+        overlap = np.mean([len(set(a) & set(b)) / k for a, b in zip(top, reference[1])])
+        results[backend] = {"sentences_per_s": len(texts) / elapsed, "cos_mean": float(cosine.mean()),
+                            "cos_min": float(cosine.min()), "overlap": float(overlap)}
+        r = results[backend]
+        print(f"{backend:>8} {r['sentences_per_s']:>12.1f} {r['cos_mean']:>9.4f} {r['cos_min']:>8.4f} {r['overlap']:>11.3f}")
+    return results
+
+
+# ==============================================================================
+# BENCHMARK 6: QDRANT COLLECTION PROFILES
+# ==============================================================================
+def estimate_collection_memory(profile: str, points: int, payload_bytes: int, dim: int = 384) -> dict:
+    """
+    Rough RAM and disk footprint in bytes of a collection with a given profile:
+    float32 or int8 vectors, the HNSW base layer (2 * m links of 4 bytes per point)
+    and payloads unless they are stored on disk.
+    """
+    from .qdrant_handler import get_profile
+
+    settings = get_profile(profile)
+    floats = points * dim * 4
+    graph = points * settings["m"] * 2 * 4
+    ram = graph + (points * dim if settings["quantization"] else floats)
+    disk = floats if settings["quantization"] else 0
+    if settings["on_disk_payload"]:
+        disk += payload_bytes
+    else:
+        ram += payload_bytes
+    return {"ram": ram, "disk": disk}
+
+
+def benchmark_collection_profiles(
+    chunk_file: str = "rag_corpus_chunked.arrow",
+    limit: int = 20000,
+    profiles: Iterable[str] = ("default", "int8", "compact"),
+    queries: int = 200,
+    k: int = 10,
+    url: str = None,
+    backend: str = "local"
+):
+    """
+    Loads the first `limit` chunks into one collection per profile and prints, per
+    profile: build time, recall@k against exact cosine search, p50/p99 query latency
+    and the estimated RAM/disk footprint. Queries are the vectors of `queries`
+    random chunks.
+
+    HNSW and quantization only exist on a Qdrant server, so pass its `url`; local
+    mode always searches exhaustively (recall 1.0 for every profile).
+    """
+    import itertools
+    import shutil
+    import tempfile
+    import uuid
+    import numpy as np
+    from qdrant_client import QdrantClient
+    from qdrant_client.http import models
+    from .embedding_backends import make_encoder
+    from .qdrant_handler import build_payload, iter_chunk_file, point_id, search_params, setup_qdrant
+
+    chunks = list(itertools.islice(iter_chunk_file(chunk_file), limit))
+    encoder = make_encoder(backend)
+    vectors = encoder.encode([c.get("text", "") for c in chunks])
+    encoder.close()
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [point_id(c.get("text", "")) for c in chunks]
+    payloads = [build_payload(c) for c in chunks]
+    payload_bytes = sum(len(json.dumps(p, ensure_ascii=False).encode("utf-8")) for p in payloads)
+
+    picks = np.random.default_rng(0).choice(len(chunks), size=min(queries, len(chunks)), replace=False)
+    exact = np.argsort(-(vectors[picks] @ vectors.T), axis=1)[:, :k]
+    exact_ids = [{ids[i] for i in row} for row in exact]
+
+    storage = None if url else tempfile.mkdtemp()
+    client = QdrantClient(url=url) if url else QdrantClient(path=storage)
+    if not url:
+        print("Local mode: searches are exhaustive, only build time and memory differ.")
+    print(f"\n{len(chunks)} points, {len(picks)} queries, payloads {payload_bytes / 1e6:.1f} MB")
+    print(f"{'profile':>8} {'build s':>8} {f'recall@{k}':>10} {'p50 ms':>7} {'p99 ms':>7} {'RAM MB':>7} {'disk MB':>8}")
+
+    results = {}
+    try:
+        for profile in profiles:
+            collection = f"profile_benchmark_{profile}"
+            if client.collection_exists(collection):
+                client.delete_collection(collection)
+            start = time.perf_counter()
+            setup_qdrant(client, profile, collection)
+            # Build the HNSW index whatever the size (the server default skips small segments)
+            client.update_collection(collection, optimizers_config=models.OptimizersConfigDiff(indexing_threshold=1))
+            client.upload_collection(collection, vectors=vectors, payload=payloads, ids=ids, batch_size=512, wait=True)
+            while url and client.get_collection(collection).status != models.CollectionStatus.GREEN:
+                time.sleep(0.2)
+            build = time.perf_counter() - start
+
+            params = search_params(profile)
+            latencies, recalls = [], []
+            for row, pick in enumerate(picks):
+                start = time.perf_counter()
+                hits = client.query_points(collection, query=vectors[pick], limit=k, search_params=params).points
+                latencies.append(time.perf_counter() - start)
+                # Dashed UUIDs from a server, plain hex from local mode
+                found = {uuid.UUID(str(hit.id)).hex for hit in hits}
+                recalls.append(len(found & exact_ids[row]) / k)
+
+            memory = estimate_collection_memory(profile, len(chunks), payload_bytes, vectors.shape[1])
+            results[profile] = {
+                "build_s": build,
+                "recall": float(np.mean(recalls)),
+                "p50_ms": float(np.percentile(latencies, 50) * 1000),
+                "p99_ms": float(np.percentile(latencies, 99) * 1000),
+                "ram_mb": memory["ram"] / 1e6,
+                "disk_mb": memory["disk"] / 1e6,
+            }
+            r = results[profile]
+            print(f"{profile:>8} {r['build_s']:>8.1f} {r['recall']:>10.3f} {r['p50_ms']:>7.2f} "
+                  f"{r['p99_ms']:>7.2f} {r['ram_mb']:>7.1f} {r['disk_mb']:>8.1f}")
+            client.delete_collection(collection)
+    finally:
+        client.close()
+        if storage:
+            shutil.rmtree(storage, ignore_errors=True)
+    return results
+
+
+# ==============================================================================
+# BENCHMARK 7: VECTOR STORES
+# ==============================================================================
+def benchmark_vector_stores(
+    chunk_file: str = "rag_corpus_chunked.arrow",
+    limit: int = 20000,
+    queries: int = 200,
+    k: int = 10,
+    backend: str = "local"
+):
+    """
+    Builds Qdrant local mode and FAISS HNSW / IVF-PQ stores from the same vectors of the
+    first `limit` chunks and prints build time, the RAM added by building then by
+    reopening the store for search, recall@k against exact search and p50/p99 query
+    latency. Queries are the vectors of `queries` random chunks.
+    """
+    import gc
+    import itertools
+    import shutil
+    import tempfile
+    import numpy as np
+    from qdrant_client import QdrantClient
+    from .embedding_backends import make_encoder
+    from .faiss_store import FaissStore
+    from .metrics import rss_mb
+    from .qdrant_handler import QdrantStore, build_payload, iter_chunk_file, point_id
+
+    chunks = list(itertools.islice(iter_chunk_file(chunk_file), limit))
+    encoder = make_encoder(backend)
+    vectors = encoder.encode([c.get("text", "") for c in chunks])
+    encoder.close()
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [point_id(c.get("text", "")) for c in chunks]
+    payloads = [build_payload(c) for c in chunks]
+
+    picks = np.random.default_rng(0).choice(len(chunks), size=min(queries, len(chunks)), replace=False)
+    exact = np.argsort(-(vectors[picks] @ vectors.T), axis=1)[:, :k]
+    exact_ids = [{ids[i] for i in row} for row in exact]
+
+    def open_qdrant(path, read_only):
+        return QdrantStore(QdrantClient(path=path), "benchmark", read_only=read_only)
+
+    # Qdrant last: memory it frees stays mapped in the allocator and would hide the
+    # RSS growth of the stores measured after it
+    stores = {
+        "faiss-hnsw": lambda path, read_only: FaissStore(path, "hnsw", vectors.shape[1], read_only),
+        "faiss-ivfpq": lambda path, read_only: FaissStore(path, "ivfpq", vectors.shape[1], read_only),
+        "qdrant": open_qdrant,
+    }
+    print(f"\n{len(chunks)} points, {len(picks)} queries")
+    print(f"{'store':>12} {'build s':>8} {'build MB':>9} {'open MB':>8} {f'recall@{k}':>10} {'p50 ms':>7} {'p99 ms':>7}")
+
+    results = {}
+    for name, open_store in stores.items():
+        path = tempfile.mkdtemp()
+        try:
+            gc.collect()
+            rss = rss_mb()
+            start = time.perf_counter()
+            store = open_store(path, False)
+            for i in range(0, len(ids), 512):
+                store.upsert(ids[i:i + 512], vectors[i:i + 512], payloads[i:i + 512])
+            store.close()
+            build = time.perf_counter() - start
+            build_mb = rss_mb() - rss
+            del store
+            gc.collect()
+
+            rss = rss_mb()
+            store = open_store(path, True)
+            open_mb = rss_mb() - rss
+            latencies, recalls = [], []
+            for row, pick in enumerate(picks):
+                start = time.perf_counter()
+                hits = store.search(vectors[pick], k)
+                latencies.append(time.perf_counter() - start)
+                recalls.append(len({hit.id for hit in hits} & exact_ids[row]) / k)
+            store.close()
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+        results[name] = {
+            "build_s": build,
+            "build_mb": build_mb,
+            "open_mb": open_mb,
+            "recall": float(np.mean(recalls)),
+            "p50_ms": float(np.percentile(latencies, 50) * 1000),
+            "p99_ms": float(np.percentile(latencies, 99) * 1000),
+        }
+        r = results[name]
+        print(f"{name:>12} {r['build_s']:>8.1f} {r['build_mb']:>9.1f} {r['open_mb']:>8.1f} "
+              f"{r['recall']:>10.3f} {r['p50_ms']:>7.2f} {r['p99_ms']:>7.2f}")
+    return results
+
+
+# ==============================================================================
+# BENCHMARK 8: HYBRID RETRIEVAL
+# ==============================================================================
+def benchmark_hybrid_retrieval(
+    chunk_file: str = "rag_corpus_chunked.arrow",
+    queries: int = 300,
+    words: int = 8,
+    k: int = 10,
+    backend: str = "local",
+    store: str = None
+):
+    """
+    Known-item evaluation of the search modes of RetrievalService over the ingested
+    store: each query is `words` consecutive words of a random chunk, which should come
+    back in the top k. Prints recall@k, MRR and p50/p99 latency per mode; caches are
+    off so every query is embedded and searched.
+    """
+    import numpy as np
+    from .qdrant_handler import iter_chunk_file
+    from .retrieval_service import SEARCH_MODES, RetrievalService
+
+    rng = np.random.default_rng(0)
+    chunks = [c for c in iter_chunk_file(chunk_file) if len(c.get("text", "").split()) > words]
+    picks = rng.choice(len(chunks), size=min(queries, len(chunks)), replace=False)
+    items = []
+    for i in picks:
+        tokens = chunks[i]["text"].split()
+        start = int(rng.integers(0, len(tokens) - words))
+        items.append((" ".join(tokens[start:start + words]), chunks[i]["id"]))
+    del chunks
+
+    service = RetrievalService(backend, store, embedding_cache_size=0, result_cache_size=0, chunk_file=chunk_file)
+    modes = SEARCH_MODES if service.bm25 is not None else ("dense",)
+    service.search(items[0][0], k, mode=modes[-1])  # warm-up
+    print(f"\n{len(items)} known-item queries of {words} words")
+    print(f"{'mode':>8} {f'recall@{k}':>10} {'MRR':>6} {'p50 ms':>7} {'p99 ms':>7}")
+
+    results = {}
+    try:
+        for mode in modes:
+            latencies, ranks = [], []
+            for query, target in items:
+                start = time.perf_counter()
+                hits = service.search(query, k, mode=mode)
+                latencies.append(time.perf_counter() - start)
+                ids = [hit.id for hit in hits]
+                ranks.append(ids.index(target) + 1 if target in ids else None)
+            results[mode] = {
+                "recall": sum(r is not None for r in ranks) / len(ranks),
+                "mrr": sum(1 / r for r in ranks if r) / len(ranks),
+                "p50_ms": float(np.percentile(latencies, 50) * 1000),
+                "p99_ms": float(np.percentile(latencies, 99) * 1000),
+            }
+            r = results[mode]
+            print(f"{mode:>8} {r['recall']:>10.3f} {r['mrr']:>6.3f} {r['p50_ms']:>7.2f} {r['p99_ms']:>7.2f}")
+    finally:
+        service.close()
+    return results
+
+
+# ==============================================================================
+# BENCHMARK 9: IMPORT TIME
+# ==============================================================================
+# Cold-start budgets (seconds) of the entry points, and the heavy dependencies they
+# must not import: those are loaded by the stage or service that needs them
+IMPORT_BUDGETS = {"main": 0.5, "backend.retrieval_service": 1.0}
+DEFERRED_MODULES = ("torch", "sentence_transformers", "qdrant_client", "faiss", "pandas",
+                    "langchain_text_splitters", "tiktoken", "requests")
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, float, float]]:
+    """(module, self seconds, cumulative seconds) of every line of `python -X importtime`."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    return rows
+
+
+def benchmark_import_time(budgets: Dict[str, float] = IMPORT_BUDGETS, repeat: int = 3, top: int = 5) -> List[str]:
+    """
+    Imports each entry point in a fresh interpreter with `python -X importtime` from
+    the repository root, best of `repeat` (the first run may compile bytecode), and
+    prints its slowest imports. Returns the failures: a budget exceeded or one of
+    DEFERRED_MODULES imported (tests/test_import_time.py asserts there are none).
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    failures = []
+    print(f"\n{'module':>26} {'seconds':>8} {'budget':>7}")
+    for module, budget in budgets.items():
+        best = None
+        for _ in range(repeat):
+            proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                  cwd=root, capture_output=True, text=True)
+            if proc.returncode != 0:
+                failures.append(f"import {module} failed: {proc.stderr.strip().splitlines()[-1]}")
+                break
+            rows = parse_importtime(proc.stderr)
+            seconds = next(cumulative for name, _, cumulative in rows if name == module)
+            if best is None or seconds < best[0]:
+                best = (seconds, rows)
+        if best is None:
+            continue
+        seconds, rows = best
+        print(f"{module:>26} {seconds:>8.3f} {budget:>7.2f} {'✅' if seconds <= budget else '❌'}")
+        for name, own, _ in sorted(rows, key=lambda r: r[1], reverse=True)[:top]:
+            print(f"{'':>28}{own * 1000:>7.1f} ms  {name}")
+        if seconds > budget:
+            failures.append(f"import {module} took {seconds:.3f}s, budget {budget:.2f}s")
+        loaded = sorted({name.split(".")[0] for name, _, _ in rows} & set(DEFERRED_MODULES))
+        if loaded:
+            failures.append(f"import {module} loads {', '.join(loaded)}")
+    for failure in failures:
+        print(f"❌ {failure}")
+    return failures
+
+
+# ==============================================================================
+# BENCHMARK 10: CHUNK STORE FORMATS
+# ==============================================================================
+def benchmark_chunk_store(chunk_file: str = "rag_corpus_chunked.arrow", country: str = "FR", repeat: int = 3):
+    """
+    Copies `chunk_file` to JSONL, Arrow and Parquet next to it and times, best of
+    `repeat`: reading every chunk record, reading the id and text columns only (the
+    Arrow and Parquet record batches, JSONL still parses every line) and reading the
+    chunks of `country`. Prints the file sizes too; the copies are deleted afterwards.
+    """
+    import os
+    from .chunk_handler import write_chunks
+    from .chunk_store import read_chunk_batches
+    from .qdrant_handler import iter_chunk_file
+
+    root = os.path.splitext(chunk_file)[0] + "_bench"
+    paths = {fmt: f"{root}.{fmt}" for fmt in ("jsonl", "arrow", "parquet")}
+    for path in paths.values():
+        write_chunks(iter_chunk_file(chunk_file), path)
+
+    def best(fn):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    def columns(fmt, path):
+        if fmt == "jsonl":
+            return lambda: sum(len(c["text"]) for c in iter_chunk_file(path))
+        return lambda: sum(b.column("text").nbytes for b in read_chunk_batches(path, columns=["id", "text"]))
+
+    print(f"\n{'format':>8} {'MB':>8} {'records s':>10} {'id+text s':>10} {f'{country} s':>8} {f'{country} chunks':>10}")
+    try:
+        for fmt, path in paths.items():
+            found = sum(1 for _ in iter_chunk_file(path, {"country": country}))
+            print(f"{fmt:>8} {os.path.getsize(path) / 1e6:>8.1f} "
+                  f"{best(lambda: sum(1 for _ in iter_chunk_file(path))):>10.3f} "
+                  f"{best(columns(fmt, path)):>10.3f} "
+                  f"{best(lambda: sum(1 for _ in iter_chunk_file(path, {'country': country}))):>8.3f} {found:>10}")
+    finally:
+        for path in paths.values():
+            os.remove(path)
+
+
+# ==============================================================================
+# BENCHMARK 11: TITLE CLASSIFIER
+# ==============================================================================
+def benchmark_title_classifier(index_file: str = "wiki_bilateral_relations.csv", page_size: int = 500, repeat: int = 3):
+    """
+    Classifies every title of the index with the regex categorize_title (one call per
+    title, as the old pandas apply did), with TitleClassifier.classify_batch over the
+    whole index, and in API-page batches of `page_size` as the crawler does. Best of
+    `repeat`. Checks that the labels agree and prints how often each rule decided.
+    """
+    import csv
+    from collections import Counter
+    from .create_wikipedia_index import categorize_title
+    from .title_classifier import TitleClassifier
+
+    with open(index_file, 'r', encoding='utf-8', newline='') as f:
+        titles = [row["title"] for row in csv.DictReader(f)]
+
+    start = time.perf_counter()
+    classifier = TitleClassifier()
+    build = time.perf_counter() - start
+
+    def best(fn):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            out = fn()
+            times.append(time.perf_counter() - start)
+        return min(times), out
+
+    regex_s, expected = best(lambda: [categorize_title(t) for t in titles])
+    batch_s, (labels, rules) = best(lambda: classifier.classify_batch(titles))
+    pages_s, _ = best(lambda: [classifier.classify_batch(titles[i:i + page_size])
+                               for i in range(0, len(titles), page_size)])
+    mismatches = sum(a != b for a, b in zip(expected, labels))
+
+    print(f"\n{len(titles)} titles, automaton built in {build * 1000:.1f} ms")
+    print(f"{'method':>22} {'seconds':>8} {'titles/s':>10} {'speedup':>8}")
+    for name, seconds in (("regex per title", regex_s), ("batch (whole index)", batch_s),
+                          (f"batch ({page_size}/page)", pages_s)):
+        print(f"{name:>22} {seconds:>8.3f} {len(titles) / seconds:>10.0f} {regex_s / seconds:>7.1f}x")
+    print(f"{'✅' if not mismatches else '❌'} {mismatches} label(s) differ from categorize_title")
+    for rule, count in Counter(rule.split(":")[0] for rule in rules).most_common():
+        print(f"  {rule:>10} {count:>7}")
+    return {"regex_s": regex_s, "batch_s": batch_s, "pages_s": pages_s, "mismatches": mismatches}
+
+
+if __name__ == "__main__":
+    # `python -m backend.benchmarks import-time` only checks the import budgets (for CI)
+    if sys.argv[1:] == ["import-time"]:
+        sys.exit(1 if benchmark_import_time() else 0)
+    benchmark_crawler()
+    benchmark_downloader()
+    benchmark_cleaner()
+    benchmark_chunker()
+    benchmark_embedding_backends()
+    benchmark_collection_profiles()
+    benchmark_vector_stores()
+    benchmark_hybrid_retrieval()
+    import_failures = benchmark_import_time()
+    benchmark_chunk_store()
+    benchmark_title_classifier()
+    if import_failures:
+        sys.exit(1)
@@ -0,0 +1,206 @@
+import json
+import math
+import os
+import re
+from array import array
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Okapi BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+MAX_TF = 65535  # term frequencies are stored as uint16
+
+_TOKEN_RE = re.compile(r"\w\w+")
+STOPWORDS = frozenset(
+    "the and of to in a is was for on by with as at from that this be are were it its an or which "
+    "has have had been their his her they he she between also not but after into than other".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased words of two or more characters (years and codes included), minus stopwords."""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def bm25_index_path(chunk_file: str) -> str:
+    """The BM25 index directory written next to a chunk file."""
+    return os.path.splitext(chunk_file)[0] + "_bm25"
+
+
+# ==============================================================================
+# BUILD
+# ==============================================================================
+class BM25Builder:
+    """
+    Collects chunk texts into an inverted index held as flat arrays while chunking, and
+    writes it as CSR arrays (see BM25Index). Postings cost ~10 bytes each while building.
+    """
+
+    def __init__(self):
+        self.vocab: Dict[str, int] = {}
+        self.terms = array('I')
+        self.docs = array('I')
+        self.tfs = array('H')
+        self.doc_len = array('I')
+        self.ids: List[str] = []
+
+    def add(self, chunk_id: str, text: str) -> None:
+        counts = Counter(tokenize(text))
+        doc = len(self.ids)
+        self.ids.append(chunk_id)
+        self.doc_len.append(sum(counts.values()))
+        for term, tf in counts.items():
+            self.terms.append(self.vocab.setdefault(term, len(self.vocab)))
+            self.docs.append(doc)
+            self.tfs.append(min(tf, MAX_TF))
+
+    def collect(self, chunks: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Passes chunk records through, indexing their text."""
+        for chunk in chunks:
+            self.add(chunk["id"], chunk["text"])
+            yield chunk
+
+    def save(self, directory: str) -> None:
+        _write_index(
+            directory, list(self.vocab), np.frombuffer(self.terms, dtype=np.uint32),
+            np.frombuffer(self.docs, dtype=np.uint32), np.frombuffer(self.tfs, dtype=np.uint16),
+            np.frombuffer(self.doc_len, dtype=np.uint32), np.array(self.ids, dtype='S32')
+        )
+
+
+def _write_index(directory, vocab, terms, docs, tfs, doc_len, ids) -> None:
+    """Writes postings given in any order as the CSR arrays of BM25Index."""
+    os.makedirs(directory, exist_ok=True)
+    # Stable sort by term keeps each posting list in document order
+    order = np.argsort(terms, kind='stable')
+    offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(terms, minlength=len(vocab)), out=offsets[1:])
+
+    np.save(os.path.join(directory, "offsets.npy"), offsets)
+    np.save(os.path.join(directory, "docs.npy"), docs[order].astype(np.uint32))
+    np.save(os.path.join(directory, "tfs.npy"), tfs[order].astype(np.uint16))
+    np.save(os.path.join(directory, "doc_len.npy"), doc_len.astype(np.uint32))
+    np.save(os.path.join(directory, "ids.npy"), ids.astype('S32'))
+    with open(os.path.join(directory, "vocab.json"), 'w', encoding='utf-8') as f:
+        json.dump(vocab, f, ensure_ascii=False)
+    with open(os.path.join(directory, "meta.json"), 'w', encoding='utf-8') as f:
+        avgdl = float(np.mean(doc_len)) if len(doc_len) else 0.0
+        json.dump({"docs": len(ids), "postings": len(terms), "avgdl": avgdl}, f)
+
+
+def _read_postings(directory: str) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    with open(os.path.join(directory, "vocab.json"), 'r', encoding='utf-8') as f:
+        vocab = json.load(f)
+    offsets = np.load(os.path.join(directory, "offsets.npy"))
+    terms = np.repeat(np.arange(len(vocab), dtype=np.uint32), np.diff(offsets))
+    return (vocab, terms, *(np.load(os.path.join(directory, name))
+                            for name in ("docs.npy", "tfs.npy", "doc_len.npy", "ids.npy")))
+
+
+def merge_bm25_index(directory: str, delta_directory: str, drop_ids: Iterable[str] = ()) -> None:
+    """
+    Folds the index of a delta chunk file into the index in `directory`: the chunks of
+    `drop_ids` and the ones the delta re-indexes are removed, the delta's chunks added.
+    """
+    if not os.path.exists(os.path.join(directory, "meta.json")):
+        vocab, terms, docs, tfs, doc_len, ids = _read_postings(delta_directory)
+        _write_index(directory, vocab, terms, docs, tfs, doc_len, ids)
+        return
+    vocab, terms, docs, tfs, doc_len, ids = _read_postings(directory)
+    d_vocab, d_terms, d_docs, d_tfs, d_doc_len, d_ids = _read_postings(delta_directory)
+
+    keep = ~np.isin(ids, np.concatenate([np.array(list(drop_ids), dtype='S32'), d_ids]))
+    rows = np.cumsum(keep) - 1
+    kept = keep[docs]
+    term_ids = {term: i for i, term in enumerate(vocab)}
+    d_term_map = np.array([term_ids.setdefault(term, len(term_ids)) for term in d_vocab], dtype=np.uint32)
+
+    _write_index(
+        directory, list(term_ids),
+        np.concatenate([terms[kept], d_term_map[d_terms]]),
+        np.concatenate([rows[docs[kept]], d_docs + int(keep.sum())]),
+        np.concatenate([tfs[kept], d_tfs]),
+        np.concatenate([doc_len[keep], d_doc_len]),
+        np.concatenate([ids[keep], d_ids])
+    )
+    print(f"BM25 index updated: {int((~keep).sum())} chunks removed, {len(d_ids)} added")
+
+
+def build_bm25_index(chunk_file: str, directory: Optional[str] = None) -> str:
+    """Builds the BM25 index of an existing chunk file and returns its directory."""
+    from .qdrant_handler import iter_chunk_file
+
+    builder = BM25Builder()
+    for chunk in iter_chunk_file(chunk_file):
+        builder.add(chunk["id"], chunk["text"])
+    directory = directory or bm25_index_path(chunk_file)
+    builder.save(directory)
+    print(f"BM25 index of {len(builder.ids)} chunks, {len(builder.vocab)} terms saved to {directory}")
+    return directory
+
+
+# ==============================================================================
+# SEARCH
+# ==============================================================================
+class BM25Index:
+    """
+    Read-only BM25 over memory-mapped CSR arrays:
+        offsets.npy - posting list bounds per term id (int64, terms + 1)
+        docs.npy    - document (chunk row) of every posting, uint32
+        tfs.npy     - term frequency of every posting, uint16
+        doc_len.npy - token count per chunk row, uint32
+        ids.npy     - md5 hex id per chunk row
+        vocab.json  - terms in id order
+    A query only reads the posting lists of its own terms.
+    """
+
+    def __init__(self, directory: str):
+        def load(name):
+            return np.load(os.path.join(directory, name), mmap_mode='r')
+
+        with open(os.path.join(directory, "meta.json"), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(os.path.join(directory, "vocab.json"), 'r', encoding='utf-8') as f:
+            self.vocab = {term: i for i, term in enumerate(json.load(f))}
+        self.docs_count = meta["docs"]
+        self.avgdl = meta["avgdl"] or 1.0
+        self.offsets = load("offsets.npy")
+        self.docs = load("docs.npy")
+        self.tfs = load("tfs.npy")
+        self.doc_len = load("doc_len.npy")
+        self.ids = load("ids.npy")
+
+    def __len__(self) -> int:
+        return self.docs_count
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """(chunk id, BM25 score) of the k best chunks sharing a term with the query."""
+        scores = np.zeros(self.docs_count, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = int(self.offsets[term_id]), int(self.offsets[term_id + 1])
+            docs = np.asarray(self.docs[start:end])
+            tf = np.asarray(self.tfs[start:end], dtype=np.float32)
+            idf = math.log(1.0 + (self.docs_count - (end - start) + 0.5) / ((end - start) + 0.5))
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * np.asarray(self.doc_len[docs], dtype=np.float32) / self.avgdl)
+            scores[docs] += idf * tf * (BM25_K1 + 1.0) / (tf + norm)
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [(self.ids[row].decode('ascii'), float(scores[row])) for row in candidates]
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Merges ranked id lists: every id scores sum(1 / (k + rank)) over the lists it is in."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda x: -x[1])
@@ -1,14 +1,39 @@
 import json
 import hashlib
+import os
 import re
+import zlib
+from bisect import bisect_left, bisect_right
+from functools import partial
+from itertools import accumulate
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import numpy as np
 from tqdm import tqdm
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from . import metrics
+from .bm25_index import BM25Builder, bm25_index_path
+from .countries import PairIndex, article_countries, pair_index_path, pair_key
+from .parallel import WorkerStats, ordered_pool_map, timed_task
+
+DOC_MARKER = "--- DOC START ---"
+CHUNK_SIZE = 300
+CHUNK_OVERLAP = 50
+ENCODING_MODEL = "gpt-4o"
+# Paragraph, line, sentence, word; below that a piece is cut between tokens.
+SEPARATORS = [r"\n\n", r"\n", r"(?<=[.!?]) ", r" "]
+LANGCHAIN_SEPARATORS = [r"\n\n", r"\n", r" "]
+_UTF8_CONTINUATION = bytes(range(0x80, 0xC0))
+DEDUP_STORE_FILE = "rag_chunk_hashes.u64"
+CHUNK_TYPE = "geopolitical_event"  # metadata.type of every chunk
+KEPT = ("kept", "ingested")  # ChunkDeduplicator.check results of chunks that are written
 
 def stream_docs(file_path):
+    # Only a line that is exactly the marker starts a document, so article text that
+    # merely mentions it does not split the document in two.
     buffer = []
     with open(file_path, 'r', encoding='utf-8') as f:
         for line in f:
-            if "--- DOC START ---" in line:
+            if line.rstrip("\n") == DOC_MARKER:
                 if buffer:
                     yield "".join(buffer)
                 buffer = []
@@ -17,48 +42,483 @@ def stream_docs(file_path):
         if buffer:
             yield "".join(buffer)
 
-def generate_chunks(input_file: str, output_file: str):
-    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-        model_name="gpt-4o",
-        chunk_size=300,
-        chunk_overlap=50
-    )
+def read_clean_corpus(file_path: str) -> Iterator[Dict[str, Any]]:
+    """Parses the DOC START text corpus back into {"title", "revid", "text"} records."""
+    for raw_doc in stream_docs(file_path):
+        match = re.search(r'TITLE: (.*?)\nCONTENT:\n(.*)', raw_doc, re.DOTALL)
+        if not match:
+            continue
+        yield {"title": match.group(1).strip(), "revid": None, "text": match.group(2).strip()}
 
-    seen_hashes = set()
-    
-    print(f"Chunking {input_file} to {output_file}...")
+# ==============================================================================
+# TOKEN-WINDOW CHUNKER
+# ==============================================================================
+class TokenWindowChunker:
+    """
+    Splits text into chunks of at most `chunk_size` tokens with up to `chunk_overlap`
+    tokens carried over, like RecursiveCharacterTextSplitter.from_tiktoken_encoder,
+    but each document is encoded only once.
 
-    with open(output_file, 'w', encoding='utf-8') as out_f:
-        for raw_doc in tqdm(stream_docs(input_file)):
-            match = re.search(r'TITLE: (.*?)\nCONTENT:\n(.*)', raw_doc, re.DOTALL)
-            if not match:
-                continue
-                
-            title = match.group(1).strip()
-            content = match.group(2).strip()
+    Token offsets from that single encoding give the token count of any character
+    range with two bisects (plus one when the range starts inside a token), so
+    split_counted also returns each chunk's token count at no extra cost. The
+    recursion is the LangChain one: split on the first separator present, merge
+    pieces greedily up to chunk_size, and recurse into pieces that are still too long
+    with the next separator, down to single tokens. Separators stay at the start of
+    the piece that follows them.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = CHUNK_SIZE,
+        chunk_overlap: int = CHUNK_OVERLAP,
+        model_name: str = ENCODING_MODEL,
+        separators: List[str] = SEPARATORS
+    ):
+        import tiktoken
+        self.encoding = tiktoken.encoding_for_model(model_name)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = [re.compile(sep) for sep in separators]
+
+    def token_starts(self, text: str) -> List[int]:
+        """Character offset at which each token of `text` starts."""
+        token_bytes = self.encoding.decode_tokens_bytes(self.encoding.encode(text, disallowed_special=()))
+        if text.isascii():
+            return list(accumulate(map(len, token_bytes), initial=0))[:-1]
+        # Same result as Encoding.decode_with_offsets without its per-byte Python loop:
+        # characters are the bytes that are not UTF-8 continuation bytes, and a token
+        # that starts mid-character is placed at the start of that character.
+        starts = list(accumulate((len(t.translate(None, _UTF8_CONTINUATION)) for t in token_bytes), initial=0))
+        for i, t in enumerate(token_bytes):
+            if 0x80 <= t[0] < 0xC0:
+                starts[i] -= 1
+        starts.pop()
+        return starts
+
+    def split_text(self, text: str) -> List[str]:
+        return [chunk for chunk, _ in self.split_counted(text)]
+
+    def split_counted(self, text: str) -> List[Tuple[str, int]]:
+        """(chunk, token count) pairs, the counts taken from the document's encoding."""
+        starts = self.token_starts(text)
+        chunks = []
+        for a, b in self._split(text, 0, len(text), 0, starts):
+            chunk = text[a:b]
+            stripped = chunk.strip()
+            if stripped:
+                a += len(chunk) - len(chunk.lstrip())
+                chunks.append((stripped, self._count(a, a + len(stripped), starts)))
+        return chunks
 
-            if not content:
+    @staticmethod
+    def _count(a: int, b: int, starts: List[int]) -> int:
+        """Tokens of text[a:b]."""
+        first = bisect_left(starts, a)
+        n = bisect_left(starts, b) - first
+        if first == len(starts) or starts[first] != a:
+            n += 1  # starts inside a token, whose tail encodes as a token of its own
+        return n
+
+    def _split(self, text: str, a: int, b: int, level: int, starts: List[int]) -> List[Tuple[int, int]]:
+        cuts = None
+        for i in range(level, len(self.separators)):
+            if self.separators[i].search(text, a, b):
+                cuts = [m.start() for m in self.separators[i].finditer(text, a, b) if m.start() > a]
+                level = i + 1
+                break
+        if cuts is None:
+            cuts = starts[bisect_right(starts, a):bisect_left(starts, b)]
+            level = None
+
+        bounds = [a] + cuts + [b]
+        final: List[Tuple[int, int]] = []
+        good: List[Tuple[int, int, int]] = []
+        for pa, pb in zip(bounds, bounds[1:]):
+            if pa == pb:
                 continue
+            n = self._count(pa, pb, starts)
+            if n < self.chunk_size:
+                good.append((pa, pb, n))
+                continue
+            if good:
+                final.extend(self._merge(good))
+                good = []
+            if level is None:
+                final.append((pa, pb))
+            else:
+                final.extend(self._split(text, pa, pb, level, starts))
+        if good:
+            final.extend(self._merge(good))
+        return final
+
+    def _merge(self, pieces: List[Tuple[int, int, int]]) -> List[Tuple[int, int]]:
+        merged: List[Tuple[int, int]] = []
+        current: List[Tuple[int, int, int]] = []
+        total = 0
+        for piece in pieces:
+            n = piece[2]
+            if total + n > self.chunk_size and current:
+                merged.append((current[0][0], current[-1][1]))
+                while total > self.chunk_overlap or (total + n > self.chunk_size and total > 0):
+                    total -= current.pop(0)[2]
+            current.append(piece)
+            total += n
+        if current:
+            merged.append((current[0][0], current[-1][1]))
+        return merged
+
+
+def make_splitter(kind: str = "native"):
+    """Returns a splitter with split_text(): the TokenWindowChunker or the LangChain one."""
+    if kind == "native":
+        return TokenWindowChunker()
+    if kind == "langchain":
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        return RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+            model_name=ENCODING_MODEL,
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP
+        )
+    raise ValueError(f"Unknown splitter '{kind}', expected 'native' or 'langchain'.")
+
+
+_worker_splitter = None
+
+def _init_splitter_worker(kind: str) -> None:
+    global _worker_splitter
+    _worker_splitter = make_splitter(kind)
+
+def _split_with(splitter, record: Dict[str, Any]) -> List[Tuple[str, Optional[int]]]:
+    """(chunk, token count) pairs; the count is None when the splitter does not give it."""
+    content = record["text"].strip()
+    if not content:
+        return []
+    if isinstance(splitter, TokenWindowChunker):
+        return splitter.split_counted(content)
+    return [(chunk, None) for chunk in splitter.split_text(content)]
+
+def _split_record(record: Dict[str, Any]) -> List[Tuple[str, Optional[int]]]:
+    return _split_with(_worker_splitter, record)
+
+def _text_bytes(record: Dict[str, Any]) -> int:
+    return len(record["text"].encode('utf-8'))
+
+
+# ==============================================================================
+# DEDUPLICATION
+# ==============================================================================
+def token_counter(model_name: str = ENCODING_MODEL):
+    import tiktoken
+    encoding = tiktoken.encoding_for_model(model_name)
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def hash_value(content_hash: str) -> int:
+    """The 64-bit HashStore value of a chunk id: its first 8 bytes."""
+    return int(content_hash[:16], 16)
+
+
+class HashStore:
+    """
+    Persistent set of 64-bit chunk hashes (see hash_value), of the points ingested.
+
+    The file is a sorted little-endian uint64 array, memory-mapped read-only, so
+    opening it is free and a lookup is one binary search. Hashes added during a run
+    live in a set until save() merges them into a new sorted file.
+    """
+
+    def __init__(self, path: str = DEDUP_STORE_FILE):
+        self.path = path
+        self.added: Set[int] = set()
+        self._load()
+
+    def _load(self) -> None:
+        if os.path.exists(self.path) and os.path.getsize(self.path):
+            self.hashes = np.memmap(self.path, dtype='<u8', mode='r')
+        else:
+            self.hashes = np.empty(0, dtype='<u8')
+
+    def __len__(self) -> int:
+        return len(self.hashes) + len(self.added)
+
+    def __contains__(self, value: int) -> bool:
+        if value in self.added:
+            return True
+        i = int(np.searchsorted(self.hashes, np.uint64(value)))
+        return i < len(self.hashes) and int(self.hashes[i]) == value
+
+    def add(self, value: int) -> None:
+        self.added.add(value)
+
+    def save(self) -> None:
+        if not self.added:
+            return
+        merged = np.union1d(self.hashes, np.fromiter(self.added, dtype='<u8', count=len(self.added)))
+        # Drop the map before replacing the file (Windows refuses to replace a mapped file)
+        self.hashes = None
+        tmp_path = self.path + ".tmp"
+        merged.astype('<u8').tofile(tmp_path)
+        os.replace(tmp_path, self.path)
+        self.added.clear()
+        self._load()
+
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+class NearDuplicateFilter:
+    """
+    MinHash/LSH filter over word shingles. A text is a near-duplicate when a text
+    already added shares an LSH bucket with it and their signatures agree on at least
+    `threshold` of the permutations (the estimated Jaccard similarity).
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        # Pick bands * rows = num_perm whose S-curve midpoint (1/b)^(1/r) is closest to threshold
+        self.bands, self.rows = min(
+            ((b, num_perm // b) for b in range(1, num_perm + 1) if num_perm % b == 0),
+            key=lambda br: abs((1 / br[0]) ** (1 / br[1]) - threshold)
+        )
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, 1 << 61, num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, 1 << 61, num_perm, dtype=np.uint64)
+        self.buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+        self.signatures: List[np.ndarray] = []
+
+    def signature(self, text: str) -> np.ndarray:
+        words = text.split()
+        k = self.shingle_size
+        shingles = {" ".join(words[i:i + k]) for i in range(max(1, len(words) - k + 1))}
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+        permuted = (np.outer(hashes, self.a) + self.b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0)
+
+    def is_duplicate(self, text: str) -> bool:
+        """Checks `text` against the texts added so far and adds it when it is new."""
+        sig = self.signature(text)
+        keys = [sig[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+        candidates = set()
+        for bucket, key in zip(self.buckets, keys):
+            candidates.update(bucket.get(key, ()))
+        for c in candidates:
+            if np.mean(self.signatures[c] == sig) >= self.threshold:
+                return True
+
+        index = len(self.signatures)
+        self.signatures.append(sig)
+        for bucket, key in zip(self.buckets, keys):
+            bucket.setdefault(key, []).append(index)
+        return False
+
+
+class ChunkDeduplicator:
+    """
+    Decides which chunks to keep and counts what was eliminated, in chunks and tokens:
+        duplicate      - same text as a chunk earlier in this run
+        near_duplicate - MinHash estimate >= near_threshold against a kept chunk
+    Only the exact in-run check is on by default. Chunks are only tokenized here
+    (with count_tokens, default tiktoken loaded on first use) when check() is not
+    given their token count. With store_path, kept chunks whose hash is in the
+    HashStore (filled by ingestion) are counted as "ingested": they are still written,
+    so ingestion keeps their points and relabels them to the new revid, but they will
+    not be embedded again.
+    """
+
+    def __init__(
+        self,
+        store_path: Optional[str] = None,
+        near_threshold: Optional[float] = None,
+        num_perm: int = 128,
+        count_tokens=None
+    ):
+        self.seen: Set[int] = set()
+        self.store = HashStore(store_path) if store_path else None
+        self.near = NearDuplicateFilter(near_threshold, num_perm) if near_threshold else None
+        self._count_tokens = count_tokens
+        self.stats = {reason: [0, 0] for reason in ("kept", "ingested", "duplicate", "near_duplicate")}
+
+    def count_tokens(self, text: str) -> int:
+        if self._count_tokens is None:
+            self._count_tokens = token_counter()
+        return self._count_tokens(text)
+
+    def check(self, content_hash: str, text: str, tokens: Optional[int] = None) -> str:
+        """
+        Returns "kept" or "ingested" for a chunk to write, else the reason it is dropped.
+        Pass `tokens` if already counted.
+        """
+        value = hash_value(content_hash)
+        if value in self.seen:
+            reason = "duplicate"
+        elif self.near is not None and self.near.is_duplicate(text):
+            reason = "near_duplicate"
+        else:
+            reason = "ingested" if self.store is not None and value in self.store else "kept"
+            self.seen.add(value)
+        counts = self.stats[reason]
+        if tokens is None:
+            tokens = self.count_tokens(text)
+        counts[0] += 1
+        counts[1] += tokens
+        metrics.inc("chunk_tokens_total", tokens)
+        return reason
+
+    def report(self) -> None:
+        total_chunks = sum(c for c, _ in self.stats.values())
+        total_tokens = sum(t for _, t in self.stats.values())
+        written = [self.stats["kept"][i] + self.stats["ingested"][i] for i in (0, 1)]
+        print(f"Dedup: kept {written[0]}/{total_chunks} chunks ({written[1]}/{total_tokens} tokens)")
+        if self.stats["ingested"][0]:
+            chunks, tokens = self.stats["ingested"]
+            print(f"  ingested: {chunks} chunks, {tokens} tokens already embedded")
+        for reason in ("duplicate", "near_duplicate"):
+            chunks, tokens = self.stats[reason]
+            if chunks:
+                print(f"  {reason}: {chunks} chunks, {tokens} tokens eliminated")
+
+
+# ==============================================================================
+# CHUNK RECORDS
+# ==============================================================================
+def chunk_records(
+    records: Iterable[Dict[str, Any]],
+    dedup: Optional[ChunkDeduplicator] = None,
+    splitter: str = "native",
+    workers: int = 1,
+    batch_size: int = 16
+) -> Iterator[Dict[str, Any]]:
+    """
+    Splits cleaned {"title", "revid", "text"} records into ~300-token chunks and yields
+    one chunk record per chunk that `dedup` keeps (default: exact duplicates dropped).
+    The article revid is kept in the chunk metadata when it is known, along with the
+    article's ISO country codes and, for two countries, their pair key (see
+    countries.article_countries), and the chunk's token count.
+
+    `splitter` is "native" (TokenWindowChunker) or "langchain". With workers > 1 the
+    documents are split in a process pool, `batch_size` per task; de-duplication stays
+    in this process, so the output is the same as with one worker.
+    """
+    if workers <= 1:
+        text_splitter = make_splitter(splitter)
+        split_docs = (
+            (record, _split_with(text_splitter, record))
+            for record in tqdm(records, desc="Chunking", unit="doc")
+        )
+    else:
+        split_docs = _split_in_pool(records, splitter, workers, batch_size)
+    return chunk_split_docs(split_docs, dedup)
+
+def chunk_split_docs(
+    split_docs: Iterable[Tuple[Dict[str, Any], List[Tuple[str, Optional[int]]]]],
+    dedup: Optional[ChunkDeduplicator] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    The de-duplication and metadata half of chunk_records, for (clean record, chunks)
+    pairs split elsewhere (e.g. by pipeline.stream_chunks' workers). Chunks are
+    (text, token count) pairs as _split_with returns them; a None count is computed
+    here by `dedup`.
+    """
+    if dedup is None:
+        dedup = ChunkDeduplicator()
+
+    for record, chunks in split_docs:
+        metrics.inc("chunk_docs_total")
+        title = record["title"]
+        codes = article_countries(title, record["text"])
+        pair = pair_key(codes)
+        for chunk, tokens in chunks:
+            content_hash = hashlib.md5(chunk.encode('utf-8')).hexdigest()
+            if tokens is None:
+                tokens = dedup.count_tokens(chunk)
+
+            if dedup.check(content_hash, chunk, tokens) in KEPT:
+                metrics.inc("chunks_total")
+                metadata = {
+                    "source": title,
+                    "type": CHUNK_TYPE
+                }
+                if record.get("revid") is not None:
+                    metadata["revid"] = record["revid"]
+                if codes:
+                    metadata["countries"] = codes
+                if pair:
+                    metadata["pair"] = pair
+                metadata["tokens"] = tokens
+
+                yield {
+                    "id": content_hash,
+                    "title": title,
+                    "text": chunk,
+                    "metadata": metadata
+                }
+
+def _split_in_pool(records, splitter: str, workers: int, batch_size: int):
+    stats = WorkerStats("MB", scale=1e6)
+    task = partial(timed_task, _split_record, _text_bytes)
+    pending: List[Dict[str, Any]] = []
+
+    def remember(items):
+        # The pool only gets the records' text back as chunks, so keep the records here
+        for record in items:
+            pending.append(record)
+            yield record
+
+    with tqdm(desc="Chunking", unit="doc") as pbar:
+        for n_docs, (chunk_lists, pid, seconds, text_bytes) in ordered_pool_map(
+            task, remember(records), workers, batch_size,
+            initializer=_init_splitter_worker, initargs=(splitter,)
+        ):
+            stats.add(pid, seconds, text_bytes)
+            pbar.update(n_docs)
+            done, pending[:] = pending[:n_docs], pending[n_docs:]
+            yield from zip(done, chunk_lists)
+    stats.report("Chunked")
+
+def write_chunks(chunks: Iterable[Dict[str, Any]], output_file: str) -> int:
+    """
+    Writes chunk records as JSONL, or as an Arrow/Parquet chunk store when
+    `output_file` ends in .arrow or .parquet (see chunk_store), and returns how many
+    were written.
+    """
+    from .chunk_store import chunk_store_format, write_chunk_store
+    if chunk_store_format(output_file):
+        return write_chunk_store(chunks, output_file)
+    count = 0
+    with open(output_file, 'w', encoding='utf-8') as out_f:
+        for record in chunks:
+            out_f.write(json.dumps(record) + "\n")
+            count += 1
+    return count
+
+def generate_chunks(
+    input_file: str,
+    output_file: str,
+    splitter: str = "native",
+    workers: int = 1,
+    dedup_store: Optional[str] = None,
+    near_threshold: Optional[float] = None
+):
+    """
+    Chunks the clean text corpus into `output_file`: JSONL, or a columnar chunk store
+    for a .arrow or .parquet path (see write_chunks).
 
-            chunks = text_splitter.split_text(content)
-
-            for chunk in chunks:
-                content_hash = hashlib.md5(chunk.encode('utf-8')).hexdigest()
-                
-                if content_hash not in seen_hashes:
-                    seen_hashes.add(content_hash)
-                    
-                    record = {
-                        "id": content_hash,
-                        "title": title,
-                        "text": chunk,
-                        "metadata": {
-                            "source": title,
-                            "type": "geopolitical_event"
-                        }
-                    }
-                    
-                    out_f.write(json.dumps(record) + "\n")
-                    
-                    
-        
\ No newline at end of file
+    With dedup_store (e.g. DEDUP_STORE_FILE, filled by ingest_to_qdrant) the chunks
+    already ingested are reported; they are written like the others, so the output
+    does not depend on the store. near_threshold (e.g. 0.8) also drops near-duplicate
+    chunks such as shared boilerplate paragraphs.
+    The pair -> chunk id index and the BM25 index are written next to the output (see
+    pair_index_path and bm25_index_path). Returns the number of chunks written.
+    """
+    print(f"Chunking {input_file} to {output_file} ({splitter} splitter, {workers} worker(s))...")
+    dedup = ChunkDeduplicator(dedup_store, near_threshold)
+    pairs = PairIndex()
+    bm25 = BM25Builder()
+    chunks = chunk_records(read_clean_corpus(input_file), dedup, splitter, workers)
+    count = write_chunks(bm25.collect(pairs.collect(chunks)), output_file)
+    pairs.save(pair_index_path(output_file))
+    bm25.save(bm25_index_path(output_file))
+    dedup.report()
+    return count
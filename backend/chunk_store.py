@@ -0,0 +1,199 @@
+import os
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from .chunk_handler import CHUNK_TYPE
+
+# Columnar chunk stores, chosen by the file extension (any other path is JSONL):
+#   .arrow   - Arrow IPC file, uncompressed and read memory-mapped, so record batches
+#              are zero-copy views of the page cache and only the pages of the columns
+#              and rows used are read from disk
+#   .parquet - zstd-compressed Parquet, about 3x smaller, decoded per row group
+# One record batch (row group) holds ROWS_PER_BATCH chunks. Filters are evaluated on
+# their own columns first; the other columns of a batch are only read when it matches.
+CHUNK_STORE_FORMATS = {".arrow": "arrow", ".parquet": "parquet"}
+ROWS_PER_BATCH = 2048
+PARQUET_COMPRESSION = "zstd"
+COLUMNS = ("id", "title", "revid", "countries", "pair", "tokens", "text")
+# Filterable fields, named like the payload fields of vector_store.VectorStore filters
+FILTER_COLUMNS = {"title": "title", "revid": "revid", "country": "countries", "pair": "pair"}
+
+
+def chunk_store_format(path: str) -> Optional[str]:
+    """"arrow" or "parquet" for a chunk store path, None for a JSONL chunk file."""
+    return CHUNK_STORE_FORMATS.get(os.path.splitext(path)[1].lower())
+
+
+def chunk_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("id", pa.string()),
+        ("title", pa.string()),
+        ("revid", pa.int64()),
+        ("countries", pa.list_(pa.string())),
+        ("pair", pa.string()),
+        ("tokens", pa.int32()),
+        ("text", pa.string()),
+    ])
+
+
+# ==============================================================================
+# WRITE
+# ==============================================================================
+def write_chunk_store(chunks: Iterable[Dict[str, Any]], path: str, rows_per_batch: int = ROWS_PER_BATCH) -> int:
+    """
+    Writes chunk records (see chunk_handler.chunk_records) as an Arrow or Parquet
+    chunk store, one record batch per `rows_per_batch` chunks, and returns how many
+    were written. The file is replaced atomically once complete.
+    """
+    import pyarrow as pa
+
+    schema = chunk_schema()
+    tmp = path + ".tmp"
+    if chunk_store_format(path) == "parquet":
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(tmp, schema, compression=PARQUET_COMPRESSION)
+    else:
+        writer = pa.ipc.new_file(tmp, schema)
+
+    columns: Dict[str, List[Any]] = {name: [] for name in COLUMNS}
+
+    def flush():
+        if columns["id"]:
+            writer.write_batch(pa.record_batch(
+                [pa.array(columns[field.name], type=field.type) for field in schema], schema=schema
+            ))
+            for values in columns.values():
+                values.clear()
+
+    count = 0
+    try:
+        with writer:
+            for record in chunks:
+                metadata = record.get("metadata") or {}
+                columns["id"].append(record["id"])
+                columns["title"].append(record.get("title"))
+                columns["revid"].append(metadata.get("revid"))
+                columns["countries"].append(metadata.get("countries") or [])
+                columns["pair"].append(metadata.get("pair"))
+                columns["tokens"].append(metadata.get("tokens"))
+                columns["text"].append(record.get("text", ""))
+                count += 1
+                if len(columns["id"]) >= rows_per_batch:
+                    flush()
+            flush()
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, path)
+    return count
+
+
+# ==============================================================================
+# READ
+# ==============================================================================
+@contextmanager
+def _open_store(path: str):
+    """(number of batches, read(i, columns) -> Table) of an Arrow or Parquet chunk store."""
+    import pyarrow as pa
+
+    if chunk_store_format(path) == "parquet":
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(path, memory_map=True)
+        try:
+            yield parquet.num_row_groups, lambda i, columns: parquet.read_row_group(i, columns=columns)
+        finally:
+            parquet.close()
+        return
+
+    with pa.memory_map(path, 'r') as source:
+        reader = pa.ipc.open_file(source)
+        yield reader.num_record_batches, lambda i, columns: pa.Table.from_batches([reader.get_batch(i).select(columns)])
+
+
+def _accepted(value: Any) -> List[Any]:
+    return list(value) if isinstance(value, (list, tuple, set, frozenset)) else [value]
+
+
+def _row_mask(table, filters: Dict[str, Any]) -> np.ndarray:
+    """Rows of `table` matching every filter; a list of values accepts any of them."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    mask = np.ones(table.num_rows, dtype=bool)
+    for field, value in filters.items():
+        column = table.column(FILTER_COLUMNS[field]).combine_chunks()
+        accepted = pa.array(_accepted(value), type=column.type.value_type if field == "country" else column.type)
+        if field == "country":
+            # A chunk matches when any of its countries is accepted
+            hits = pc.is_in(pc.list_flatten(column), value_set=accepted).to_numpy(zero_copy_only=False)
+            matched = np.zeros(table.num_rows, dtype=bool)
+            matched[pc.list_parent_indices(column).to_numpy()[hits]] = True
+        else:
+            matched = pc.is_in(column, value_set=accepted).to_numpy(zero_copy_only=False)
+        mask &= matched
+    return mask
+
+
+def read_chunk_batches(
+    path: str,
+    columns: Optional[Sequence[str]] = None,
+    filters: Optional[Dict[str, Any]] = None
+) -> Iterator[Any]:
+    """
+    Yields the record batches of a chunk store with only `columns` (default: all of
+    COLUMNS) and the rows matching `filters`, e.g. {"country": "FR"} or
+    {"title": [...]} (see FILTER_COLUMNS). Batches of an Arrow file are views of the
+    memory map, valid while the generator runs; filtered batches copy only the
+    matching rows.
+    """
+    import pyarrow as pa
+
+    columns = list(columns or COLUMNS)
+    filters = filters or {}
+    unknown = set(filters) - set(FILTER_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown chunk filter {sorted(unknown)}, expected some of {list(FILTER_COLUMNS)}.")
+    keys = list(dict.fromkeys(FILTER_COLUMNS[field] for field in filters))
+
+    with _open_store(path) as (batches, read):
+        for i in range(batches):
+            mask = None
+            if filters:
+                mask = _row_mask(read(i, keys), filters)
+                if not mask.any():
+                    continue
+            table = read(i, columns)
+            if mask is not None and not mask.all():
+                table = table.filter(pa.array(mask))
+            yield from table.to_batches()
+
+
+def iter_chunk_store(path: str, filters: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+    """The chunk records of a chunk store, as chunk_records yields them."""
+    for batch in read_chunk_batches(path, filters=filters):
+        data = batch.to_pydict()
+        for chunk_id, title, revid, countries, pair, tokens, text in zip(*(data[name] for name in COLUMNS)):
+            metadata = {"source": title, "type": CHUNK_TYPE}
+            if revid is not None:
+                metadata["revid"] = revid
+            if countries:
+                metadata["countries"] = countries
+            if pair:
+                metadata["pair"] = pair
+            if tokens is not None:
+                metadata["tokens"] = tokens
+            yield {"id": chunk_id, "title": title, "text": text, "metadata": metadata}
+
+
+def count_chunks(path: str) -> int:
+    """Number of chunks in a chunk store, from its metadata."""
+    if chunk_store_format(path) == "parquet":
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+    with _open_store(path) as (batches, read):
+        return sum(read(i, ["id"]).num_rows for i in range(batches))
@@ -0,0 +1,217 @@
+import json
+import os
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import pycountry
+
+# Names used by Wikipedia titles that pycountry does not know. Historic states get the
+# four-letter ISO 3166-3 code, as their two-letter codes were reassigned.
+COUNTRY_ALIASES = {
+    "Russia": "RU",
+    "Turkey": "TR",
+    "Palestine": "PS",
+    "State of Palestine": "PS",
+    "Kosovo": "XK",
+    "Holy See": "VA",
+    "Vatican City": "VA",
+    "Democratic Republic of the Congo": "CD",
+    "Republic of the Congo": "CG",
+    "Brunei": "BN",
+    "Ivory Coast": "CI",
+    "Cape Verde": "CV",
+    "Sahrawi Arab Democratic Republic": "EH",
+    "Western Sahara": "EH",
+    "Macau": "MO",
+    "Burma": "MM",
+    "Micronesia": "FM",
+    "East Timor": "TL",
+    "Czech Republic": "CZ",
+    "Eswatini": "SZ",
+    "Swaziland": "SZ",
+    "North Macedonia": "MK",
+    "Macedonia": "MK",
+    "Vietnam": "VN",
+    "European Union": "EU",
+    "Soviet Union": "SUHH",
+    "Yugoslavia": "YUCS",
+    "Czechoslovakia": "CSHH",
+    "East Germany": "DDDE",
+}
+LEAD_CHARS = 1500  # share of an article scanned for countries when its title names fewer than two
+
+_PAIR_TITLE_RE = re.compile(r'^(.+?)–(.+) relations$')
+
+
+def _normalize(name: str) -> str:
+    name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+    name = name.casefold().strip()
+    return name[4:] if name.startswith("the ") else name
+
+
+def _build_names() -> Dict[str, str]:
+    names: Dict[str, str] = {}
+    for country in pycountry.countries:
+        for attr in ("name", "official_name", "common_name"):
+            value = getattr(country, attr, None)
+            if value:
+                names[_normalize(value)] = country.alpha_2
+    for alias, code in COUNTRY_ALIASES.items():
+        names[_normalize(alias)] = code
+    return names
+
+
+_NAMES = _build_names()
+_CODES = set(_NAMES.values())
+# Country names as they appear in running text, longest first so "Republic of the
+# Congo" wins over "Congo"; a capitalized match is required to skip common nouns.
+_TEXT_NAMES = sorted(
+    {name for country in pycountry.countries for name in
+     (getattr(country, "common_name", None), country.name) if name and "," not in name} | set(COUNTRY_ALIASES),
+    key=len, reverse=True
+)
+_TEXT_RE = re.compile(r'\b(' + '|'.join(re.escape(name) for name in _TEXT_NAMES) + r')\b')
+
+
+def country_code(name: str) -> Optional[str]:
+    """ISO code of a country name (or of a code), None when unknown."""
+    if not name:
+        return None
+    if name.upper() in _CODES:
+        return name.upper()
+    return _NAMES.get(_normalize(name))
+
+
+def title_country_codes(title: Optional[str]) -> List[str]:
+    """The codes of both sides of an "X–Y relations" title, [] when either is unknown."""
+    match = _PAIR_TITLE_RE.match(title or "")
+    if not match:
+        return []
+    codes = [country_code(side) for side in match.groups()]
+    return codes if all(codes) else []
+
+
+def text_country_codes(text: str) -> List[str]:
+    """Codes of the countries named in `text`, most mentioned first."""
+    counts: Dict[str, int] = {}
+    for match in _TEXT_RE.finditer(text):
+        code = _NAMES[_normalize(match.group(1))]
+        counts[code] = counts.get(code, 0) + 1
+    return sorted(counts, key=lambda code: -counts[code])
+
+
+def article_countries(title: str, text: str) -> List[str]:
+    """
+    Up to two country codes for an article: the sides of its title when it is an
+    "X–Y relations" title, otherwise the countries in its title then the ones most
+    mentioned in its first LEAD_CHARS characters.
+    """
+    codes = title_country_codes(title)
+    if codes:
+        return codes
+    codes = text_country_codes(title)[:2]
+    for code in text_country_codes(text[:LEAD_CHARS]):
+        if len(codes) >= 2:
+            break
+        if code not in codes:
+            codes.append(code)
+    return codes
+
+
+def pair_key(codes: Iterable[str]) -> Optional[str]:
+    """Order-independent key of a country pair, e.g. "DZ-FR"; None unless exactly two codes."""
+    codes = sorted(set(codes))
+    return "-".join(codes) if len(codes) == 2 else None
+
+
+def parse_pair(pair: Any) -> Optional[str]:
+    """
+    Pair key from "DZ-FR", "France–Algeria" or ("France", "DZ"). Every split point of
+    the dash is tried, so hyphenated names work: "Guinea-Bissau-France", "Timor-Leste-FR".
+    """
+    if isinstance(pair, str) and pair.endswith(" relations"):
+        codes = title_country_codes(pair)
+    elif isinstance(pair, str):
+        dash = "–" if "–" in pair else "-"
+        parts = pair.split(dash)
+        codes = []
+        for i in range(1, len(parts)):
+            codes = [country_code(dash.join(parts[:i]).strip()), country_code(dash.join(parts[i:]).strip())]
+            if all(codes):
+                break
+    else:
+        codes = [country_code(side) for side in pair]
+    return pair_key(codes) if codes and all(codes) else None
+
+
+# ==============================================================================
+# PAIR -> CHUNK ID INDEX
+# ==============================================================================
+def pair_index_path(chunk_file: str) -> str:
+    """The pair index written next to a chunk file."""
+    return os.path.splitext(chunk_file)[0] + "_pairs.json"
+
+
+class PairIndex:
+    """
+    Chunk ids by article, with each article's countries and pair, so a country or a
+    pair maps to its chunks without touching the vectors. Built while chunking
+    (collect) and saved next to the chunk file; delta runs update() the main index.
+    """
+
+    def __init__(self, articles: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.articles: Dict[str, Dict[str, Any]] = articles or {}
+        self._titles: Optional[Dict[str, List[str]]] = None  # country or pair -> titles, built on first lookup
+
+    def add(self, chunk: Dict[str, Any]) -> None:
+        self._titles = None
+        metadata = chunk.get("metadata") or {}
+        article = self.articles.setdefault(chunk["title"], {
+            "countries": metadata.get("countries", []),
+            "pair": metadata.get("pair"),
+            "ids": []
+        })
+        article["ids"].append(chunk["id"])
+
+    def collect(self, chunks: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Passes chunk records through, adding them to the index."""
+        for chunk in chunks:
+            self.add(chunk)
+            yield chunk
+
+    def update(self, other: "PairIndex", drop_titles: Iterable[str] = ()) -> None:
+        """Drops the articles of `drop_titles`, then adds (or replaces) those of `other`."""
+        for title in drop_titles:
+            self.articles.pop(title, None)
+        self.articles.update(other.articles)
+        self._titles = None
+
+    def ids(self, country: Optional[str] = None, pair: Optional[str] = None) -> List[str]:
+        """Chunk ids of the articles about `pair` (a pair key) or, without a pair, `country`."""
+        if self._titles is None:
+            self._titles = {}
+            for title, article in self.articles.items():
+                for key in set(article["countries"]) | ({article["pair"]} if article["pair"] else set()):
+                    self._titles.setdefault(key, []).append(title)
+        titles = self._titles.get(pair or country, []) if pair or country else list(self.articles)
+        return [chunk_id for title in titles for chunk_id in self.articles[title]["ids"]]
+
+    def pairs(self) -> Dict[str, int]:
+        """Chunk count of every pair."""
+        counts: Dict[str, int] = {}
+        for article in self.articles.values():
+            if article["pair"]:
+                counts[article["pair"]] = counts.get(article["pair"], 0) + len(article["ids"])
+        return counts
+
+    def save(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.articles, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> "PairIndex":
+        if not os.path.exists(path):
+            return cls()
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
@@ -0,0 +1,202 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS categories (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT UNIQUE NOT NULL,
+    depth INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    expanded INTEGER NOT NULL DEFAULT 0,
+    gcmcontinue TEXT,
+    pages_fetched INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE TABLE IF NOT EXISTS category_pages (
+    category TEXT NOT NULL,
+    page_index INTEGER NOT NULL,
+    titles TEXT NOT NULL,
+    subcats TEXT NOT NULL,
+    PRIMARY KEY (category, page_index)
+);
+"""
+
+
+class CrawlCheckpoint:
+    """
+    SQLite store for the category crawl: frontier, visited categories, continuation
+    tokens and every collected title. Each API response is committed as soon as it
+    arrives, so an interrupted crawl resumes from the last stored `gcmcontinue`.
+
+    Category status is one of:
+        pending - discovered, not fully fetched yet
+        done    - every continuation page stored
+        failed  - gave up after retries; retried on the next run
+
+    path=":memory:" gives the same behaviour without persistence.
+    """
+
+    def __init__(self, path: str, start_category: str, max_depth: int):
+        self.path = path
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+        expected = {"start_category": start_category, "max_depth": str(max_depth)}
+        stored = dict(self._conn.execute("SELECT key, value FROM meta"))
+        if stored and stored != expected:
+            print(f"Checkpoint {path} was built for {stored}, starting a fresh crawl.")
+            self._conn.executescript(
+                "DELETE FROM meta; DELETE FROM categories; DELETE FROM category_pages;"
+            )
+            stored = {}
+        if not stored:
+            self._conn.executemany("INSERT INTO meta VALUES (?, ?)", expected.items())
+        self._conn.commit()
+        self.seed(start_category, 0)
+
+    # --- Frontier ---------------------------------------------------------------
+    def seed(self, category_name: str, depth: int) -> None:
+        with self._lock:
+            self._enqueue([category_name], depth)
+            self._conn.commit()
+
+    def frontier(self, exclude: Set[str] = frozenset()) -> Tuple[int, List[str]]:
+        """Returns (depth, categories) for the shallowest level still to be fetched."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, depth FROM categories WHERE status != 'done' ORDER BY depth, seq"
+            ).fetchall()
+        rows = [r for r in rows if r[0] not in exclude]
+        if not rows:
+            return 0, []
+        depth = rows[0][1]
+        return depth, [name for name, d in rows if d == depth]
+
+    def resume_point(self, category_name: str) -> Tuple[int, Optional[str]]:
+        """Returns (pages already stored, gcmcontinue to send next)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT pages_fetched, gcmcontinue FROM categories WHERE name = ?",
+                (category_name,)
+            ).fetchone()
+        return (row[0], row[1]) if row else (0, None)
+
+    # --- Progress ---------------------------------------------------------------
+    def record_page(
+        self,
+        category_name: str,
+        page_index: int,
+        titles: List[Dict[str, Any]],
+        subcats: List[str],
+        gcmcontinue: Optional[str]
+    ) -> None:
+        # [title, revid] plus the [keep, rule] decision of title_classifier when made
+        titles_json = json.dumps([[t['title'], t['revid'], *([t['keep'], t['rule']] if 'keep' in t else [])]
+                                  for t in titles], ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO category_pages VALUES (?, ?, ?, ?)",
+                (category_name, page_index, titles_json, json.dumps(subcats, ensure_ascii=False))
+            )
+            self._conn.execute(
+                "UPDATE categories SET pages_fetched = ?, gcmcontinue = ? WHERE name = ?",
+                (page_index + 1, gcmcontinue, category_name)
+            )
+            self._conn.commit()
+
+    def mark_done(self, category_name: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE categories SET status = 'done', last_error = NULL WHERE name = ?",
+                (category_name,)
+            )
+            depth = self._conn.execute(
+                "SELECT depth FROM categories WHERE name = ?", (category_name,)
+            ).fetchone()[0]
+            self._expand(category_name, depth)
+            self._conn.commit()
+
+    def mark_failed(self, category_name: str, error: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE categories SET status = 'failed', attempts = attempts + 1, last_error = ? "
+                "WHERE name = ?",
+                (error, category_name)
+            )
+            self._conn.commit()
+
+    def _enqueue(self, names: List[str], depth: int) -> None:
+        """Adds categories at `depth`, lowering the depth of ones already known deeper."""
+        for name in names:
+            row = self._conn.execute(
+                "SELECT depth, status FROM categories WHERE name = ?", (name,)
+            ).fetchone()
+            if row is None:
+                self._conn.execute(
+                    "INSERT INTO categories (name, depth) VALUES (?, ?)", (name, depth)
+                )
+            elif row[0] > depth:
+                self._conn.execute("UPDATE categories SET depth = ? WHERE name = ?", (depth, name))
+                if row[1] == 'done':
+                    self._expand(name, depth)
+
+    def _expand(self, category_name: str, depth: int) -> None:
+        # Like the serial walk, only the last response's sub-categories are followed
+        if depth >= self.max_depth:
+            return
+        already = self._conn.execute(
+            "SELECT expanded FROM categories WHERE name = ?", (category_name,)
+        ).fetchone()[0]
+        if already:
+            return
+        self._conn.execute("UPDATE categories SET expanded = 1 WHERE name = ?", (category_name,))
+        row = self._conn.execute(
+            "SELECT subcats FROM category_pages WHERE category = ? "
+            "ORDER BY page_index DESC LIMIT 1",
+            (category_name,)
+        ).fetchone()
+        if row:
+            self._enqueue(json.loads(row[0]), depth + 1)
+
+    # --- Results ----------------------------------------------------------------
+    def members(self) -> Dict[str, Dict[str, Any]]:
+        """Returns {category: {"pages": [(titles, subcats), ...], "complete": bool}}."""
+        with self._lock:
+            status = dict(self._conn.execute("SELECT name, status FROM categories"))
+            rows = self._conn.execute(
+                "SELECT category, titles, subcats FROM category_pages ORDER BY category, page_index"
+            ).fetchall()
+        members = {name: {"pages": [], "complete": s == 'done'} for name, s in status.items()}
+        for category_name, titles_json, subcats_json in rows:
+            titles = [dict(zip(('title', 'revid', 'keep', 'rule'), row)) for row in json.loads(titles_json)]
+            members[category_name]["pages"].append((titles, json.loads(subcats_json)))
+        return members
+
+    def failed_categories(self) -> List[Tuple[str, int, str]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT name, attempts, last_error FROM categories WHERE status = 'failed' ORDER BY seq"
+            ).fetchall()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def remove(self) -> None:
+        """Closes and deletes the checkpoint once its crawl has been written out."""
+        self.close()
+        if self.path != ":memory:":
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(self.path + suffix):
+                    os.remove(self.path + suffix)
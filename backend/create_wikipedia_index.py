@@ -1,9 +1,25 @@
 import requests
 import csv
-from typing import List, Dict, Any, Set
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Set, Optional
 from tqdm import tqdm
 import re
-import pandas as pd
+
+from . import metrics
+from .crawl_checkpoint import CrawlCheckpoint
+from .title_classifier import (
+    EXACT_NOISE_WORDS,
+    INTERESTING_KEYWORDS_RAW,
+    NOISE_KEYWORDS_RAW,
+    PRIORITY_KEEPS,
+    STRICT_INTEREST_WORDS,
+    classify_rows
+)
+
+WIKI_API_URL = "https://en.wikipedia.org/w/api.php"
 
 PROCESSED_CATEGORIES: Set[str] = set()
 
@@ -14,7 +30,8 @@ def get_category_members_recursive(
     S: requests.Session,
     pbar: tqdm,
     current_depth: int,
-    max_depth: int
+    max_depth: int,
+    api_url: str = WIKI_API_URL
 ) -> None:
     
     if category_name in PROCESSED_CATEGORIES:
@@ -25,7 +42,7 @@ def get_category_members_recursive(
     pbar.set_description(f"Depth {current_depth}") 
     pbar.set_postfix({"Articles": len(titles_data)}) 
 
-    URL = "https://en.wikipedia.org/w/api.php"
+    URL = api_url
     HEADERS = {'User-Agent': user_agent}
 
     PARAMS: Dict[str, Any] = {
@@ -50,19 +67,22 @@ def get_category_members_recursive(
             R.raise_for_status()
             DATA = R.json()
 
-        except requests.exceptions.RequestException:
+        except requests.exceptions.RequestException as e:
+            pbar.write(f"Stopped {category_name} after {iteration_count - 1} page(s): {e}")
             return
-        except ValueError:
+        except ValueError as e:
+            pbar.write(f"Stopped {category_name} after {iteration_count - 1} page(s): {e}")
             return
 
         pages_dict = DATA.get("query", {}).get("pages", {})
         subcategories_to_process = []
+        page_titles = []
         
         for page_id, page in pages_dict.items():
             if page.get('ns') == 0:
                 revisions = page.get('revisions', [])
                 current_revid = revisions[0]['revid'] if revisions else 0
-                titles_data.append({
+                page_titles.append({
                     'title': page['title'], 
                     'revid': current_revid
                 })
@@ -71,6 +91,7 @@ def get_category_members_recursive(
                 if current_depth < max_depth:
                     subcategories_to_process.append(page['title'])
         
+        titles_data.extend(classify_rows(page_titles))
         pbar.set_postfix({"Articles": len(titles_data)})
 
         if "continue" in DATA:
@@ -86,105 +107,337 @@ def get_category_members_recursive(
             S, 
             pbar, 
             current_depth + 1, 
-            max_depth
+            max_depth,
+            api_url
         )
 
 
+# ==============================================================================
+# CONCURRENT CRAWLER
+# ==============================================================================
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every crawler worker.
+    `rate` tokens are added per second, up to `capacity`; each request takes one.
+    A rate of None (or <= 0) disables limiting. pause() holds every worker back,
+    e.g. after the API answers 429 or maxlag.
+    """
+
+    def __init__(self, rate: Optional[float], capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate or 1.0)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif not self.rate or self.rate <= 0:
+                    return
+                else:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                    self._last = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def fetch_category_members(
+    category_name: str,
+    user_agent: str,
+    S: requests.Session,
+    limiter: TokenBucket,
+    checkpoint: CrawlCheckpoint,
+    api_url: str = WIKI_API_URL,
+    max_retries: int = 3
+) -> bool:
+    """
+    Fetches every continuation page of one category into the checkpoint, starting
+    from its stored `gcmcontinue`. Each response is stored as one (titles, subcats)
+    page so the depth-first replay can reproduce exactly what
+    get_category_members_recursive would have collected.
+
+    A failing request is retried `max_retries` times with exponential backoff.
+    Returns False (and marks the category failed) if it still fails.
+    """
+    HEADERS = {'User-Agent': user_agent}
+    PARAMS: Dict[str, Any] = {
+        "action": "query",
+        "format": "json",
+        "generator": "categorymembers",
+        "gcmtitle": category_name,
+        "gcmlimit": "max",
+        "gcmtype": "page|subcat",
+        "prop": "revisions",
+        "rvprop": "ids"
+    }
+
+    page_index, gcmcontinue = checkpoint.resume_point(category_name)
+    if gcmcontinue is not None:
+        PARAMS["gcmcontinue"] = gcmcontinue
+
+    max_iterations = 5000
+    iteration_count = page_index
+
+    while iteration_count < max_iterations:
+        iteration_count += 1
+
+        for attempt in range(max_retries + 1):
+            limiter.acquire()
+            try:
+                with metrics.timer("http_request_seconds", api="crawl"):
+                    R = S.get(url=api_url, params=PARAMS, headers=HEADERS, timeout=30)
+                metrics.inc("http_requests_total", api="crawl", status=R.status_code)
+                R.raise_for_status()
+                DATA = R.json()
+                break
+            except (requests.exceptions.RequestException, ValueError) as e:
+                error = f"{type(e).__name__}: {e}"
+                metrics.inc("http_retries_total", api="crawl", reason="error")
+                if attempt < max_retries:
+                    time.sleep(2 ** attempt)
+        else:
+            tqdm.write(f"Giving up on {category_name} after {page_index} page(s): {error}")
+            checkpoint.mark_failed(category_name, error)
+            return False
+
+        page_titles = []
+        page_subcats = []
+        for page_id, page in DATA.get("query", {}).get("pages", {}).items():
+            if page.get('ns') == 0:
+                revisions = page.get('revisions', [])
+                current_revid = revisions[0]['revid'] if revisions else 0
+                page_titles.append({'title': page['title'], 'revid': current_revid})
+            elif page.get('ns') == 14:
+                page_subcats.append(page['title'])
+
+        # Titles are classified as they arrive, the decisions are checkpointed with them
+        classify_rows(page_titles)
+        gcmcontinue = DATA.get("continue", {}).get("gcmcontinue")
+        checkpoint.record_page(category_name, page_index, page_titles, page_subcats, gcmcontinue)
+        metrics.inc("crawl_pages_total")
+        metrics.inc("crawl_titles_total", len(page_titles))
+        metrics.inc("crawl_titles_kept_total", sum(row['keep'] == 'KEPT' for row in page_titles))
+        page_index += 1
+
+        if gcmcontinue is None:
+            break
+        PARAMS["gcmcontinue"] = gcmcontinue
+
+    checkpoint.mark_done(category_name)
+    return True
+
+
+def crawl_categories_concurrent(
+    checkpoint: CrawlCheckpoint,
+    user_agent: str,
+    max_workers: int = 8,
+    requests_per_second: Optional[float] = 10.0,
+    api_url: str = WIKI_API_URL,
+    pbar: Optional[tqdm] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Breadth-first crawl of the category tree with a bounded thread pool.
+
+    Each level is fetched concurrently; a category is fetched once, at the shallowest
+    depth it is reachable from, which always covers what the depth-first walk visits.
+    All workers share one TokenBucket so the API sees at most `requests_per_second`.
+    The frontier lives in the checkpoint, so a resumed crawl picks up pending and
+    previously failed categories first.
+    """
+    limiter = TokenBucket(requests_per_second)
+    local = threading.local()
+
+    def worker(category_name: str) -> bool:
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        return fetch_category_members(
+            category_name, user_agent, local.session, limiter, checkpoint, api_url
+        )
+
+    failed_this_run: Set[str] = set()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            depth, frontier = checkpoint.frontier(exclude=failed_this_run)
+            if not frontier:
+                break
+            metrics.set_gauge("crawl_frontier_size", len(frontier), depth=depth)
+            if pbar is not None:
+                pbar.set_description(f"Depth {depth}")
+            for category_name, ok in zip(frontier, executor.map(worker, frontier)):
+                if not ok:
+                    failed_this_run.add(category_name)
+                if pbar is not None:
+                    pbar.update(1)
+
+    return checkpoint.members()
+
+
+def replay_depth_first(
+    category_name: str,
+    members: Dict[str, Dict[str, Any]],
+    titles_data: List[Dict[str, Any]],
+    current_depth: int,
+    max_depth: int
+) -> None:
+    """
+    Rebuilds titles_data from crawled members in the exact order
+    get_category_members_recursive produces, updating PROCESSED_CATEGORIES.
+    """
+    if category_name in PROCESSED_CATEGORIES:
+        return
+    PROCESSED_CATEGORIES.add(category_name)
+
+    result = members.get(category_name, {"pages": [], "complete": False})
+    for page_titles, _ in result["pages"]:
+        titles_data.extend(page_titles)
+
+    if not result["complete"] or not result["pages"] or current_depth >= max_depth:
+        return
+
+    for subcat_title in result["pages"][-1][1]:
+        replay_depth_first(subcat_title, members, titles_data, current_depth + 1, max_depth)
+
+
+def collect_category_titles(
+    start_category: str,
+    max_depth: int,
+    user_agent: str,
+    max_workers: int = 8,
+    requests_per_second: Optional[float] = 10.0,
+    api_url: str = WIKI_API_URL,
+    checkpoint: Optional[CrawlCheckpoint] = None
+) -> List[Dict[str, Any]]:
+    """
+    Returns the {'title', 'revid'} rows found under start_category.
+
+    Without a checkpoint, max_workers=1 keeps the original blocking depth-first walk.
+    Otherwise the breadth-first thread pool is used, rate-limited to
+    `requests_per_second`, and its result replayed depth-first so the rows (and
+    their order) are identical either way.
+    """
+    titles_data: List[Dict[str, Any]] = []
+    PROCESSED_CATEGORIES.clear()
+
+    with tqdm(desc="Init", unit="cat") as pbar:
+        if max_workers <= 1 and checkpoint is None:
+            S = requests.Session()
+            get_category_members_recursive(
+                start_category, 
+                titles_data, 
+                user_agent, 
+                S, 
+                pbar, 
+                current_depth=0, 
+                max_depth=max_depth,
+                api_url=api_url
+            )
+        else:
+            if checkpoint is None:
+                checkpoint = CrawlCheckpoint(":memory:", start_category, max_depth)
+            members = crawl_categories_concurrent(
+                checkpoint,
+                user_agent,
+                max_workers=max_workers,
+                requests_per_second=requests_per_second,
+                api_url=api_url,
+                pbar=pbar
+            )
+            replay_depth_first(start_category, members, titles_data, 0, max_depth)
+            pbar.set_postfix({"Articles": len(titles_data)})
+
+    return titles_data
+
+
 def scrape_bilateral_relations_data(
     start_category: str = "Category:Bilateral relations by country",
     filename: str = "wiki_bilateral_relations.csv",
     max_depth: int = 2,
-    user_agent: str = "Geopolitical-Map/2.0 (Contact: robin.mariaccia@gmail.com)"
+    user_agent: str = "Geopolitical-Map/2.0 (Contact: robin.mariaccia@gmail.com)",
+    max_workers: int = 8,
+    requests_per_second: Optional[float] = 10.0,
+    api_url: str = WIKI_API_URL,
+    checkpoint_path: Optional[str] = "wiki_crawl_checkpoint.sqlite"
 ) -> None:
-    
+    """
+    Crawls the category tree and writes the title index CSV: title, revid, keep
+    (KEPT / IGNORED) and the rule that decided it (see title_classifier). Titles
+    are classified as the crawler finds them.
+
+    Progress is stored in `checkpoint_path` as the crawl goes, so an interrupted run
+    resumes where it stopped. The checkpoint is deleted once the CSV is written with
+    no failed categories; otherwise it is kept and the next run retries them.
+    Pass checkpoint_path=None to crawl purely in memory.
+    """
     print(f"Starting recursive data acquisition (Max Depth: {max_depth})...")
-    S = requests.Session()
-    titles_data: List[Dict[str, Any]] = []
-    
-    PROCESSED_CATEGORIES.clear()
-    
-    with tqdm(desc="Init", unit="cat") as pbar:
-        get_category_members_recursive(
-            start_category, 
-            titles_data, 
-            user_agent, 
-            S, 
-            pbar, 
-            current_depth=0, 
-            max_depth=max_depth
-        )
+    checkpoint = None
+    if checkpoint_path:
+        if os.path.exists(checkpoint_path):
+            print(f"Resuming crawl from {checkpoint_path}")
+        checkpoint = CrawlCheckpoint(checkpoint_path, start_category, max_depth)
+
+    titles_data = collect_category_titles(
+        start_category,
+        max_depth,
+        user_agent,
+        max_workers=max_workers,
+        requests_per_second=requests_per_second,
+        api_url=api_url,
+        checkpoint=checkpoint
+    )
+
+    failed = checkpoint.failed_categories() if checkpoint else []
+    for name, attempts, error in failed:
+        print(f"Failed category ({attempts} run(s)): {name} -> {error}")
             
     if titles_data:
+        # Pages restored from a checkpoint written before classification was stored
+        classify_rows([row for row in titles_data if 'keep' not in row])
         try:
             with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-                fieldnames = ['title', 'revid']
+                fieldnames = ['title', 'revid', 'keep', 'rule']
                 writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
                 writer.writeheader()
                 writer.writerows(titles_data)
-            print(f"Finished. Successfully wrote {len(titles_data)} titles to {filename}")
-            df = pd.read_csv('wiki_bilateral_relations.csv')
-            
-            df['keep'] = df['title'].apply(categorize_title)
-            output_df = df[['title', 'revid', 'keep']]
-            output_df.to_csv('wiki_bilateral_relations.csv', index=False)
+            kept = sum(row['keep'] == 'KEPT' for row in titles_data)
+            print(f"Finished. Successfully wrote {len(titles_data)} titles ({kept} kept) to {filename}")
         except IOError as e:
             print(f"Error writing to CSV file: {e}")
+            failed = failed or [("CSV", 0, str(e))]
     else:
         print("Completed traversal, but no articles were found.")
 
+    if checkpoint:
+        if failed:
+            checkpoint.close()
+            print(f"{len(failed)} category(ies) incomplete, rerun to retry them from {checkpoint_path}")
+        else:
+            checkpoint.remove()
 
-PRIORITY_KEEPS = [
-    "great game", "shootdown", "spy case", "cold war", "incident", "scandal"
-]
-
-NOISE_KEYWORDS_RAW = [
-    # Substring matches
-    "football", "soccer", "olympic", "championship", "tournament",
-    "movie", "music", "song", "album", "orchestra", "festival",
-    "museum", "exhibition", "theatre", "species", "garden",
-    "list of ambassadors", "list of high commissioners", "list of consuls",
-    "list of diplomatic missions", "list of twin towns", "sister cities",
-    # Exact word matches
-    "film", "park", "cup", "game", "match", "sport", "race"
-]
-
-INTERESTING_KEYWORDS_RAW = [
-    "relations", "embassy", "consulate", "liaison", "mission",
-    "summit", "visit", "trip", "dialogue", "conference", "forum",
-    "treaty", "accord", "agreement", "memorandum", "declaration", "protocol",
-    "alliance", "partnership", "cooperation", "recognition",
-    "affair", "election", "referendum", "protest",
-    "rights", "democracy", "government", "office", "institute",
-    "reconciliation", "repatriation", "party", "authority", "council",
-    "committee", "bloc", "federation", "conquest", "skirmish",
-    "pact", "talks", "hotline", "nunciature", "ambassador",
-    "diplomat", "high commission",
-    "war", "conflict", "dispute", "crisis", "tension", "standoff",
-    "invasion", "occupation", "annexation", "coup", "uprising", "insurgency",
-    "terror", "bombing", "attack", "airstrike", "hostage", "sanction",
-    "intelligence", "espionage", "surveillance", "cyber",
-    "operation", "assassination", "clash",
-    "massacre", "hack", "arrest", "detention", "prisoner",
-    "border", "boundary", "territory", "claim", "eez", "continental shelf",
-    "maritime", "naval", "patrol", "coast guard", "joint exercise",
-    "island", "archipelago", "trade", "tariff", "pipeline", "refugee", 
-    "migration", "deportation", "asylum", "loan", "debt",
-    "railway", "highway"
-]
-
-# Strict words: Must be exact whole words (e.g. "aid" but not "raid")
-STRICT_INTEREST_WORDS = ["dam", "act", "aid", "trip", "vote", "gas", "oil", "ban", "party", "zone"]
 
+# Regex form of title_classifier.TITLE_RULES, one title at a time; kept as the
+# reference the classifier is checked against (benchmarks.benchmark_title_classifier)
 def compile_patterns():
     # Priority: Substring match
     p_pattern = re.compile(r"|".join(map(re.escape, PRIORITY_KEEPS)), re.IGNORECASE)
 
     # Noise: Mix of whole words (\b) and substrings
-    exact_noise = ["film", "park", "cup", "game", "match", "sport", "race"]
-    substring_noise = [w for w in NOISE_KEYWORDS_RAW if w not in exact_noise]
+    substring_noise = [w for w in NOISE_KEYWORDS_RAW if w not in EXACT_NOISE_WORDS]
     
     noise_regex_parts = [re.escape(w) for w in substring_noise] + \
-                        [r'\b' + re.escape(w) + r'\b' for w in exact_noise]
+                        [r'\b' + re.escape(w) + r'\b' for w in EXACT_NOISE_WORDS]
     n_pattern = re.compile(r"|".join(noise_regex_parts), re.IGNORECASE)
 
     # Interest: Mix of strict words and substrings
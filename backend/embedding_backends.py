@@ -0,0 +1,166 @@
+import glob
+import importlib.util
+import os
+import platform
+from typing import TYPE_CHECKING, List, Optional
+
+import numpy as np
+
+# torch and sentence_transformers take seconds to import: they are loaded by the
+# functions that need a model, not when this module is imported (see make_encoder)
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+MODEL_NAME = 'all-MiniLM-L6-v2'
+EMBEDDING_BACKENDS = ("local", "pool", "onnx")
+ONNX_DIR = "onnx_models"
+# Sequence-length bucketing: a batch holds about this many tokens, so short chunks go
+# in large batches and long ones in small batches instead of one fixed size.
+TOKENS_PER_BATCH = 16384
+MIN_BATCH_SIZE = 8
+MAX_BATCH_SIZE = 512
+
+
+def check_device():
+    import torch
+
+    if torch.cuda.is_available():
+        return "cuda"
+    elif torch.backends.mps.is_available():
+        return "mps"
+    else:
+        return "cpu"
+
+
+# ==============================================================================
+# ENCODERS
+# ==============================================================================
+class Encoder:
+    """
+    Common interface of the embedding backends: encode(texts) returns a float32
+    (len(texts), dimension) array in input order. Texts are sorted by length and cut
+    into buckets whose batch size follows TOKENS_PER_BATCH. `device` is where the
+    model runs, for the caller to report.
+    """
+
+    def __init__(self, model: "SentenceTransformer"):
+        self.model = model
+        self.device = str(model.device)
+        self.dimension = model.get_sentence_embedding_dimension()
+        self.max_tokens = model.max_seq_length or 512
+
+    def _token_lengths(self, texts: List[str]) -> np.ndarray:
+        # ~4 characters per token, truncated by the model anyway
+        return np.minimum(np.fromiter((len(t) // 4 + 2 for t in texts), dtype=np.int64, count=len(texts)),
+                          self.max_tokens)
+
+    def encode(self, texts: List[str], **_) -> np.ndarray:
+        out = np.empty((len(texts), self.dimension), dtype=np.float32)
+        if not texts:
+            return out
+        lengths = self._token_lengths(texts)
+        order = np.argsort(lengths, kind='stable')
+        start = 0
+        while start < len(order):
+            # Sorted ascending, so the bucket's cost is its size times its last length
+            end = min(start + MIN_BATCH_SIZE, len(order))
+            while (end < len(order) and end - start < MAX_BATCH_SIZE
+                   and lengths[order[end]] * (end - start + 1) <= TOKENS_PER_BATCH):
+                end += 1
+            rows = order[start:end]
+            out[rows] = self._encode_batch([texts[i] for i in rows], len(rows))
+            start = end
+        return out
+
+    def _encode_batch(self, texts: List[str], batch_size: int) -> np.ndarray:
+        return self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+
+    def close(self) -> None:
+        pass
+
+
+class PoolEncoder(Encoder):
+    """
+    Encodes on a pool of CPU worker processes (one model each). All texts go to the
+    pool in one call, sorted by length so every chunk a worker takes holds similar
+    lengths, with 4 chunks per worker to balance their costs. The batch size follows
+    TOKENS_PER_BATCH for the 90th percentile length.
+    """
+
+    def __init__(self, model: "SentenceTransformer", workers: Optional[int] = None):
+        super().__init__(model)
+        self.pool = model.start_multi_process_pool(target_devices=["cpu"] * (workers or os.cpu_count()))
+
+    def encode(self, texts: List[str], **_) -> np.ndarray:
+        out = np.empty((len(texts), self.dimension), dtype=np.float32)
+        if not texts:
+            return out
+        lengths = self._token_lengths(texts)
+        order = np.argsort(lengths, kind='stable')
+        batch_size = int(np.clip(TOKENS_PER_BATCH // np.percentile(lengths, 90), MIN_BATCH_SIZE, MAX_BATCH_SIZE))
+        workers = len(self.pool["processes"])
+        out[order] = self.model.encode_multi_process(
+            [texts[i] for i in order], self.pool, batch_size=batch_size,
+            chunk_size=max(1, -(-len(texts) // (4 * workers)))
+        )
+        return out
+
+    def close(self) -> None:
+        self.model.stop_multi_process_pool(self.pool)
+
+
+def default_quantization() -> str:
+    return "arm64" if platform.machine().lower() in ("arm64", "aarch64") else "avx2"
+
+
+def load_onnx_int8(model_name: str = MODEL_NAME, onnx_dir: str = ONNX_DIR, quantization: Optional[str] = None) -> "SentenceTransformer":
+    """
+    Loads the int8 dynamically quantized ONNX export of `model_name`, exporting it to
+    `onnx_dir` on first use (sentence-transformers' ONNX backend and
+    export_dynamic_quantized_onnx_model).
+    """
+    # An optional extra, not in requirements.txt: only the onnx backend needs it
+    missing = [name for name in ("optimum", "onnxruntime") if importlib.util.find_spec(name) is None]
+    if missing:
+        raise ImportError(f"The onnx embedding backend needs optimum[onnxruntime] ({', '.join(missing)} not found): "
+                          "pip install \"optimum[onnxruntime]\"")
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    quantization = quantization or default_quantization()
+    target = os.path.join(onnx_dir, model_name.replace("/", "_"))
+    pattern = os.path.join(target, "onnx", f"model_*{quantization}.onnx")
+    if not glob.glob(pattern):
+        print(f"Exporting {model_name} to int8 ONNX ({quantization}) in {target}...")
+        model = SentenceTransformer(model_name, backend="onnx", device="cpu")
+        model.save(target)
+        export_dynamic_quantized_onnx_model(model, quantization, target)
+    file_name = os.path.relpath(sorted(glob.glob(pattern))[0], target)
+    return SentenceTransformer(target, backend="onnx", device="cpu", model_kwargs={"file_name": file_name})
+
+
+def cache_model_name(backend: str = "local", model_name: str = MODEL_NAME) -> str:
+    """Embedding cache key: the pool computes the same vectors as local, int8 ONNX does not."""
+    return f"{model_name}-onnx-int8" if backend == "onnx" else model_name
+
+
+def make_encoder(
+    backend: str = "local",
+    model_name: str = MODEL_NAME,
+    workers: Optional[int] = None,
+    quantization: Optional[str] = None
+) -> Encoder:
+    """
+    Returns the embedding backend:
+        local - the in-process SentenceTransformer on the best device (previous behaviour)
+        pool  - a multi-process encode pool on `workers` CPU cores (default: all)
+        onnx  - ONNX Runtime with an int8 quantized export of the same model
+    """
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "local":
+        return Encoder(SentenceTransformer(model_name, device=check_device()))
+    if backend == "pool":
+        return PoolEncoder(SentenceTransformer(model_name, device="cpu"), workers)
+    if backend == "onnx":
+        return Encoder(load_onnx_int8(model_name, quantization=quantization))
+    raise ValueError(f"Unknown embedding backend '{backend}', expected one of {EMBEDDING_BACKENDS}.")
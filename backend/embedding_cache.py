@@ -0,0 +1,136 @@
+import json
+import os
+import re
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+EMBEDDING_CACHE_DIR = "embedding_cache"
+
+
+def chunk_key(content_hash: str) -> int:
+    """64-bit cache key of a chunk: the first 8 bytes of its md5 hex id."""
+    return int(content_hash[:16], 16)
+
+
+class EmbeddingCache:
+    """
+    Persistent embeddings keyed by (model name, chunk hash).
+
+    Each model gets its own directory under `root` holding:
+        vectors.f16 - row-major float16 matrix, one row per cached chunk
+        keys.u64    - the chunk key of every row, in row order
+        meta.json   - model name and dimension
+    Both data files are memory-mapped and only ever appended to, vectors first, so a
+    run that dies mid-write leaves at most a partial row that is dropped on load.
+    Rows are looked up through a sorted copy of the keys (binary search per batch);
+    rows added during this session sit in a dict until the next load.
+    compact() rewrites the files keeping only the chunks that still exist.
+    """
+
+    def __init__(self, model_name: str, dim: int, root: str = EMBEDDING_CACHE_DIR):
+        self.model_name = model_name
+        self.dim = dim
+        self.directory = os.path.join(root, re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name))
+        self.vectors_path = os.path.join(self.directory, "vectors.f16")
+        self.keys_path = os.path.join(self.directory, "keys.u64")
+        os.makedirs(self.directory, exist_ok=True)
+
+        meta_path = os.path.join(self.directory, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get("dim") != dim:
+                raise ValueError(f"{self.directory} holds {meta.get('dim')}-d vectors, expected {dim}.")
+        else:
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump({"model": model_name, "dim": dim}, f)
+        self._load()
+
+    # --- Storage ----------------------------------------------------------------
+    def _map(self, path: str, dtype: str, count: int) -> np.ndarray:
+        if count == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+
+    def _load(self) -> None:
+        n_vectors = os.path.getsize(self.vectors_path) // (2 * self.dim) if os.path.exists(self.vectors_path) else 0
+        n_keys = os.path.getsize(self.keys_path) // 8 if os.path.exists(self.keys_path) else 0
+        self.rows = min(n_vectors, n_keys)
+        for path, width in ((self.vectors_path, 2 * self.dim), (self.keys_path, 8)):
+            if os.path.exists(path) and os.path.getsize(path) != self.rows * width:
+                with open(path, 'r+b') as f:
+                    f.truncate(self.rows * width)
+
+        keys = self._map(self.keys_path, '<u8', self.rows)
+        self._order = np.argsort(keys, kind='stable')
+        self._sorted_keys = np.asarray(keys[self._order])
+        self._new: dict = {}
+        self._vectors = self._map(self.vectors_path, '<f2', self.rows * self.dim).reshape(-1, self.dim)
+
+    def __len__(self) -> int:
+        return self.rows
+
+    # --- Lookup -----------------------------------------------------------------
+    def get(self, keys: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (found mask, float32 vectors of the found keys, in order).
+        """
+        query = np.fromiter(keys, dtype='<u8', count=len(keys))
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        if len(self._sorted_keys):
+            pos = np.minimum(np.searchsorted(self._sorted_keys, query), len(self._sorted_keys) - 1)
+            hit = self._sorted_keys[pos] == query
+            rows[hit] = self._order[pos[hit]]
+        for i, key in enumerate(keys):
+            if rows[i] < 0 and key in self._new:
+                rows[i] = self._new[key]
+
+        found = rows >= 0
+        if found.any() and rows.max() >= len(self._vectors):
+            self._vectors = self._map(self.vectors_path, '<f2', self.rows * self.dim).reshape(-1, self.dim)
+        return found, np.asarray(self._vectors[rows[found]], dtype=np.float32)
+
+    def put(self, keys: List[int], vectors: np.ndarray) -> np.ndarray:
+        """
+        Appends new rows and returns the vectors as stored (rounded to float16), so
+        fresh and cached vectors of the same chunk are bit-identical.
+        """
+        stored = np.ascontiguousarray(vectors, dtype='<f2')
+        if stored.shape != (len(keys), self.dim):
+            raise ValueError(f"Expected {len(keys)} x {self.dim} vectors, got {stored.shape}.")
+        with open(self.vectors_path, 'ab') as f:
+            f.write(stored.tobytes())
+        with open(self.keys_path, 'ab') as f:
+            f.write(np.fromiter(keys, dtype='<u8', count=len(keys)).tobytes())
+        for key in keys:
+            self._new[key] = self.rows
+            self.rows += 1
+        return stored.astype(np.float32)
+
+    # --- Maintenance ------------------------------------------------------------
+    def compact(self, live_keys: Iterable[int]) -> Tuple[int, int]:
+        """
+        Rewrites the cache with one row per key in `live_keys` that is cached, evicting
+        rows of chunks that no longer exist (and duplicate rows). Returns (kept, evicted).
+        """
+        live = np.unique(np.fromiter(live_keys, dtype='<u8'))
+        keys = self._map(self.keys_path, '<u8', self.rows)
+        vectors = self._map(self.vectors_path, '<f2', self.rows * self.dim).reshape(-1, self.dim)
+        _, first_rows = np.unique(keys, return_index=True)
+        keep = np.sort(first_rows[np.isin(keys[first_rows], live)])
+
+        with open(self.vectors_path + ".tmp", 'wb') as fv, open(self.keys_path + ".tmp", 'wb') as fk:
+            for start in range(0, len(keep), 65536):
+                rows = keep[start:start + 65536]
+                fv.write(np.asarray(vectors[rows]).tobytes())
+                fk.write(np.asarray(keys[rows]).tobytes())
+
+        evicted = self.rows - len(keep)
+        # Release every map of the old files before replacing them (required on Windows)
+        del keys, vectors
+        self._vectors = self._sorted_keys = self._order = None
+        os.replace(self.vectors_path + ".tmp", self.vectors_path)
+        os.replace(self.keys_path + ".tmp", self.keys_path)
+        self._load()
+        return len(keep), evicted
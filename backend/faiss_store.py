@@ -0,0 +1,372 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+import faiss
+import numpy as np
+
+from .embedding_cache import EmbeddingCache, chunk_key
+from .vector_store import STORE_PATHS, SearchHit, VectorStore
+
+FAISS_DIR = STORE_PATHS["faiss"]
+FAISS_INDEX_TYPES = ("hnsw", "ivfpq")
+FAISS_INDEX_TYPE = "hnsw"  # index type of a new store
+VECTOR_SIZE = 384
+# HNSW: graph degree and construction / search beam widths
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 128
+HNSW_EF_SEARCH_MAX = 1024  # beam width cap of filtered searches, widened by the filter's selectivity
+# IVF-PQ: at most IVF_NLIST lists (~39 training points each), PQ_M sub-quantizers of
+# PQ_BITS bits (48 bytes per 384-d vector). Until IVF_TRAIN_SIZE vectors are stored
+# the index is an exact flat one, then it is trained on them and converted.
+IVF_NLIST = 1024
+IVF_NPROBE = 32
+IVF_RERANK_FACTOR = 8  # PQ candidates per result, rescored with the stored float16 vectors
+IVF_TRAIN_SIZE = 20000
+PQ_M = 48
+PQ_BITS = 8
+# HNSW graphs cannot delete: deleted ids are masked until they reach this share of the
+# index, then the graph is rebuilt from the live vectors on save.
+REBUILD_FRACTION = 0.2
+# Filtered searches allowing at most this many points score them all exactly (a graph
+# or IVF search with a narrow filter finds fewer than k of them)
+EXACT_SEARCH_MAX = 4096
+SQLITE_BATCH = 900  # stays under SQLite's bound-parameter limit
+TERM_FIELDS = ("country", "pair")  # payload fields searches can filter on, besides title and revid
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS points (key INTEGER PRIMARY KEY, id TEXT, title TEXT, revid INTEGER, payload TEXT);
+CREATE INDEX IF NOT EXISTS points_title ON points (title);
+CREATE TABLE IF NOT EXISTS terms (key INTEGER, field TEXT, value TEXT);
+CREATE INDEX IF NOT EXISTS terms_value ON terms (field, value);
+CREATE INDEX IF NOT EXISTS terms_key ON terms (key);
+CREATE TABLE IF NOT EXISTS tombstones (key INTEGER PRIMARY KEY);
+"""
+
+
+def faiss_key(content_hash: str) -> int:
+    """FAISS id of a point: its 64-bit chunk key as a signed int64."""
+    key = chunk_key(content_hash)
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+
+def _unsigned(keys) -> List[int]:
+    """Chunk keys (the EmbeddingCache keys) of FAISS ids."""
+    return np.asarray(keys, dtype=np.int64).view(np.uint64).tolist()
+
+
+def _as_list(value: Any) -> List[Any]:
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+
+class FaissStore(VectorStore):
+    """
+    A VectorStore held in-process:
+
+        index.faiss     - the FAISS index (inner product over normalized vectors), ids
+                          are the 64-bit chunk keys
+        payloads.sqlite - payload side-car: title, revid and the JSON payload per key,
+                          one row per country / pair value, and the ids masked out
+                          of an HNSW graph
+
+        vectors/        - IVF-PQ stores only: the normalized vectors as float16, in an
+                          EmbeddingCache, to rescore PQ candidates exactly
+
+    `index_type` is "hnsw" (IndexHNSWFlat) or "ivfpq" (IndexIVFPQ), fixed when the
+    store is created. An HNSW store is loaded into RAM whole, read_only or not: FAISS
+    cannot memory-map a graph. With read_only an IVF-PQ index file is opened with
+    IO_FLAG_MMAP, so its inverted lists are mapped instead of read, and the float16
+    vectors are memory-mapped too. Writes go to memory and reach disk on save()/close().
+
+    Filtered searches that allow at most EXACT_SEARCH_MAX points score them exactly;
+    wider ones search the index with the filter as an ID selector.
+    """
+
+    def __init__(
+        self,
+        directory: str = FAISS_DIR,
+        index_type: str = FAISS_INDEX_TYPE,
+        dim: int = VECTOR_SIZE,
+        read_only: bool = False
+    ):
+        os.makedirs(directory, exist_ok=True)
+        self.index_path = os.path.join(directory, "index.faiss")
+        self.read_only = read_only
+        self.lock = threading.Lock()
+
+        meta_path = os.path.join(directory, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            index_type, dim = meta["index_type"], meta["dim"]
+        else:
+            if index_type not in FAISS_INDEX_TYPES:
+                raise ValueError(f"Unknown FAISS index type '{index_type}', expected one of {FAISS_INDEX_TYPES}.")
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump({"index_type": index_type, "dim": dim}, f)
+        self.index_type = index_type
+        self.dim = dim
+
+        self.db = sqlite3.connect(os.path.join(directory, "payloads.sqlite"), check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        if os.path.exists(self.index_path):
+            self.index = faiss.read_index(self.index_path, faiss.IO_FLAG_MMAP if read_only else 0)
+        else:
+            self.index = self._new_index()
+        self.vectors = EmbeddingCache("vectors", dim, directory) if index_type == "ivfpq" else None
+        self.dirty = False
+
+    # --- Index ------------------------------------------------------------------
+    def _new_index(self):
+        if self.index_type == "hnsw":
+            hnsw = faiss.IndexHNSWFlat(self.dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            hnsw.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+            return faiss.IndexIDMap2(hnsw)
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(self.dim))
+
+    def _is_ivf(self) -> bool:
+        return isinstance(self.index, faiss.IndexIVF)
+
+    def _stored_vectors(self):
+        """(keys, vectors) of every vector in an IndexIDMap2, masked ones included."""
+        keys = faiss.vector_to_array(self.index.id_map)
+        return keys, self.index.index.reconstruct_n(0, self.index.ntotal)
+
+    def _train_ivfpq(self) -> None:
+        """Replaces the exact staging index by an IVF-PQ index trained on its vectors."""
+        keys, vectors = self._stored_vectors()
+        nlist = max(1, min(IVF_NLIST, len(keys) // 39))
+        quantizer = faiss.IndexFlatIP(self.dim)
+        index = faiss.IndexIVFPQ(quantizer, self.dim, nlist, PQ_M, PQ_BITS, faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+        index.add_with_ids(vectors, keys)
+        index.nprobe = IVF_NPROBE
+        self.index = index
+
+    def _rebuild_hnsw(self) -> None:
+        """Rebuilds the graph without its masked ids."""
+        keys, vectors = self._stored_vectors()
+        live = ~np.isin(keys, self._tombstones())
+        self.index = self._new_index()
+        if live.any():
+            self.index.add_with_ids(vectors[live], keys[live])
+        self.db.execute("DELETE FROM tombstones")
+
+    def _tombstones(self) -> np.ndarray:
+        return np.fromiter((row[0] for row in self.db.execute("SELECT key FROM tombstones")), dtype=np.int64)
+
+    def _exact_vectors(self, keys: np.ndarray) -> Optional[np.ndarray]:
+        """The stored vectors of `keys`, or None when some are not stored exactly."""
+        if self.vectors is None:
+            return self.index.reconstruct_batch(keys)
+        found, vectors = self.vectors.get(_unsigned(keys))
+        return vectors if found.all() else None
+
+    def _exact_search(self, query: np.ndarray, keys: np.ndarray, k: int) -> Optional[List[tuple]]:
+        """Top k of `keys` by exact inner product, or None (see _exact_vectors)."""
+        vectors = self._exact_vectors(keys)
+        if vectors is None:
+            return None
+        scores = vectors @ query[0]
+        top = np.argsort(-scores, kind='stable')[:k]
+        return [(int(keys[i]), float(scores[i])) for i in top]
+
+    def _remove(self, keys: List[int]) -> None:
+        if not keys:
+            return
+        if self.index_type == "hnsw":
+            self.db.executemany("INSERT OR IGNORE INTO tombstones VALUES (?)", [(k,) for k in keys])
+        else:
+            self.index.remove_ids(np.asarray(keys, dtype=np.int64))
+        self.dirty = True
+
+    # --- SQLite helpers ----------------------------------------------------------
+    def _select(self, sql: str, values: List[Any], params: tuple = ()) -> List[tuple]:
+        """Runs `sql` containing one "IN ({})" over `values` in batches."""
+        rows = []
+        for i in range(0, len(values), SQLITE_BATCH):
+            part = values[i:i + SQLITE_BATCH]
+            rows.extend(self.db.execute(sql.format(",".join("?" * len(part))), (*params, *part)))
+        return rows
+
+    def _delete_keys(self, keys: List[int]) -> None:
+        for i in range(0, len(keys), SQLITE_BATCH):
+            part = [(k,) for k in keys[i:i + SQLITE_BATCH]]
+            self.db.executemany("DELETE FROM points WHERE key = ?", part)
+            self.db.executemany("DELETE FROM terms WHERE key = ?", part)
+        self._remove(keys)
+
+    def _write_payloads(self, keys: List[int], ids: List[str], payloads: List[Dict[str, Any]]) -> None:
+        self.db.executemany(
+            "INSERT OR REPLACE INTO points VALUES (?, ?, ?, ?, ?)",
+            [(k, i, p.get("title"), p.get("revid"), json.dumps(p, ensure_ascii=False))
+             for k, i, p in zip(keys, ids, payloads)]
+        )
+        self.db.executemany("DELETE FROM terms WHERE key = ?", [(k,) for k in keys])
+        self.db.executemany(
+            "INSERT INTO terms VALUES (?, ?, ?)",
+            [(k, field, value) for k, p in zip(keys, payloads) for field in TERM_FIELDS
+             for value in _as_list(p.get(field)) if value is not None]
+        )
+
+    # --- VectorStore ---------------------------------------------------------------
+    def retrieve(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        with self.lock:
+            rows = self._select("SELECT id, title, revid FROM points WHERE key IN ({})", [faiss_key(i) for i in ids])
+        return {i: {"title": title, "revid": revid} for i, title, revid in rows}
+
+    def fetch(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        with self.lock:
+            rows = self._select("SELECT id, payload FROM points WHERE key IN ({})", [faiss_key(i) for i in ids])
+        return {i: json.loads(p) for i, p in rows}
+
+    def set_payload(self, ids: List[str], payload: Dict[str, Any]) -> None:
+        with self.lock:
+            rows = self._select("SELECT key, id, payload FROM points WHERE key IN ({})", [faiss_key(i) for i in ids])
+            merged = [{**json.loads(p), **payload} for _, _, p in rows]
+            self._write_payloads([r[0] for r in rows], [r[1] for r in rows], merged)
+            self.db.commit()
+
+    def upsert(self, ids: List[str], vectors: np.ndarray, payloads: List[Dict[str, Any]]) -> None:
+        keys = [faiss_key(i) for i in ids]
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).copy()
+        faiss.normalize_L2(vectors)
+        with self.lock:
+            if self.index_type == "hnsw":
+                # Same id, same text, same vector: points already in the graph (live or
+                # masked) keep their vector and are just unmasked
+                known = {r[0] for r in self._select("SELECT key FROM points WHERE key IN ({})", keys)}
+                known |= {r[0] for r in self._select("SELECT key FROM tombstones WHERE key IN ({})", keys)}
+                self.db.executemany("DELETE FROM tombstones WHERE key = ?", [(k,) for k in keys])
+                add = np.array([k not in known for k in keys], dtype=bool)
+            else:
+                self.index.remove_ids(np.asarray(keys, dtype=np.int64))
+                add = np.ones(len(keys), dtype=bool)
+            if add.any():
+                self.index.add_with_ids(vectors[add], np.asarray(keys, dtype=np.int64)[add])
+            if self.vectors is not None:
+                found, _ = self.vectors.get(_unsigned(keys))
+                if not found.all():
+                    self.vectors.put(_unsigned(np.asarray(keys)[~found]), vectors[~found])
+            if self.index_type == "ivfpq" and not self._is_ivf() and self.index.ntotal >= IVF_TRAIN_SIZE:
+                self._train_ivfpq()
+            self._write_payloads(keys, ids, payloads)
+            self.db.commit()
+            self.dirty = True
+
+    def delete_ids(self, ids: List[str]) -> None:
+        with self.lock:
+            self._delete_keys([faiss_key(i) for i in ids])
+            self.db.commit()
+
+    def delete_titles(self, titles: List[str]) -> None:
+        with self.lock:
+            keys = [r[0] for r in self._select("SELECT key FROM points WHERE title IN ({})", list(titles))]
+            self._delete_keys(keys)
+            self.db.commit()
+
+    def delete_stale(self, title: str, revid: Optional[int], keep_ids: Optional[List[str]] = None) -> None:
+        keep = {faiss_key(i) for i in keep_ids or []}
+        with self.lock:
+            rows = self.db.execute("SELECT key, revid FROM points WHERE title = ?", (title,)).fetchall()
+            if revid is not None:
+                stale = [k for k, r in rows if r != revid]
+            else:
+                stale = [k for k, _ in rows if k not in keep]
+            self._delete_keys(stale)
+            self.db.commit()
+
+    def iter_ids(self) -> Iterator[str]:
+        with self.lock:
+            ids = [r[0] for r in self.db.execute("SELECT id FROM points")]
+        return iter(ids)
+
+    def _allowed_keys(self, filters: Dict[str, Any]) -> np.ndarray:
+        allowed = None
+        for field, value in filters.items():
+            values = _as_list(value)
+            if field in TERM_FIELDS:
+                rows = self._select("SELECT key FROM terms WHERE field = ? AND value IN ({})", values, (field,))
+            elif field in ("title", "revid"):
+                rows = self._select(f"SELECT key FROM points WHERE {field} IN ({{}})", values)
+            else:
+                raise ValueError(f"Cannot filter a FAISS store on '{field}'.")
+            keys = {r[0] for r in rows}
+            allowed = keys if allowed is None else allowed & keys
+        return np.fromiter(allowed, dtype=np.int64)
+
+    def search(self, vector: np.ndarray, k: int = 5, filters: Optional[Dict[str, Any]] = None) -> List[SearchHit]:
+        query = np.ascontiguousarray(np.asarray(vector, dtype=np.float32).reshape(1, -1)).copy()
+        faiss.normalize_L2(query)
+        with self.lock:
+            if self.index.ntotal == 0:
+                return []
+            found = None
+            selector = None
+            ef_search = max(HNSW_EF_SEARCH, k)
+            if filters:
+                allowed = self._allowed_keys(filters)
+                if not len(allowed):
+                    return []
+                if len(allowed) <= EXACT_SEARCH_MAX:
+                    found = self._exact_search(query, allowed, k)
+                selector = faiss.IDSelectorBatch(allowed)
+                # The graph walk drops the points the filter rejects: widen the beam accordingly
+                ef_search = min(HNSW_EF_SEARCH_MAX, ef_search * -(-self.index.ntotal // len(allowed)))
+            elif self.index_type == "hnsw":
+                masked = self._tombstones()
+                if len(masked):
+                    selector = faiss.IDSelectorNot(faiss.IDSelectorBatch(masked))
+
+            if found is None:
+                found = self._index_search(query, k, selector, ef_search)
+            rows = {key: (i, p) for key, i, p in self._select(
+                "SELECT key, id, payload FROM points WHERE key IN ({})", [key for key, _ in found]
+            )}
+        return [SearchHit(rows[key][0], score, json.loads(rows[key][1])) for key, score in found if key in rows]
+
+    def _index_search(self, query: np.ndarray, k: int, selector, ef_search: int) -> List[tuple]:
+        """(key, score) of the top k in the index; PQ candidates are rescored exactly."""
+        if self._is_ivf():
+            params = faiss.SearchParametersIVF(sel=selector, nprobe=IVF_NPROBE)
+            scores, keys = self.index.search(query, k * IVF_RERANK_FACTOR, params=params)
+            candidates = keys[0][keys[0] != -1]
+            reranked = self._exact_search(query, candidates, k) if len(candidates) else []
+            if reranked is not None:
+                return reranked
+        elif self.index_type == "hnsw":
+            params = faiss.SearchParametersHNSW(sel=selector, efSearch=ef_search)
+            scores, keys = self.index.search(query, k, params=params)
+        else:
+            params = faiss.SearchParameters(sel=selector)
+            scores, keys = self.index.search(query, k, params=params)
+        return [(int(key), float(score)) for key, score in zip(keys[0], scores[0]) if key != -1][:k]
+
+    # --- Persistence ---------------------------------------------------------------
+    def save(self) -> None:
+        """Writes the index file (after rebuilding an HNSW graph with many masked ids)."""
+        if self.read_only:
+            return
+        with self.lock:
+            if self.index_type == "hnsw" and self.index.ntotal:
+                masked = self.db.execute("SELECT COUNT(*) FROM tombstones").fetchone()[0]
+                if masked > REBUILD_FRACTION * self.index.ntotal:
+                    self._rebuild_hnsw()
+                    self.dirty = True
+            if self.vectors is not None and len(self.vectors) > (1 + REBUILD_FRACTION) * len(self):
+                self.vectors.compact(_unsigned([r[0] for r in self.db.execute("SELECT key FROM points")]))
+            if self.dirty:
+                faiss.write_index(self.index, self.index_path + ".tmp")
+                os.replace(self.index_path + ".tmp", self.index_path)
+                self.dirty = False
+            self.db.commit()
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM points").fetchone()[0]
+
+    def close(self) -> None:
+        self.save()
+        self.db.close()
@@ -7,48 +7,97 @@ Created on Fri Nov 28 21:34:35 2025
 #from .wikipedia_scraper import harvest_world_data
 
 #from .create_wikipedia_index import scrape_bilateral_relations_data
-from .wikipedia_downloader_cleaner import download_corpus, process_corpus
-from .chunk_handler import generate_chunks
-from .qdrant_handler import ingest_to_qdrant
-from .testing_kb import test_database
+# The stage modules are imported by the functions that use them: qdrant_client, the
+# embedding model and the crawler's dependencies then only load when a stage runs
 
-def update_corpus():
+def update_corpus(**options):
     """
     Orchestrates the end-to-end data pipeline for updating the knowledge base.
 
-    This function sequentially executes:
-    1. Harvesting raw data from external sources (currently only Wikipedia).
-    2. Transforming and cleaning text for model consumption.
-    3. Tokenizing processed text.
-    4. Updating the RAG vector database with new embeddings.
+    Runs the stages of backend.stages in order, skipping those whose inputs did not
+    change since their last run (see run_stages; `options` are passed through):
+    1. crawl    - builds the Wikipedia index of bilateral relations pages (~30 min)
+    2. download - downloads the articles listed in the index (~7m30)
+    3. clean    - cleans the raw corpus (seconds)
+    4. chunk    - chunks and de-duplicates the clean corpus (~3 min)
+    5. ingest   - embeds the chunks into the vector store (~50 min CPU, 8 min GPU)
+    6. test     - reference query and golden-set retrieval benchmark
+
+    From the command line: python main.py [STAGE ...] [--from STAGE] [--to STAGE] [--force]
+
+    Returns
+    -------
+    The per-stage report of run_stages.
+    """
+    from .stages import run_stages
+
+    # Steps 2-4 in one streaming pass, without the intermediate files (pass raw_file/clean_file to keep them)
+    #run_pipeline(index_file = 'wiki_bilateral_relations.csv', chunk_file = 'rag_corpus_chunked.arrow')
+    # Ingest options: backend = "pool" or "onnx" on CPU-only machines; profile = "int8" or "compact"
+    # (qdrant_handler.COLLECTION_PROFILES); store = "faiss" for the in-process FAISS index in ./faiss_store.
+    # Embeddings are cached in ./embedding_cache, so re-ingesting unchanged chunks needs no model.
+    # Drop cached vectors of chunks that no longer exist :
+    #from .qdrant_handler import compact_embedding_cache
+    #compact_embedding_cache("rag_corpus_chunked.arrow")
+    return run_stages(**options)
+
+
+def refresh_corpus(**options):
+    """
+    Incremental counterpart of update_corpus: downloads only the articles whose revid
+    changed since the last download, then cleans, chunks and ingests just that delta.
+    `options` are those of update_corpus (workers, backend, store, profile, see
+    stages.DEFAULT_OPTIONS). Its metrics are reported like a run_stages run, under
+    the stage name "refresh" (which $PIPELINE_PROFILE can profile).
+
+    From the command line: python main.py --refresh [--workers N] [--backend ...]
 
     Returns
     -------
     None
     """
-    #Builds the wikipedia index with everysingle wikipedia page about international relations 
-    #APPROX TIME : 30 minutes
-    #scrape_bilateral_relations_data()
-    
-    #Downloads wikipedia files listed in the wikipedia index file
-    #APPROX TIME : 7m30
-    #download_corpus(input_file = 'wiki_bilateral_relations.csv', output_file = 'rag_corpus_clean.jsonl') 
-    
-    # Step 2: Cleans the corpus
-    #APPROX TIME : Almost instantaneous
-    #process_corpus(input_file = 'rag_corpus_raw.jsonl', output_file = 'rag_corpus_clean.txt')
-    
-    #Step 3 : Chunks and deduplicate the cleaned corpus, then sends it to the RAG database.
-    #APPROX TIME : 3 minutes
-    #generate_chunks(input_file = 'rag_corpus_clean.txt', output_file = 'rag_corpus_chunked.jsonl')
-    
-    #Step 4 : sending to qdrant
-    # APPROX TIME : 50 min with CPU, 8 min with GPU, but because im writing on my local disk, once dockerized it will be much faster.
-    #ingest_to_qdrant("rag_corpus_chunked.jsonl")
-    
-    #Step5 : testing the knowledgebase : 
-    test_database()
-
-    return
-            
-    
\ No newline at end of file
+    from . import metrics
+    from .stages import DEFAULT_OPTIONS
+
+    options = {**DEFAULT_OPTIONS, **options}
+    try:
+        with metrics.stage("refresh"):
+            _refresh_delta(options)
+    finally:
+        if metrics.METRICS.stages:
+            metrics.METRICS.write_report()
+
+
+def _refresh_delta(options):
+    from .bm25_index import bm25_index_path, merge_bm25_index
+    from .chunk_handler import DEDUP_STORE_FILE
+    from .countries import PairIndex, pair_index_path
+    from .pipeline import run_pipeline
+    from .qdrant_handler import ingest_to_qdrant
+    from .wikipedia_downloader_cleaner import download_corpus, delta_path, load_delta, DELTA_FILE
+
+    raw_file = 'rag_corpus_raw.jsonl'
+    download_corpus(input_file = 'wiki_bilateral_relations.csv', output_file = raw_file, incremental = True)
+
+    delta = load_delta(DELTA_FILE)
+    if not (delta["added"] or delta["changed"] or delta["removed"]):
+        print("Corpus already up to date.")
+        return
+
+    # Chunks straight from the raw delta keep their revid, which ingestion uses to delete outdated points
+    # Unchanged chunks of changed articles are still written, so ingestion relabels them instead of deleting them
+    run_pipeline(from_raw = delta["raw_file"], chunk_file = delta_path('rag_corpus_chunked.arrow'),
+                 clean_file = delta_path('rag_corpus_clean.txt'), dedup_store = DEDUP_STORE_FILE,
+                 workers = options["workers"])
+    ingest_to_qdrant(delta_path('rag_corpus_chunked.arrow'), delta_file = DELTA_FILE, hash_store = DEDUP_STORE_FILE,
+                     backend = options["backend"], store = options["store"], profile = options["profile"])
+
+    # Fold the delta's countries, chunk ids and terms into the main pair and BM25 indexes
+    pairs = PairIndex.load(pair_index_path('rag_corpus_chunked.arrow'))
+    dropped = delta["changed"] + delta["removed"]
+    merge_bm25_index(bm25_index_path('rag_corpus_chunked.arrow'), bm25_index_path(delta_path('rag_corpus_chunked.arrow')),
+                     drop_ids = [i for title in dropped for i in pairs.articles.get(title, {}).get("ids", [])])
+    pairs.update(PairIndex.load(pair_index_path(delta_path('rag_corpus_chunked.arrow'))),
+                 drop_titles = dropped)
+    pairs.save(pair_index_path('rag_corpus_chunked.arrow'))
+
@@ -0,0 +1,309 @@
+import cProfile
+import json
+import os
+import shutil
+import signal
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Tuple
+
+METRICS_DIR = "metrics"
+PROM_FILE = "pipeline.prom"        # for the node_exporter textfile collector
+METRIC_PREFIX = "geomap_"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+RSS_SAMPLE_INTERVAL = 0.5          # seconds between RSS samples while a stage runs
+
+# Stages to profile, comma-separated (e.g. "chunk,ingest"), and the profiler:
+#   cprofile - cProfile stats in METRICS_DIR/<stage>.prof (snakeviz, pstats)
+#   py-spy   - a `py-spy record` of this process in METRICS_DIR/<stage>.speedscope.json
+PROFILE_STAGES_ENV = "PIPELINE_PROFILE"
+PROFILER_ENV = "PIPELINE_PROFILER"
+
+LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def rss_mb() -> float:
+    """Current resident memory of this process (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process since it started."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0.0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    """Cumulative-bucket histogram, as Prometheus expects."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile, capped at the largest value seen."""
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+
+class MetricsRegistry:
+    """
+    Process-wide counters, gauges (last and max value) and histograms, keyed by name
+    and labels. Updates take one lock, so they are meant per batch or per document,
+    not per token. Stage blocks (see stage()) record wall time, peak RSS and the
+    counter increments made while they ran.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[LabelKey, float] = {}
+        self.gauges: Dict[LabelKey, List[float]] = {}
+        self.histograms: Dict[LabelKey, Histogram] = {}
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.started = datetime.now(timezone.utc)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self.lock:
+            gauge = self.gauges.setdefault(key, [value, value])
+            gauge[0] = value
+            gauge[1] = max(gauge[1], value)
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def _counter_totals(self) -> Dict[str, float]:
+        with self.lock:
+            totals: Dict[str, float] = {}
+            for (name, _), value in self.counters.items():
+                totals[name] = totals.get(name, 0) + value
+            return totals
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Times a pipeline stage: wall seconds, peak RSS (sampled), and every counter's
+        increment and rate per second over the stage, e.g. docs/s or tokens/s.
+        Profiles it when `name` is listed in $PIPELINE_PROFILE (see profile_stage).
+        """
+        before = self._counter_totals()
+        done = threading.Event()
+        peak = [rss_mb()]
+
+        def sample():
+            while not done.wait(RSS_SAMPLE_INTERVAL):
+                peak[0] = max(peak[0], rss_mb())
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        start = time.perf_counter()
+        try:
+            with profile_stage(name):
+                yield
+        finally:
+            seconds = time.perf_counter() - start
+            done.set()
+            sampler.join()
+            peak[0] = max(peak[0], rss_mb())
+            after = self._counter_totals()
+            counts = {k: v - before.get(k, 0) for k, v in after.items() if v != before.get(k, 0)}
+            self.stages[name] = {
+                "seconds": seconds,
+                "peak_rss_mb": peak[0],
+                "counts": counts,
+                "rates_per_s": {k: v / seconds for k, v in counts.items()} if seconds else {},
+            }
+
+    # --- Output -------------------------------------------------------------------
+    def snapshot(self) -> Dict[str, Any]:
+        """Everything recorded so far, as JSON-serializable data."""
+        def key_str(name, labels):
+            return name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else "")
+
+        with self.lock:
+            return {
+                "started": self.started.isoformat(timespec="seconds"),
+                "finished": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "peak_rss_mb": peak_rss_mb(),
+                "stages": dict(self.stages),
+                "counters": {key_str(name, labels): v
+                             for (name, labels), v in sorted(self.counters.items())},
+                "gauges": {key_str(name, labels): {"last": g[0], "max": g[1]}
+                           for (name, labels), g in sorted(self.gauges.items())},
+                "histograms": {key_str(name, labels): h.summary()
+                               for (name, labels), h in sorted(self.histograms.items())},
+            }
+
+    def prometheus(self) -> str:
+        """The registry in the Prometheus text exposition format."""
+        def labels_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+        families: Dict[str, Tuple[str, List[str]]] = {}  # samples of a family must be contiguous
+
+        def add(name, kind, sample):
+            families.setdefault(name, (kind, []))[1].append(sample)
+
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                metric = METRIC_PREFIX + name
+                add(metric, "counter", f"{metric}{labels_text(labels)} {value}")
+            for (name, labels), (last, peak) in sorted(self.gauges.items()):
+                metric = METRIC_PREFIX + name
+                add(metric, "gauge", f"{metric}{labels_text(labels)} {last}")
+                add(metric + "_max", "gauge", f"{metric}_max{labels_text(labels)} {peak}")
+            for (name, labels), h in sorted(self.histograms.items()):
+                metric = METRIC_PREFIX + name
+                cumulative = 0
+                for bound, count in zip(h.buckets, h.counts):
+                    cumulative += count
+                    add(metric, "histogram", f"{metric}_bucket{labels_text(labels, [('le', bound)])} {cumulative}")
+                add(metric, "histogram", f"{metric}_bucket{labels_text(labels, [('le', '+Inf')])} {h.count}")
+                add(metric, "histogram", f"{metric}_sum{labels_text(labels)} {h.sum}")
+                add(metric, "histogram", f"{metric}_count{labels_text(labels)} {h.count}")
+            for stage, info in sorted(self.stages.items()):
+                for field in ("seconds", "peak_rss_mb"):
+                    metric = f"{METRIC_PREFIX}stage_{field}"
+                    add(metric, "gauge", f"{metric}{labels_text([('stage', stage)])} {info[field]}")
+        add(f"{METRIC_PREFIX}peak_rss_mb", "gauge", f"{METRIC_PREFIX}peak_rss_mb {peak_rss_mb()}")
+
+        lines = []
+        for name, (kind, samples) in families.items():
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, directory: str = METRICS_DIR) -> str:
+        """
+        Writes the JSON run report (run_<time>.json) and rewrites the Prometheus
+        textfile (PROM_FILE) atomically. Returns the report path.
+        """
+        os.makedirs(directory, exist_ok=True)
+        report = self.snapshot()
+        path = os.path.join(directory, f"run_{report['finished'].replace(':', '')[:17]}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=1)
+        prom = os.path.join(directory, PROM_FILE)
+        with open(prom + ".tmp", 'w', encoding='utf-8') as f:
+            f.write(self.prometheus())
+        os.replace(prom + ".tmp", prom)
+        print(f"Metrics written to {path} and {prom}")
+        return path
+
+
+# ==============================================================================
+# PROFILING
+# ==============================================================================
+def profiled_stages() -> List[str]:
+    return [s.strip() for s in os.environ.get(PROFILE_STAGES_ENV, "").split(",") if s.strip()]
+
+
+@contextmanager
+def profile_stage(name: str, directory: str = METRICS_DIR) -> Iterator[None]:
+    """
+    Profiles the block when `name` is in $PIPELINE_PROFILE ("all" for every stage),
+    with $PIPELINE_PROFILER: cprofile (default) or py-spy, which samples every thread
+    and native frames without slowing the stage down (needs the py-spy executable and
+    ptrace permission).
+    """
+    stages = profiled_stages()
+    if name not in stages and "all" not in stages:
+        yield
+        return
+    os.makedirs(directory, exist_ok=True)
+    profiler = os.environ.get(PROFILER_ENV, "cprofile")
+
+    if profiler == "py-spy":
+        if shutil.which("py-spy") is None:
+            print("⚠️ py-spy not found, profiling with cProfile instead")
+        else:
+            path = os.path.join(directory, f"{name}.speedscope.json")
+            spy = subprocess.Popen(["py-spy", "record", "--pid", str(os.getpid()), "--format", "speedscope",
+                                    "--output", path, "--subprocesses", "--threads"],
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                yield
+            finally:
+                spy.send_signal(signal.SIGINT)  # py-spy writes its output when interrupted
+                spy.wait()
+                print(f"Profile of {name} written to {path}")
+            return
+
+    path = os.path.join(directory, f"{name}.prof")
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        profile.dump_stats(path)
+        print(f"Profile of {name} written to {path} (python -m pstats {path})")
+
+
+METRICS = MetricsRegistry()
+inc = METRICS.inc
+set_gauge = METRICS.set
+observe = METRICS.observe
+timer = METRICS.timer
+stage = METRICS.stage
@@ -0,0 +1,243 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+# ==============================================================================
+# SYNTHETIC WIKI
+# ==============================================================================
+def build_synthetic_wiki(
+    n_countries: int = 40,
+    pages_per_category: int = 25,
+    seed: int = 0
+) -> Dict[str, Any]:
+    """
+    Builds a small category tree shaped like 'Category:Bilateral relations by country'.
+
+    Root -> one category per country -> one sub-category per neighbour pair, plus a
+    third level that sits beyond the default max_depth. Pair categories are shared
+    between both countries so category de-duplication is exercised.
+    """
+    rng = random.Random(seed)
+    countries = [f"Country{i:03d}" for i in range(n_countries)]
+    root = "Category:Bilateral relations by country"
+
+    categories: Dict[str, List[Dict[str, Any]]] = {root: []}
+    pages: Dict[str, Dict[str, Any]] = {}
+    next_id = 1
+
+    def add_page(category: str, title: str) -> None:
+        nonlocal next_id
+        if title not in pages:
+            revid = rng.randint(10**9, 2 * 10**9)
+            pages[title] = {
+                "pageid": next_id,
+                "revid": revid,
+                "content": (
+                    f"'''{title}''' are the [[Foreign relations|relations]] between two states."
+                    f"{{{{Infobox|name={title}}}}}\n\n== History ==\n"
+                    + " ".join(f"Sentence {k} about {title}." for k in range(rng.randint(20, 80)))
+                )
+            }
+            next_id += 1
+        categories[category].append({"ns": 0, "title": title, "pageid": pages[title]["pageid"]})
+
+    def add_subcat(parent: str, child: str) -> None:
+        nonlocal next_id
+        categories.setdefault(child, [])
+        categories[parent].append({"ns": 14, "title": child, "pageid": next_id})
+        next_id += 1
+
+    for i, country in enumerate(countries):
+        country_cat = f"Category:Bilateral relations of {country}"
+        add_subcat(root, country_cat)
+        for k in range(pages_per_category):
+            add_page(country_cat, f"{country}–Partner{k:03d} relations")
+
+        for offset in (1, 2, 3):
+            other = countries[(i + offset) % n_countries]
+            pair = sorted([country, other])
+            pair_cat = f"Category:{pair[0]}–{pair[1]} relations"
+            new = pair_cat not in categories
+            add_subcat(country_cat, pair_cat)
+            if new:
+                add_page(pair_cat, f"{pair[0]}–{pair[1]} relations")
+                add_page(pair_cat, f"{pair[0]}–{pair[1]} border dispute")
+                deep_cat = f"Category:{pair[0]}–{pair[1]} treaties"
+                add_subcat(pair_cat, deep_cat)
+                add_page(deep_cat, f"{pair[0]}–{pair[1]} treaty of friendship")
+
+    return {"root": root, "categories": categories, "pages": pages}
+
+
+# ==============================================================================
+# HTTP SERVER
+# ==============================================================================
+class _MediaWikiHandler(BaseHTTPRequestHandler):
+    server_version = "MockMediaWiki/1.0"
+
+    def log_message(self, format, *args):
+        return
+
+    def do_GET(self):
+        wiki = self.server.wiki
+        params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        time.sleep(self.server.latency)
+
+        if self.server.error_rate and self.server.rng.random() < self.server.error_rate:
+            kind = self.server.rng.choice(["503", "429", "maxlag"])
+            if kind == "maxlag" and "maxlag" in params:
+                self._send_json(
+                    {"error": {"code": "maxlag", "info": "Waiting for replica: 6 seconds lagged."}},
+                    {"Retry-After": str(self.server.retry_after)}
+                )
+            elif kind == "429":
+                self.send_response(429)
+                self.send_header("Retry-After", str(self.server.retry_after))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            else:
+                self.send_error(503, "Simulated outage")
+            return
+
+        if params.get("generator") == "categorymembers":
+            payload = self._category_members(wiki, params)
+        elif params.get("prop") == "revisions" and "titles" in params:
+            if self.server.rejected_titles & set(params["titles"].split("|")):
+                self.send_error(400, "Rejected title")
+                return
+            payload = self._revisions(wiki, params)
+        else:
+            payload = {"batchcomplete": ""}
+        self._send_json(payload)
+
+    def _send_json(self, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _category_members(self, wiki, params):
+        members = wiki["categories"].get(params.get("gcmtitle"), [])
+        start = int(params.get("gcmcontinue", 0))
+        end = start + self.server.page_size
+        result = {}
+        for member in members[start:end]:
+            page = {"pageid": member["pageid"], "ns": member["ns"], "title": member["title"]}
+            if member["ns"] == 0:
+                page["revisions"] = [{"revid": wiki["pages"][member["title"]]["revid"]}]
+            result[str(member["pageid"])] = page
+
+        payload: Dict[str, Any] = {"batchcomplete": ""}
+        if result:
+            payload["query"] = {"pages": result}
+        if end < len(members):
+            payload["continue"] = {"gcmcontinue": str(end), "continue": "gcmcontinue||"}
+        return payload
+
+
+    def _revisions(self, wiki, params):
+        # Like the real API, content stops once the response would get too large and
+        # the remaining pages come back without revisions plus an rvcontinue token.
+        titles = params["titles"].split("|")
+        start = int(params.get("rvcontinue", 0))
+        budget = self.server.max_response_chars
+        result = {}
+        payload: Dict[str, Any] = {"batchcomplete": ""}
+
+        for k, title in enumerate(titles):
+            page = wiki["pages"].get(title)
+            if page is None:
+                result[str(-1 - k)] = {"ns": 0, "title": title, "missing": ""}
+                continue
+            entry = {"pageid": page["pageid"], "ns": 0, "title": title}
+            if k >= start and "continue" not in payload:
+                if budget is not None and budget < len(page["content"]) and k > start:
+                    payload["continue"] = {"rvcontinue": str(k), "continue": "||"}
+                else:
+                    entry["revisions"] = [
+                        {"revid": page["revid"], "slots": {"main": {"*": page["content"]}}}
+                    ]
+                    if budget is not None:
+                        budget -= len(page["content"])
+            result[str(page["pageid"])] = entry
+
+        payload["query"] = {"pages": result}
+        return payload
+
+
+class MockMediaWikiServer:
+    """
+    Local stand-in for https://en.wikipedia.org/w/api.php, used by the benchmarks.
+    `error_rate` is the fraction of requests answered with an error (HTTP 503, HTTP 429
+    or, when the request sets maxlag, a maxlag error), with `retry_after` seconds in
+    the Retry-After header. Revision responses carry at most `max_response_chars` of
+    content before continuing. Revision requests for any of `rejected_titles` are
+    answered with HTTP 400.
+
+    Usage:
+        with MockMediaWikiServer(latency=0.05) as server:
+            scrape_bilateral_relations_data(api_url=server.url, ...)
+    """
+
+    def __init__(
+        self,
+        wiki: Optional[Dict[str, Any]] = None,
+        latency: float = 0.05,
+        page_size: int = 20,
+        error_rate: float = 0.0,
+        retry_after: int = 0,
+        max_response_chars: Optional[int] = None,
+        rejected_titles: Iterable[str] = (),
+        seed: int = 0
+    ):
+        self.wiki = wiki or build_synthetic_wiki()
+        self.latency = latency
+        self.page_size = page_size
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.max_response_chars = max_response_chars
+        self.rejected_titles = set(rejected_titles)
+        self.seed = seed
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/w/api.php"
+
+    def start(self) -> "MockMediaWikiServer":
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), _MediaWikiHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.request_queue_size = 128
+        self._httpd.wiki = self.wiki
+        self._httpd.latency = self.latency
+        self._httpd.page_size = self.page_size
+        self._httpd.error_rate = self.error_rate
+        self._httpd.retry_after = self.retry_after
+        self._httpd.max_response_chars = self.max_response_chars
+        self._httpd.rejected_titles = self.rejected_titles
+        self._httpd.rng = random.Random(self.seed)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,91 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import metrics
+
+# ==============================================================================
+# ORDERED, BOUNDED PROCESS POOL
+# ==============================================================================
+def iter_chunks(items: Iterable[Any], chunk_size: int) -> Iterator[List[Any]]:
+    chunk: List[Any] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def ordered_pool_map(
+    task: Callable[[List[Any]], Any],
+    items: Iterable[Any],
+    workers: int,
+    chunk_size: int = 32,
+    max_pending_chunks: Optional[int] = None,
+    initializer: Optional[Callable] = None,
+    initargs: Tuple = ()
+) -> Iterator[Tuple[int, Any]]:
+    """
+    Runs task(chunk) over `chunk_size` items at a time in a process pool and yields
+    (items in chunk, result) in input order.
+
+    At most `max_pending_chunks` chunks (default 4 per worker) are in flight: the
+    input is only read further once the oldest result has been handed back, so memory
+    stays bounded however large `items` is. (Pool.imap would drain the whole input.)
+    """
+    max_pending_chunks = max_pending_chunks or 4 * workers
+    pending: Deque[Tuple[Future, int]] = deque()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as executor:
+        for chunk in iter_chunks(items, chunk_size):
+            while len(pending) >= max_pending_chunks:
+                future, size = pending.popleft()
+                yield size, future.result()
+            pending.append((executor.submit(task, chunk), len(chunk)))
+            metrics.set_gauge("pool_pending_chunks", len(pending))
+        while pending:
+            future, size = pending.popleft()
+            yield size, future.result()
+
+
+def timed_task(task: Callable[[Any], Any], amount: Callable[[Any], float], chunk: List[Any]) -> Tuple[List[Any], int, float, float]:
+    """
+    Applies `task` to every item of a chunk inside a worker and returns
+    (results, worker pid, busy seconds, summed `amount` of the inputs) for WorkerStats.
+    Use with functools.partial so it pickles.
+    """
+    start = time.perf_counter()
+    results = [task(item) for item in chunk]
+    total = sum(amount(item) for item in chunk)
+    return results, os.getpid(), time.perf_counter() - start, total
+
+
+class WorkerStats:
+    """Per-worker busy time and throughput for an ordered_pool_map run."""
+
+    def __init__(self, unit: str, scale: float = 1.0):
+        self.unit = unit
+        self.scale = scale
+        self.start = time.perf_counter()
+        self.workers: Dict[int, List[float]] = {}
+
+    def add(self, pid: int, seconds: float, amount: float) -> None:
+        worker = self.workers.setdefault(pid, [0, 0.0, 0.0])
+        worker[0] += 1
+        worker[1] += seconds
+        worker[2] += amount
+
+    def report(self, label: str) -> None:
+        elapsed = time.perf_counter() - self.start
+        total = sum(w[2] for w in self.workers.values()) / self.scale
+        print(f"{label} {total:.1f} {self.unit} in {elapsed:.1f} s "
+              f"({total / elapsed if elapsed else 0.0:.2f} {self.unit}/s overall)")
+        for pid, (chunks, seconds, amount) in sorted(self.workers.items()):
+            amount /= self.scale
+            rate = amount / seconds if seconds else 0.0
+            print(f"  worker {pid}: {chunks} chunks, {amount:.1f} {self.unit}, "
+                  f"busy {seconds:.1f} s, {rate:.2f} {self.unit}/s")
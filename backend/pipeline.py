@@ -0,0 +1,128 @@
+from functools import partial
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from tqdm import tqdm
+
+from . import metrics
+from .chunk_handler import (
+    ChunkDeduplicator,
+    _init_splitter_worker,
+    _split_record,
+    chunk_records,
+    chunk_split_docs,
+    write_chunks
+)
+from .bm25_index import BM25Builder, bm25_index_path
+from .countries import PairIndex, pair_index_path
+from .parallel import WorkerStats, ordered_pool_map, timed_task
+from .wikipedia_downloader_cleaner import (
+    _raw_bytes,
+    clean_article,
+    clean_articles,
+    format_clean_entry,
+    iter_raw_corpus,
+    stream_corpus,
+    write_clean_corpus
+)
+
+# The stages hand structured records to each other instead of going through files:
+#   raw article   {"title", "revid", "raw_content"}   (stream_corpus / iter_raw_corpus)
+#   clean record  {"title", "revid", "text"}          (clean_articles)
+#   chunk record  {"id", "title", "text", "metadata"} (chunk_records)
+#     metadata    {"source", "type", "revid", "countries", "pair", "tokens"}
+# Intermediate files are only written when their path is passed in.
+
+# ==============================================================================
+# FUSED CLEAN -> CHUNK PIPELINE
+# ==============================================================================
+def stream_chunks(
+    articles: Iterable[Dict[str, Any]],
+    clean_file: Optional[str] = None,
+    workers: int = 1,
+    splitter: str = "native",
+    dedup: Optional[ChunkDeduplicator] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Cleans raw articles and yields their chunk records, optionally saving the clean
+    corpus. With workers > 1 one pool of `workers` processes cleans and splits each
+    article; de-duplication stays in this process, so the output is the same as with
+    one worker.
+    """
+    if workers <= 1:
+        records = clean_articles(articles)
+        if clean_file:
+            records = write_clean_corpus(records, clean_file)
+        return chunk_records(records, dedup, splitter=splitter)
+
+    split_docs = _clean_and_split_in_pool(articles, workers, splitter)
+    if clean_file:
+        split_docs = _write_clean_docs(split_docs, clean_file)
+    return chunk_split_docs(split_docs, dedup)
+
+
+def _clean_and_split(article: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], List[Tuple[str, Optional[int]]]]:
+    record = clean_article(article)
+    return record, _split_record(record) if record is not None else []
+
+
+def _clean_and_split_in_pool(articles, workers: int, splitter: str, chunk_size: int = 32):
+    stats = WorkerStats("MB", scale=1e6)
+    task = partial(timed_task, _clean_and_split, _raw_bytes)
+    with tqdm(desc="Cleaning + chunking", unit="article") as pbar:
+        for n_articles, (split_docs, pid, seconds, raw_bytes) in ordered_pool_map(
+            task, articles, workers, chunk_size, initializer=_init_splitter_worker, initargs=(splitter,)
+        ):
+            stats.add(pid, seconds, raw_bytes)
+            metrics.inc("clean_docs_total", n_articles)
+            metrics.inc("clean_bytes_total", raw_bytes)
+            pbar.update(n_articles)
+            yield from (doc for doc in split_docs if doc[0] is not None)
+    stats.report("Cleaned and split")
+
+
+def _write_clean_docs(split_docs, output_file: str):
+    """write_clean_corpus for (clean record, chunk texts) pairs."""
+    with open(output_file, 'w', encoding='utf-8') as fout:
+        for record, chunks in split_docs:
+            fout.write(format_clean_entry(record))
+            yield record, chunks
+    print(f"Cleaned corpus saved to {output_file}")
+
+
+def run_pipeline(
+    index_file: str = 'wiki_bilateral_relations.csv',
+    chunk_file: str = 'rag_corpus_chunked.arrow',
+    raw_file: Optional[str] = None,
+    clean_file: Optional[str] = None,
+    from_raw: Optional[str] = None,
+    workers: int = 1,
+    splitter: str = "native",
+    dedup_store: Optional[str] = None,
+    near_threshold: Optional[float] = None,
+    **download_options
+) -> int:
+    """
+    Downloads, cleans and chunks the corpus in one streaming pass and writes the chunks
+    to `chunk_file`. Returns the number of chunks written.
+
+    Articles are downloaded from the index (see stream_corpus for `download_options`)
+    unless `from_raw` names an existing raw JSONL corpus to start from. `raw_file` and
+    `clean_file` additionally save the raw and clean corpora. `dedup_store` and
+    `near_threshold` are the generate_chunks de-duplication options. The pair index
+    and the BM25 index are written next to `chunk_file`.
+    """
+    if from_raw:
+        articles = iter_raw_corpus(from_raw)
+    else:
+        articles = stream_corpus(index_file, raw_file, **download_options)
+
+    dedup = ChunkDeduplicator(dedup_store, near_threshold)
+    pairs = PairIndex()
+    bm25 = BM25Builder()
+    chunks = stream_chunks(articles, clean_file=clean_file, workers=workers, splitter=splitter, dedup=dedup)
+    count = write_chunks(bm25.collect(pairs.collect(chunks)), chunk_file)
+    pairs.save(pair_index_path(chunk_file))
+    bm25.save(bm25_index_path(chunk_file))
+    dedup.report()
+    print(f"{count} chunks saved to {chunk_file}")
+    return count
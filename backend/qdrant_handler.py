@@ -1,83 +1,562 @@
 import json
 import uuid
+import queue
+import threading
 import hashlib  # <--- Added for deterministic IDs
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Set, Union
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
-from sentence_transformers import SentenceTransformer
 from tqdm import tqdm
-import torch
+import numpy as np
 
-def check_device():
-    if torch.cuda.is_available():
-        return "cuda"
-    elif torch.backends.mps.is_available():
-        return "mps" 
-    else:
-        return "cpu"
-
-device = check_device()
-print(f"Running on: {device}")
+from . import metrics
+from .chunk_handler import HashStore, hash_value
+from .countries import pair_key, title_country_codes
+from .embedding_backends import Encoder, cache_model_name, make_encoder
+from .embedding_cache import EMBEDDING_CACHE_DIR, EmbeddingCache, chunk_key
+from .parallel import iter_chunks
+from .vector_store import STORE_PATHS, SearchHit, VectorStore, matches_filters, open_store
 
 COLLECTION_NAME = "Geopolitical_Knowledge_Base"
 VECTOR_SIZE = 384
 BATCH_SIZE = 512
-LOCAL_DB_PATH = "./qdrant_storage"
+QUEUE_SIZE = 4  # batches buffered between reading, embedding and uploading
+LOCAL_DB_PATH = STORE_PATHS["qdrant"]
+
+# Collection profiles:
+#   m, ef_construct - HNSW graph degree and construction beam width
+#   ef              - search beam width (None: the server default)
+#   quantization    - None, or "int8" scalar quantization kept in RAM with the float32
+#                     originals on disk; results are rescored with the originals
+#   oversampling    - with int8, candidates fetched per requested result before rescoring
+#   on_disk_payload - keep payloads (the chunk text) on disk, only payload indexes in RAM
+# benchmarks.benchmark_collection_profiles reports recall@k, latency and memory of each.
+COLLECTION_PROFILES: Dict[str, Dict[str, Any]] = {
+    "default": {"m": 16, "ef_construct": 100, "ef": None, "quantization": None, "oversampling": None, "on_disk_payload": False},
+    "int8": {"m": 16, "ef_construct": 128, "ef": 128, "quantization": "int8", "oversampling": 2.0, "on_disk_payload": True},
+    "compact": {"m": 8, "ef_construct": 64, "ef": 64, "quantization": "int8", "oversampling": 3.0, "on_disk_payload": True},
+}
+DEFAULT_PROFILE = "default"
+# Indexed payload fields: stale-point deletes filter on title and revid, searches on
+# country and pair (ISO codes, see countries.py)
+PAYLOAD_INDEXES = {
+    "title": models.PayloadSchemaType.KEYWORD,
+    "country": models.PayloadSchemaType.KEYWORD,
+    "pair": models.PayloadSchemaType.KEYWORD,
+    "revid": models.PayloadSchemaType.INTEGER,
+}
 
 def get_local_client() -> QdrantClient:
     return QdrantClient(path=LOCAL_DB_PATH)
 
-def setup_qdrant(client: QdrantClient):
-    if not client.collection_exists(collection_name=COLLECTION_NAME):
+def get_profile(profile: str) -> Dict[str, Any]:
+    if profile not in COLLECTION_PROFILES:
+        raise ValueError(f"Unknown collection profile '{profile}', expected one of {list(COLLECTION_PROFILES)}.")
+    return COLLECTION_PROFILES[profile]
+
+def _quantization_config(settings: Dict[str, Any]):
+    if settings["quantization"] == "int8":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    return None
+
+def search_params(profile: str = DEFAULT_PROFILE) -> models.SearchParams:
+    """Query-time parameters matching a collection profile (pass as query_points(search_params=...))."""
+    settings = get_profile(profile)
+    quantization = None
+    if settings["quantization"]:
+        quantization = models.QuantizationSearchParams(rescore=True, oversampling=settings["oversampling"])
+    return models.SearchParams(hnsw_ef=settings["ef"], quantization=quantization)
+
+def setup_qdrant(client: QdrantClient, profile: Optional[str] = None, collection_name: str = COLLECTION_NAME):
+    """
+    Creates the collection with `profile` (default: DEFAULT_PROFILE) and its payload
+    indexes. An existing collection is left as it is unless a profile is given, in
+    which case its HNSW, quantization and storage settings are updated in place (the
+    server rebuilds the index in the background).
+    """
+    if not client.collection_exists(collection_name=collection_name):
+        settings = get_profile(profile or DEFAULT_PROFILE)
         client.create_collection(
-            collection_name=COLLECTION_NAME,
+            collection_name=collection_name,
             vectors_config=models.VectorParams(
                 size=VECTOR_SIZE,
-                distance=models.Distance.COSINE
-            )
+                distance=models.Distance.COSINE,
+                on_disk=bool(settings["quantization"])
+            ),
+            hnsw_config=models.HnswConfigDiff(m=settings["m"], ef_construct=settings["ef_construct"]),
+            quantization_config=_quantization_config(settings),
+            on_disk_payload=settings["on_disk_payload"]
+        )
+    elif profile:
+        settings = get_profile(profile)
+        client.update_collection(
+            collection_name=collection_name,
+            vectors_config={"": models.VectorParamsDiff(on_disk=bool(settings["quantization"]))},
+            hnsw_config=models.HnswConfigDiff(m=settings["m"], ef_construct=settings["ef_construct"]),
+            quantization_config=_quantization_config(settings) or models.Disabled.DISABLED,
+            collection_params=models.CollectionParamsDiff(on_disk_payload=settings["on_disk_payload"])
         )
+    # Creating an existing index is a no-op
+    for field, schema in PAYLOAD_INDEXES.items():
+        client.create_payload_index(collection_name, field_name=field, field_schema=schema)
 
 def load_chunks(file_path: str) -> List[Dict[str, Any]]:
+    return list(iter_chunk_file(file_path))
+
+def iter_chunk_file(file_path: str, filters: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Streams chunk records from a JSONL file (a JSON array still has to be loaded whole)
+    or an Arrow/Parquet chunk store (see chunk_store). `filters` keep the chunks of
+    some titles, countries or pairs, e.g. {"country": "FR"}; a chunk store reads only
+    the batches that match, a JSONL file is parsed whole.
+    """
+    from .chunk_store import chunk_store_format, iter_chunk_store
+    if chunk_store_format(file_path):
+        yield from iter_chunk_store(file_path, filters)
+        return
+    if filters:
+        payloads = ((item, build_payload(item)) for item in iter_chunk_file(file_path))
+        yield from (item for item, payload in payloads if matches_filters(payload, filters))
+        return
     with open(file_path, 'r', encoding='utf-8') as f:
+        head = f.read(1)
+        while head.isspace():
+            head = f.read(1)
+        f.seek(0)
+        if head == '[':
+            yield from json.load(f)
+            return
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def purge_titles(client: QdrantClient, titles: List[str], collection_name: str = COLLECTION_NAME):
+    """Deletes every point whose payload title is in `titles`."""
+    for i in range(0, len(titles), BATCH_SIZE):
+        client.delete(
+            collection_name=collection_name,
+            points_selector=models.FilterSelector(
+                filter=models.Filter(must=[
+                    models.FieldCondition(
+                        key="title",
+                        match=models.MatchAny(any=titles[i : i + BATCH_SIZE])
+                    )
+                ])
+            )
+        )
+
+def point_id(text: str) -> str:
+    """Deterministic point id of a chunk: the md5 hex of its text."""
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+def chunk_revid(item: Dict[str, Any]) -> Optional[int]:
+    return (item.get("metadata") or {}).get("revid")
+
+def _match(key: str, value: Any) -> models.FieldCondition:
+    if isinstance(value, (list, tuple, set)):
+        return models.FieldCondition(key=key, match=models.MatchAny(any=list(value)))
+    return models.FieldCondition(key=key, match=models.MatchValue(value=value))
+
+class QdrantStore(VectorStore):
+    """
+    The VectorStore interface over a Qdrant collection (local mode unless `client` is
+    given). The collection is set up with `profile` (see setup_qdrant) unless
+    read_only, in which case the profile only selects the search parameters.
+    """
+
+    def __init__(
+        self,
+        client: Optional[QdrantClient] = None,
+        collection_name: str = COLLECTION_NAME,
+        profile: Optional[str] = None,
+        read_only: bool = False
+    ):
+        self.client = client or get_local_client()
+        self.collection_name = collection_name
+        self.profile = profile or DEFAULT_PROFILE
+        if not read_only:
+            setup_qdrant(self.client, profile, collection_name)
+
+    def retrieve(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        points = self.client.retrieve(self.collection_name, ids=ids, with_payload=["title", "revid"], with_vectors=False)
+        # Dashed UUIDs from a server, plain hex from local mode
+        return {uuid.UUID(str(p.id)).hex: p.payload or {} for p in points}
+
+    def fetch(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        points = self.client.retrieve(self.collection_name, ids=ids, with_payload=True, with_vectors=False)
+        return {uuid.UUID(str(p.id)).hex: p.payload or {} for p in points}
+
+    def set_payload(self, ids: List[str], payload: Dict[str, Any]) -> None:
+        self.client.set_payload(collection_name=self.collection_name, payload=payload, points=ids)
+
+    def upsert(self, ids: List[str], vectors: np.ndarray, payloads: List[Dict[str, Any]]) -> None:
+        self.client.upload_collection(
+            collection_name=self.collection_name,
+            vectors=vectors,
+            payload=payloads,
+            ids=ids,
+            batch_size=len(ids),
+            wait=True
+        )
+
+    def delete_ids(self, ids: List[str]) -> None:
+        for i in range(0, len(ids), BATCH_SIZE):
+            self.client.delete(self.collection_name, points_selector=models.PointIdsList(points=ids[i:i + BATCH_SIZE]))
+
+    def delete_titles(self, titles: List[str]) -> None:
+        purge_titles(self.client, titles, self.collection_name)
+
+    def delete_stale(self, title: str, revid: Optional[int], keep_ids: Optional[List[str]] = None) -> None:
+        must_not = []
+        if revid is not None:
+            must_not.append(_match("revid", revid))
+        elif keep_ids:
+            must_not.append(models.HasIdCondition(has_id=keep_ids))
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=models.FilterSelector(
+                filter=models.Filter(must=[_match("title", title)], must_not=must_not)
+            )
+        )
+
+    def iter_ids(self) -> Iterator[str]:
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                self.collection_name, limit=BATCH_SIZE * 4, offset=offset, with_payload=False, with_vectors=False
+            )
+            for p in points:
+                yield uuid.UUID(str(p.id)).hex
+            if offset is None:
+                return
+
+    def search(self, vector: np.ndarray, k: int = 5, filters: Optional[Dict[str, Any]] = None) -> List[SearchHit]:
+        query_filter = None
+        if filters:
+            query_filter = models.Filter(must=[_match(key, value) for key, value in filters.items()])
+        points = self.client.query_points(
+            collection_name=self.collection_name,
+            query=np.asarray(vector, dtype=np.float32).tolist(),
+            query_filter=query_filter,
+            search_params=search_params(self.profile),
+            limit=k
+        ).points
+        return [SearchHit(uuid.UUID(str(p.id)).hex, p.score, p.payload or {}) for p in points]
+
+    def close(self) -> None:
+        self.client.close()
+
+def filter_existing(
+    store: VectorStore,
+    batch: List[Dict[str, Any]],
+    counts: Dict[str, int],
+    hashes: Optional[HashStore] = None
+) -> List[Dict[str, Any]]:
+    """
+    Returns the chunks of `batch` whose point does not exist yet. Existing points are
+    skipped; if their revid changed (the same text in a new revision of the same
+    article) only the revid is updated, so revision-based deletes keep them. A point
+    stored under another title (the same text in two articles) is left to that title
+    and counted as shared. With `hashes` only
+    the chunks in the HashStore are looked up, the others are taken as new (an upsert
+    of an existing point just overwrites it).
+    """
+    ids = [point_id(item.get("text", "")) for item in batch]
+    lookup = ids if hashes is None else [pid for pid in ids if hash_value(pid) in hashes]
+    existing = store.retrieve(lookup) if lookup else {}
+    new_items = []
+    relabel: Dict[Any, List[str]] = {}
+    for item, pid in zip(batch, ids):
+        payload = existing.get(pid)
+        if payload is None:
+            new_items.append(item)
+            continue
+        if payload.get("title") != item.get("title"):
+            counts["shared"] += 1
+        elif payload.get("revid") != chunk_revid(item):
+            relabel.setdefault(chunk_revid(item), []).append(pid)
+        else:
+            counts["skipped"] += 1
+
+    for revid, pids in relabel.items():
+        store.set_payload(pids, {"revid": revid})
+        counts["relabelled"] += len(pids)
+    return new_items
+
+def delete_stale_revisions(
+    store: VectorStore,
+    current: Dict[str, Optional[int]],
+    keep_ids: Optional[Dict[str, List[str]]] = None
+) -> None:
+    """
+    For every title, deletes its points whose revid is not the current one (all of
+    them when the current revision produced no chunks). Chunks without a revid (made
+    from a clean text corpus) keep the points listed in `keep_ids` instead.
+    One filtered delete per title.
+    """
+    keep_ids = keep_ids or {}
+    for title, revid in current.items():
+        store.delete_stale(title, revid, keep_ids.get(title))
+
+def garbage_collect(store: VectorStore, live_ids: Set[str]) -> int:
+    """
+    Deletes every point whose id is not in `live_ids` (md5 hex). Reads ids only,
+    without payloads or vectors; meant for full runs, delta runs use
+    delete_stale_revisions. Returns the number of points deleted.
+    """
+    stale = [pid for pid in store.iter_ids() if pid not in live_ids]
+    store.delete_ids(stale)
+    return len(stale)
+
+def ingest_to_qdrant(
+    file_path: str,
+    delta_file: Optional[str] = None,
+    cache_dir: Optional[str] = EMBEDDING_CACHE_DIR,
+    backend: str = "local",
+    gc: bool = False,
+    profile: Optional[str] = None,
+    store: Optional[str] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    reembed: bool = False,
+    hash_store: Optional[str] = None
+):
+    """
+    Streams the chunks in file_path (JSONL or a chunk store, see iter_chunk_file)
+    through embed_and_upload. Points that already exist are neither embedded nor
+    uploaded again (see filter_existing) unless `reembed`, which overwrites them.
+    With hash_store (e.g. chunk_handler.DEDUP_STORE_FILE) the ids of the points
+    ingested are recorded there and only those are looked up on later runs.
+    `filters` restrict the run to some chunks, e.g. {"country": "FR"} to re-embed one
+    country; from a chunk store only the matching batches are read.
+
+    With a delta_file from an incremental download, once the new chunks are in, the
+    points of changed articles that carry an older revid and every point of removed
+    articles are deleted, so the work is proportional to the change. With gc=True (for
+    a full chunk file) every point whose chunk is not in file_path is deleted.
+    Embeddings are reused from (and added to) the cache in `cache_dir`; pass None to
+    always run the model. `backend` selects the encoder (see make_encoder),
+    `profile` the collection settings (see COLLECTION_PROFILES and setup_qdrant) and
+    `store` the retrieval store (default vector_store.VECTOR_STORE).
+    """
+    if gc and filters:
+        raise ValueError("gc=True needs every chunk of the file, it cannot be combined with filters.")
+    db = open_store(store, profile=profile)
+
+    revids: Dict[str, Optional[int]] = {}
+    title_ids: Dict[str, List[str]] = {}
+    live_ids: Set[str] = set()
+
+    def tracked(items):
+        for item in items:
+            title = item.get("title")
+            revids[title] = chunk_revid(item)
+            if delta_file:
+                title_ids.setdefault(title, []).append(point_id(item.get("text", "")))
+            if gc:
+                live_ids.add(point_id(item.get("text", "")))
+            yield item
+
+    cache = EmbeddingCache(cache_model_name(backend), VECTOR_SIZE, cache_dir) if cache_dir else None
+    hashes = HashStore(hash_store) if hash_store else None
+    try:
+        embed_and_upload(db, tracked(iter_chunk_file(file_path, filters)), cache=cache, backend=backend,
+                         skip_existing=not reembed, hashes=hashes)
+        remove_stale_points(db, delta_file, revids, title_ids, live_ids if gc else None)
+    finally:
+        if hashes is not None:
+            hashes.save()
+        db.close()
+
+def remove_stale_points(
+    db: VectorStore,
+    delta_file: Optional[str],
+    revids: Dict[str, Optional[int]],
+    title_ids: Dict[str, List[str]],
+    live_ids: Optional[Set[str]]
+):
+    """The deletes of ingest_to_qdrant, given the revids and ids of the chunks just ingested."""
+    if delta_file:
+        with open(delta_file, 'r', encoding='utf-8') as f:
+            delta = json.load(f)
+        changed = delta.get("changed", [])
+        if changed:
+            print(f"Removing outdated points of {len(changed)} changed articles...")
+            delete_stale_revisions(db, {title: revids.get(title) for title in changed}, title_ids)
+        if delta.get("removed"):
+            print(f"Removing points of {len(delta['removed'])} removed articles...")
+            db.delete_titles(delta["removed"])
+    elif live_ids is not None:
+        print(f"Garbage collection: {garbage_collect(db, live_ids)} stale points deleted.")
+
+def compact_embedding_cache(chunk_file: str, cache_dir: str = EMBEDDING_CACHE_DIR, backend: str = "local"):
+    """Evicts cached embeddings of chunks that are no longer in chunk_file."""
+    cache = EmbeddingCache(cache_model_name(backend), VECTOR_SIZE, cache_dir)
+    live = (chunk_key(point_id(item.get("text", "")))
+            for item in iter_chunk_file(chunk_file))
+    kept, evicted = cache.compact(live)
+    print(f"Embedding cache: kept {kept} rows, evicted {evicted}.")
+
+def build_payload(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The chunk text plus the fields searches and deletes filter on. The chunk id is the
+    point id and metadata.source repeats the title, so neither is stored again.
+    Chunk files written before country metadata fall back on the title's countries.
+    """
+    metadata = item.get("metadata") or {}
+    countries = metadata.get("countries") or title_country_codes(item.get("title"))
+    return {
+        "title": item.get("title"),
+        "revid": chunk_revid(item),
+        "country": countries,
+        "pair": metadata.get("pair") or pair_key(countries),
+        "text": item.get("text")
+    }
+
+_DONE = object()
+
+def _put(q: queue.Queue, item: Any, stop: threading.Event) -> bool:
+    """Blocking put that gives up once another stage has failed."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _get(q: queue.Queue, stop: threading.Event) -> Any:
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.5)
+        except queue.Empty:
+            continue
+    return _DONE
+
+def embed_and_upload(
+    client: Union[VectorStore, QdrantClient],
+    chunks: Iterable[Dict[str, Any]],
+    model: Optional[Encoder] = None,
+    batch_size: int = BATCH_SIZE,
+    queue_size: int = QUEUE_SIZE,
+    cache: Optional[EmbeddingCache] = None,
+    backend: str = "local",
+    skip_existing: bool = True,
+    hashes: Optional[HashStore] = None
+) -> int:
+    """
+    Embeds and upserts chunk records with reading, embedding and uploading overlapped:
+
+        reader thread --(batches)--> encode here --(ids, vectors, payloads)--> upload thread
+
+    Both queues hold at most `queue_size` batches, so memory stays flat however large
+    the corpus is. Vectors go to Qdrant as float32 arrays, without per-element lists.
+    With a cache only the chunks it does not hold are encoded, and the model (the
+    `backend` encoder, created on first use when not given) is never loaded if every
+    chunk is cached. With skip_existing the reader first drops chunks whose point is
+    already in the collection (filter_existing, which only looks up the chunks in
+    `hashes` when given); the ids of the points uploaded or found are added to `hashes`.
+    `client` is a VectorStore, or a QdrantClient for the default collection.
+    A failure in any stage stops the others and is re-raised. Returns the number of
+    points uploaded.
+    """
+    if isinstance(client, QdrantClient):
+        client = QdrantStore(client)
+    read_q: queue.Queue = queue.Queue(maxsize=queue_size)
+    upload_q: queue.Queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    counts = {"uploaded": 0, "skipped": 0, "relabelled": 0, "shared": 0}
+    models_used = [model]
+
+    def encode(texts: List[str], ids: List[str]):
+        if cache is None:
+            found, vectors = np.zeros(len(texts), dtype=bool), None
+        else:
+            found, vectors = cache.get([chunk_key(i) for i in ids])
+            metrics.inc("embedding_cache_hits_total", int(found.sum()))
+            if found.all():
+                return vectors
+        if models_used[0] is None:
+            models_used[0] = make_encoder(backend)
+            print(f"Embedding with the {backend} backend on {models_used[0].device}")
+        missing = [k for k in range(len(texts)) if not found[k]]
+        with metrics.timer("embed_batch_seconds", backend=backend):
+            fresh = models_used[0].encode([texts[k] for k in missing])
+        metrics.inc("embedded_chunks_total", len(missing))
+        if cache is None:
+            return fresh
+        fresh = cache.put([chunk_key(ids[k]) for k in missing], fresh)
+        out = np.empty((len(texts), fresh.shape[1]), dtype=np.float32)
+        out[found] = vectors
+        out[~found] = fresh
+        return out
+
+    def reader():
+        try:
+            for batch in iter_chunks(chunks, batch_size):
+                if skip_existing:
+                    batch = filter_existing(client, batch, counts, hashes)
+                    if not batch:
+                        continue
+                if not _put(read_q, batch, stop):
+                    return
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(read_q, _DONE, stop)
+
+    def uploader():
         try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            f.seek(0)
-            return [json.loads(line) for line in f if line.strip()]
-
-def ingest_to_qdrant(file_path: str):
-    client = get_local_client()
-    setup_qdrant(client)
-    
-    model = SentenceTransformer('all-MiniLM-L6-v2', device=device)
-    data = load_chunks(file_path)
-    
-    for i in tqdm(range(0, len(data), BATCH_SIZE), desc="Ingesting Batches", unit="batch"):
-        batch = data[i : i + BATCH_SIZE]
-        
-        texts = [item.get("text", "") for item in batch]
-        embeddings = model.encode(texts)
-        
-        points = []
-        for item, vector in zip(batch, embeddings):
-            # Generate a consistent ID based on the text content
-            text_content = item.get("text", "")
-            doc_id = hashlib.md5(text_content.encode('utf-8')).hexdigest()
-            
-            points.append(models.PointStruct(
-                id=doc_id,  # <--- Uses hash instead of random UUID
-                vector=vector.tolist(),
-                payload={
-                    "original_id": item.get("id"),
-                    "title": item.get("title"),
-                    "text": item.get("text"),
-                    "metadata": item.get("metadata"),
-                    "type": item.get("type"),
-                    "tags": item.get("tags")
-                }
-            ))
-        
-        client.upload_points(
-            collection_name=COLLECTION_NAME,
-            points=points
-        )
\ No newline at end of file
+            while True:
+                item = _get(upload_q, stop)
+                if item is _DONE:
+                    return
+                ids, vectors, payloads = item
+                with metrics.timer("upload_batch_seconds", store=type(client).__name__):
+                    client.upsert(ids, vectors, payloads)
+                if hashes is not None:
+                    for pid in ids:
+                        hashes.add(hash_value(pid))
+                metrics.inc("uploaded_points_total", len(ids))
+                counts["uploaded"] += len(ids)
+                pbar.update(len(ids))
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    threads = [threading.Thread(target=reader, daemon=True), threading.Thread(target=uploader, daemon=True)]
+    with tqdm(desc="Ingesting", unit="chunk") as pbar:
+        for t in threads:
+            t.start()
+        try:
+            while True:
+                batch = _get(read_q, stop)
+                if batch is _DONE:
+                    break
+                metrics.set_gauge("ingest_queue_depth", read_q.qsize(), queue="read")
+                metrics.set_gauge("ingest_queue_depth", upload_q.qsize(), queue="upload")
+                texts = [item.get("text", "") for item in batch]
+                # Generate a consistent ID based on the text content
+                ids = [point_id(text) for text in texts]
+                vectors = encode(texts, ids)
+                payloads = [build_payload(item) for item in batch]
+                if not _put(upload_q, (ids, vectors, payloads), stop):
+                    break
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(upload_q, _DONE, stop)
+            for t in threads:
+                t.join()
+            if model is None and models_used[0] is not None:
+                models_used[0].close()
+
+    if errors:
+        raise errors[0]
+    print(f"Uploaded {counts['uploaded']} new points, skipped {counts['skipped']} existing, "
+          f"relabelled {counts['relabelled']}, shared with another title {counts['shared']}.")
+    return counts["uploaded"]
@@ -0,0 +1,260 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .retrieval_service import RetrievalService
+from .vector_store import VECTOR_STORE
+
+GOLDEN_SET_FILE = "golden_queries.json"
+BASELINE_FILE = "retrieval_baseline.json"  # pinned baseline of every config, see promote_baseline
+RESULTS_DIR = "benchmark_results"
+CUTOFFS = (1, 5, 10)         # k of recall@k and nDCG@k
+CHUNKS_PER_TITLE = 3         # chunks searched per ranked title, as several chunks share an article
+LATENCY_ROUNDS = 3           # passes over the golden queries when timing single searches
+BATCH_SIZE = 16
+
+# A run fails against its baseline when a quality metric drops by more than its
+# absolute threshold. A latency (throughput) that grows (falls) by more than its share
+# is only a warning, as timings vary from machine to machine, unless latency is gated.
+QUALITY_THRESHOLDS = {"recall@5": 0.03, "recall@10": 0.03, "mrr": 0.03, "ndcg@10": 0.03}
+LATENCY_THRESHOLDS = {"p50_ms": 0.25, "p95_ms": 0.35, "single_qps": 0.20, "batch_qps": 0.20}
+
+
+class GoldenSet:
+    """Versioned queries with graded relevant titles, see GOLDEN_SET_FILE."""
+
+    def __init__(self, path: str = GOLDEN_SET_FILE):
+        with open(path, 'rb') as f:
+            data = f.read()
+        golden = json.loads(data)
+        self.path = path
+        self.version = golden["version"]
+        self.sha = hashlib.sha1(data).hexdigest()[:12]
+        self.queries: List[Dict[str, Any]] = golden["queries"]
+
+    def __len__(self) -> int:
+        return len(self.queries)
+
+
+# ==============================================================================
+# METRICS
+# ==============================================================================
+def rank_titles(hits, k: int) -> List[str]:
+    """The first k distinct titles of a chunk hit list."""
+    titles = list(dict.fromkeys(hit.payload.get("title") for hit in hits))
+    return titles[:k]
+
+
+def query_metrics(titles: List[str], relevant: Dict[str, int], cutoffs=CUTOFFS) -> Dict[str, float]:
+    """recall@k, nDCG@k (gain 2^grade - 1) and reciprocal rank of one ranked title list."""
+    metrics = {}
+    for k in cutoffs:
+        top = titles[:k]
+        metrics[f"recall@{k}"] = sum(t in relevant for t in top) / len(relevant)
+        dcg = sum((2 ** relevant.get(t, 0) - 1) / math.log2(i + 2) for i, t in enumerate(top))
+        ideal = sorted(relevant.values(), reverse=True)[:k]
+        idcg = sum((2 ** g - 1) / math.log2(i + 2) for i, g in enumerate(ideal))
+        metrics[f"ndcg@{k}"] = dcg / idcg if idcg else 0.0
+    metrics["mrr"] = next((1 / (i + 1) for i, t in enumerate(titles) if t in relevant), 0.0)
+    return metrics
+
+
+def _percentiles(latencies: List[float]) -> Dict[str, float]:
+    ms = np.asarray(latencies) * 1000
+    return {f"p{p}_ms": float(np.percentile(ms, p)) for p in (50, 95, 99)}
+
+
+# ==============================================================================
+# RUN
+# ==============================================================================
+def evaluate(service: RetrievalService, golden: GoldenSet, mode: Optional[str] = None) -> Dict[str, Any]:
+    """Quality of `service` on the golden set: mean metrics plus the per-query detail."""
+    k = max(CUTOFFS)
+    per_query = []
+    for item in golden.queries:
+        titles = rank_titles(service.search(item["query"], k * CHUNKS_PER_TITLE, mode=mode), k)
+        per_query.append({"id": item["id"], **query_metrics(titles, item["relevant"]), "titles": titles})
+    names = [name for name in per_query[0] if name not in ("id", "titles")] if per_query else []
+    return {
+        "quality": {name: float(np.mean([q[name] for q in per_query])) for name in names},
+        "per_query": per_query,
+    }
+
+
+def measure_latency(service: RetrievalService, queries: List[str], mode: Optional[str] = None,
+                    k: int = max(CUTOFFS) * CHUNKS_PER_TITLE) -> Dict[str, float]:
+    """
+    Single-query latency percentiles and throughput over LATENCY_ROUNDS passes, then
+    the throughput of search_batch on BATCH_SIZE queries. Use a service without caches.
+    """
+    service.search(queries[0], k, mode=mode)  # warm-up
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(LATENCY_ROUNDS):
+        for query in queries:
+            t = time.perf_counter()
+            service.search(query, k, mode=mode)
+            latencies.append(time.perf_counter() - t)
+    single_qps = len(latencies) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(LATENCY_ROUNDS):
+        for i in range(0, len(queries), BATCH_SIZE):
+            service.search_batch(queries[i:i + BATCH_SIZE], k, mode=mode)
+    batch_qps = len(queries) * LATENCY_ROUNDS / (time.perf_counter() - start)
+    return {**_percentiles(latencies), "single_qps": single_qps, "batch_qps": batch_qps, "batch_size": BATCH_SIZE}
+
+
+def latest_run(results_dir: str = RESULTS_DIR) -> Optional[str]:
+    """The most recent run stored in `results_dir`, if any."""
+    if not os.path.isdir(results_dir):
+        return None
+    runs = sorted(name for name in os.listdir(results_dir) if name.startswith("retrieval_") and name.endswith(".json"))
+    return os.path.join(results_dir, runs[-1]) if runs else None
+
+
+def load_baseline(config: Dict[str, Any], baseline_file: str = BASELINE_FILE) -> Optional[Dict[str, Any]]:
+    """The pinned baseline of `config` (golden version included), if any."""
+    if not os.path.exists(baseline_file):
+        return None
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        pinned = json.load(f)
+    return next((b for b in pinned["baselines"] if b["config"] == config), None)
+
+
+def promote_baseline(run_file: str, baseline_file: str = BASELINE_FILE) -> Dict[str, Any]:
+    """
+    Pins the run stored in `run_file` as the baseline of its config, replacing the
+    previous one. Commit `baseline_file` so every machine compares with the same run.
+    """
+    with open(run_file, 'r', encoding='utf-8') as f:
+        run = json.load(f)
+    baseline = {name: run[name] for name in ("config", "golden_sha", "timestamp", "quality", "latency")}
+    baseline["run_file"] = os.path.basename(run_file)
+
+    baselines = []
+    if os.path.exists(baseline_file):
+        with open(baseline_file, 'r', encoding='utf-8') as f:
+            baselines = [b for b in json.load(f)["baselines"] if b["config"] != run["config"]]
+    with open(baseline_file, 'w', encoding='utf-8') as f:
+        json.dump({"baselines": baselines + [baseline]}, f, ensure_ascii=False, indent=1)
+    print(f"📌 {run_file} is now the baseline of {run['config']}")
+    return baseline
+
+
+def compare_runs(run: Dict[str, Any], baseline: Dict[str, Any], gate_latency: bool = False) -> Tuple[List[str], List[str]]:
+    """
+    The regressions of `run` against `baseline` beyond QUALITY_THRESHOLDS, and its
+    latency changes beyond LATENCY_THRESHOLDS, which count as regressions only with
+    `gate_latency`. Returns (regressions, warnings).
+    """
+    regressions, warnings = [], []
+    for name, threshold in QUALITY_THRESHOLDS.items():
+        old, new = baseline["quality"].get(name), run["quality"].get(name)
+        if old is not None and new is not None and old - new > threshold:
+            regressions.append(f"{name} dropped {old:.3f} -> {new:.3f} (threshold {threshold})")
+    for name, threshold in LATENCY_THRESHOLDS.items():
+        old, new = baseline["latency"].get(name), run["latency"].get(name)
+        if not old or new is None:
+            continue
+        change = (old - new) / old if name.endswith("qps") else (new - old) / old
+        if change > threshold:
+            (regressions if gate_latency else warnings).append(
+                f"{name} {old:.2f} -> {new:.2f} ({change:+.0%}, threshold {threshold:.0%})")
+    return regressions, warnings
+
+
+def run_retrieval_benchmark(
+    backend: str = "local",
+    store: Optional[str] = None,
+    profile: Optional[str] = None,
+    mode: Optional[str] = None,
+    golden_file: str = GOLDEN_SET_FILE,
+    results_dir: str = RESULTS_DIR,
+    baseline: Optional[str] = None,
+    service: Optional[RetrievalService] = None,
+    baseline_file: str = BASELINE_FILE,
+    gate_latency: bool = False
+) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Scores the knowledge base on the golden set (recall@k, MRR, nDCG@k over distinct
+    titles), times single and batched searches, writes the run to `results_dir` as
+    JSON and compares it with `baseline` (a run file; default: the baseline of the
+    same config pinned in `baseline_file`, no comparison without one). Only quality
+    drops are regressions unless `gate_latency` (see compare_runs).
+    Returns the run and its regressions. Pass a `service` built without caches to
+    reuse a loaded one.
+    """
+    golden = GoldenSet(golden_file)
+    owned = service is None
+    service = service or RetrievalService(backend, store, profile, embedding_cache_size=0, result_cache_size=0)
+    try:
+        mode = mode or service.default_mode
+        config = {"golden_version": golden.version, "store": store or VECTOR_STORE,
+                  "backend": backend, "profile": profile, "mode": mode}
+        print(f"Retrieval benchmark: {len(golden)} golden queries (v{golden.version}), mode {mode}")
+        run = {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "config": config,
+            "golden_sha": golden.sha,
+            **evaluate(service, golden, mode),
+            "latency": measure_latency(service, [q["query"] for q in golden.queries], mode),
+        }
+    finally:
+        if owned:
+            service.close()
+
+    if baseline:
+        with open(baseline, 'r', encoding='utf-8') as f:
+            reference = json.load(f)
+    else:
+        reference = load_baseline(config, baseline_file)
+        if reference:
+            baseline = f"{baseline_file} ({reference['run_file']})"
+    regressions, warnings = compare_runs(run, reference, gate_latency) if reference else ([], [])
+    run["baseline"] = baseline
+    run["regressions"] = regressions
+    run["warnings"] = warnings
+
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, f"retrieval_{run['timestamp'].replace(':', '')[:17]}_{mode}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(run, f, ensure_ascii=False, indent=1)
+
+    for name, value in run["quality"].items():
+        print(f"  {name:>10} {value:.3f}")
+    for name, value in run["latency"].items():
+        print(f"  {name:>10} {value:.2f}")
+    print(f"Results saved to {path}" + (f", compared with {baseline}" if baseline else
+                                        ", no baseline (pin one with --promote)"))
+    for warning in warnings:
+        print(f"⚠️  Latency: {warning}")
+    for regression in regressions:
+        print(f"❌ Regression: {regression}")
+    return run, regressions
+
+
+if __name__ == "__main__":
+    # python -m backend.retrieval_benchmark [run.json] [--gate-latency] : exits 1 on a regression
+    # python -m backend.retrieval_benchmark --promote [run.json]        : pins a run (default: the latest)
+    parser = argparse.ArgumentParser(description="Retrieval quality and latency on the golden set.")
+    parser.add_argument("baseline", nargs="?", help="run file to compare with instead of the pinned baseline")
+    parser.add_argument("--promote", action="store_true", help="pin the given run (default: the latest) as baseline")
+    parser.add_argument("--gate-latency", action="store_true", help="fail on latency regressions too")
+    args = parser.parse_args()
+    if args.promote:
+        run_file = args.baseline or latest_run()
+        if run_file is None:
+            sys.exit(f"No run in {RESULTS_DIR} to promote.")
+        promote_baseline(run_file)
+        sys.exit(0)
+    _, found = run_retrieval_benchmark(baseline=args.baseline, gate_latency=args.gate_latency)
+    sys.exit(1 if found else 0)
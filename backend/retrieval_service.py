@@ -0,0 +1,296 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+
+from .bm25_index import BM25Index, bm25_index_path, reciprocal_rank_fusion
+from .countries import PairIndex, country_code, pair_index_path, parse_pair
+from .embedding_backends import make_encoder
+from .vector_store import SearchHit, matches_filters, open_store
+
+EMBEDDING_CACHE_SIZE = 4096  # query embeddings kept in memory
+RESULT_CACHE_SIZE = 1024     # (query, k, filters) results kept in memory
+LATENCY_WINDOW = 10000       # latencies kept for the p50/p99 report
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+CHUNK_FILE = "rag_corpus_chunked.arrow"  # its pair and BM25 indexes are loaded with it
+
+# dense  - vector search only
+# sparse - BM25 over the chunk texts only
+# hybrid - both in parallel, merged by reciprocal-rank fusion (the default when the BM25 index exists)
+SEARCH_MODES = ("dense", "sparse", "hybrid")
+RRF_K = 60                # rank offset of reciprocal-rank fusion
+HYBRID_CANDIDATES = 4     # each side of a hybrid search returns k * HYBRID_CANDIDATES candidates
+
+
+class LRUCache:
+    """Thread-safe least-recently-used mapping of at most `size` entries."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.entries: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Any:
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.size <= 0:
+            return
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+def _filters_key(filters: Optional[Dict[str, Any]]) -> Hashable:
+    if not filters:
+        return None
+    return tuple(sorted((k, tuple(v) if isinstance(v, (list, tuple, set)) else v) for k, v in filters.items()))
+
+
+# ==============================================================================
+# RETRIEVAL SERVICE
+# ==============================================================================
+class RetrievalService:
+    """
+    Loads the encoder and opens the store once, then answers searches for the life of
+    the process. Query embeddings and results are kept in LRU caches; the encoder and
+    the store are each used by one thread at a time, so the service can be shared by
+    concurrent requests (see serve()). With the BM25 index of `chunk_file` present,
+    searches are hybrid by default (see SEARCH_MODES).
+    """
+
+    def __init__(
+        self,
+        backend: str = "local",
+        store: Optional[str] = None,
+        profile: Optional[str] = None,
+        embedding_cache_size: int = EMBEDDING_CACHE_SIZE,
+        result_cache_size: int = RESULT_CACHE_SIZE,
+        chunk_file: str = CHUNK_FILE
+    ):
+        self.encoder = make_encoder(backend)
+        self.store = open_store(store, profile=profile, read_only=True)
+        self.embeddings = LRUCache(embedding_cache_size)
+        self.results = LRUCache(result_cache_size)
+        self.encode_lock = threading.Lock()
+        self.store_lock = threading.Lock()
+        self.latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self.pair_index = PairIndex.load(pair_index_path(chunk_file))
+        bm25_dir = bm25_index_path(chunk_file)
+        self.bm25 = BM25Index(bm25_dir) if os.path.exists(os.path.join(bm25_dir, "meta.json")) else None
+        self.default_mode = "hybrid" if self.bm25 is not None else "dense"
+        self.sparse_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="bm25")
+
+    def embed(self, queries: List[str]) -> List[np.ndarray]:
+        """Query vectors, encoding only the queries not cached, in one batch."""
+        vectors = [self.embeddings.get(q) for q in queries]
+        missing = list(dict.fromkeys(q for q, v in zip(queries, vectors) if v is None))
+        if missing:
+            with self.encode_lock:
+                fresh = dict(zip(missing, self.encoder.encode(missing)))
+            for q, v in fresh.items():
+                self.embeddings.put(q, v)
+            vectors = [fresh[q] if v is None else v for q, v in zip(queries, vectors)]
+        return vectors
+
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        filters: Optional[Dict[str, Any]] = None,
+        mode: Optional[str] = None
+    ) -> List[SearchHit]:
+        return self.search_batch([query], k, filters, mode)[0]
+
+    def search_batch(
+        self,
+        queries: List[str],
+        k: int = 5,
+        filters: Optional[Dict[str, Any]] = None,
+        mode: Optional[str] = None
+    ) -> List[List[SearchHit]]:
+        """Top-k hits of every query; `filters` as in VectorStore.search, `mode` one of SEARCH_MODES."""
+        mode = mode or self.default_mode
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}', expected one of {SEARCH_MODES}.")
+        if mode != "dense" and self.bm25 is None:
+            raise ValueError(f"Search mode '{mode}' needs the BM25 index, which was not found.")
+
+        start = time.perf_counter()
+        keys = [(q, k, _filters_key(filters), mode) for q in queries]
+        results = [self.results.get(key) for key in keys]
+        todo = [i for i, r in enumerate(results) if r is None]
+        if todo:
+            candidates = k if mode != "hybrid" else k * HYBRID_CANDIDATES
+            # BM25 runs on the pool while this thread embeds and searches the store
+            sparse = [self.sparse_pool.submit(self._sparse_search, queries[i], candidates, filters)
+                      for i in todo] if mode != "dense" else None
+            dense = None
+            if mode != "sparse":
+                vectors = self.embed([queries[i] for i in todo])
+                dense = []
+                for vector in vectors:
+                    with self.store_lock:
+                        dense.append(self.store.search(vector, candidates, filters))
+            for n, i in enumerate(todo):
+                if mode == "dense":
+                    results[i] = dense[n]
+                elif mode == "sparse":
+                    results[i] = sparse[n].result()
+                else:
+                    results[i] = _fuse(dense[n], sparse[n].result(), k)
+                self.results.put(keys[i], results[i])
+        elapsed = (time.perf_counter() - start) / max(len(queries), 1)
+        self.latencies.extend([elapsed] * len(queries))
+        return results
+
+    def _sparse_search(self, query: str, k: int, filters: Optional[Dict[str, Any]]) -> List[SearchHit]:
+        """
+        BM25 hits with their payloads. Filters are applied to the fetched payloads, so
+        a narrow filter over a broad query can leave fewer than k hits; ids no longer in
+        the store are dropped.
+        """
+        ranked = self.bm25.search(query, k if not filters else k * HYBRID_CANDIDATES)
+        with self.store_lock:
+            payloads = self.store.fetch([i for i, _ in ranked]) if ranked else {}
+        hits = [SearchHit(i, score, payloads[i]) for i, score in ranked
+                if i in payloads and matches_filters(payloads[i], filters)]
+        return hits[:k]
+
+    def search_countries(
+        self,
+        query: str,
+        country: Optional[str] = None,
+        pair: Any = None,
+        k: int = 5
+    ) -> List[SearchHit]:
+        """
+        Searches only the chunks of one country or one pair ("DZ-FR", "France–Algeria"
+        or ("France", "Algeria")), through the indexed country/pair payload fields.
+        Countries and pairs without chunks in the pair index return [] without a search.
+        """
+        if pair is not None:
+            key = parse_pair(pair)
+            filters = {"pair": key}
+        else:
+            key = country_code(country)
+            filters = {"country": key}
+        if key is None:
+            raise ValueError(f"Unknown country or pair: {pair if pair is not None else country}")
+        if self.pair_index.articles and not self.pair_index.ids(pair=filters.get("pair"), country=filters.get("country")):
+            return []
+        return self.search(query, k, filters)
+
+    def pairs(self) -> Dict[str, int]:
+        """Chunk count of every country pair, for the map."""
+        return self.pair_index.pairs()
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-query latency percentiles and cache hit counts since start, and the encoder's device."""
+        latencies = np.asarray(self.latencies) * 1000
+        return {
+            "queries": len(latencies),
+            "p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else None,
+            "p99_ms": float(np.percentile(latencies, 99)) if len(latencies) else None,
+            "embedding_cache_hits": self.embeddings.hits,
+            "result_cache_hits": self.results.hits,
+            "encoder_device": self.encoder.device,
+        }
+
+    def close(self) -> None:
+        self.sparse_pool.shutdown()
+        self.encoder.close()
+        self.store.close()
+
+    # --- HTTP ---------------------------------------------------------------------
+    def serve(self, host: str = SERVICE_HOST, port: int = SERVICE_PORT) -> ThreadingHTTPServer:
+        """
+        Serves the service over HTTP on a background thread (one thread per request):
+            POST /search {"query": str | "queries": [str], "k": int, "filters": {...}, "mode": str}
+                 filters: {"country": "FR"}, {"pair": "DZ-FR"}, {"title": [...]}
+                 mode: "dense", "sparse" or "hybrid" (see SEARCH_MODES)
+            GET  /pairs   chunk count per country pair
+            GET  /stats
+        Returns the server; call shutdown() on it to stop.
+        """
+        server = ThreadingHTTPServer((host, port), _make_handler(self))
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Retrieval service listening on http://{host}:{server.server_address[1]}")
+        return server
+
+
+def _fuse(dense: List[SearchHit], sparse: List[SearchHit], k: int) -> List[SearchHit]:
+    """Top-k of the reciprocal-rank fusion of two hit lists, scored by their fused score."""
+    hits = {hit.id: hit for hit in sparse}
+    hits.update((hit.id, hit) for hit in dense)
+    fused = reciprocal_rank_fusion([[hit.id for hit in dense], [hit.id for hit in sparse]], RRF_K)
+    return [SearchHit(i, score, hits[i].payload) for i, score in fused[:k]]
+
+
+def _make_handler(service: RetrievalService):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body: Any) -> None:
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                self._send(200, service.stats())
+            elif self.path == "/pairs":
+                self._send(200, service.pairs())
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/search":
+                self._send(404, {"error": "not found"})
+                return
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                queries = request.get("queries") or [request["query"]]
+                results = service.search_batch(queries, int(request.get("k", 5)), request.get("filters"),
+                                               request.get("mode"))
+            except (KeyError, ValueError, TypeError) as e:
+                self._send(400, {"error": str(e)})
+                return
+            hits = [[hit._asdict() for hit in hits] for hits in results]
+            self._send(200, {"results": hits} if "queries" in request else {"hits": hits[0]})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+if __name__ == "__main__":
+    # python -m backend.retrieval_service : serves the default store until interrupted
+    service = RetrievalService()
+    server = service.serve()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(service.stats())
+        service.close()
@@ -0,0 +1,250 @@
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+from . import metrics
+
+INDEX_FILE = "wiki_bilateral_relations.csv"
+RAW_FILE = "rag_corpus_raw.jsonl"
+CLEAN_FILE = "rag_corpus_clean.txt"
+CHUNK_FILE = "rag_corpus_chunked.arrow"  # memory-mapped chunk store, see chunk_store
+GOLDEN_FILE = "golden_queries.json"
+SEARCH_RESULTS_FILE = "search_results.txt"
+PIPELINE_STATE_FILE = "pipeline_state.json"  # fingerprint, wall time and item count of every stage's last run
+
+DEFAULT_OPTIONS = {
+    "workers": os.cpu_count() or 1,
+    "backend": "local",   # embedding backend, see embedding_backends.make_encoder
+    "store": None,        # vector store, see vector_store.VECTOR_STORES
+    "profile": None,      # Qdrant collection profile, see qdrant_handler.COLLECTION_PROFILES
+    "gate_latency": False,  # let the test stage fail on latency regressions, not only on quality
+}
+
+
+class Stage(NamedTuple):
+    """
+    One step of the knowledge base build. `inputs` and `outputs` give the files (or
+    directories) it reads and writes for the run options; `params` the options that
+    change its output. `run` does the work and returns the number of items produced.
+    """
+    name: str
+    inputs: Callable[[Dict[str, Any]], List[str]]
+    outputs: Callable[[Dict[str, Any]], List[str]]
+    run: Callable[[Dict[str, Any]], int]
+    params: Sequence[str] = ()
+
+
+def _store_path(options: Dict[str, Any]) -> str:
+    from .vector_store import STORE_PATHS, VECTOR_STORE
+    return STORE_PATHS[options["store"] or VECTOR_STORE]
+
+
+def _count_lines(path: str) -> int:
+    with open(path, 'rb') as f:
+        return sum(1 for _ in f)
+
+
+# ==============================================================================
+# STAGES
+# ==============================================================================
+def _crawl(options: Dict[str, Any]) -> int:
+    # APPROX TIME : 30 minutes (resumes from wiki_crawl_checkpoint.sqlite)
+    from .create_wikipedia_index import scrape_bilateral_relations_data
+    scrape_bilateral_relations_data(filename=INDEX_FILE)
+    return _count_lines(INDEX_FILE) - 1
+
+
+def _download(options: Dict[str, Any]) -> int:
+    # APPROX TIME : 7m30
+    from .wikipedia_downloader_cleaner import download_corpus
+    return download_corpus(input_file=INDEX_FILE, output_file=RAW_FILE)
+
+
+def _clean(options: Dict[str, Any]) -> int:
+    # APPROX TIME : seconds, same output for any number of workers
+    from .wikipedia_downloader_cleaner import process_corpus
+    return process_corpus(input_file=RAW_FILE, output_file=CLEAN_FILE, workers=options["workers"])
+
+
+def _chunk(options: Dict[str, Any]) -> int:
+    # APPROX TIME : 3 minutes
+    from .chunk_handler import DEDUP_STORE_FILE, generate_chunks
+    return generate_chunks(input_file=CLEAN_FILE, output_file=CHUNK_FILE, workers=options["workers"],
+                           dedup_store=DEDUP_STORE_FILE)
+
+
+def _ingest(options: Dict[str, Any]) -> int:
+    # APPROX TIME : 50 min on CPU, 8 min on GPU for a new collection; existing points are skipped
+    from .chunk_handler import DEDUP_STORE_FILE
+    from .qdrant_handler import ingest_to_qdrant
+    from .chunk_store import count_chunks
+    ingest_to_qdrant(CHUNK_FILE, backend=options["backend"], gc=True, profile=options["profile"], store=options["store"],
+                     hash_store=DEDUP_STORE_FILE)
+    return count_chunks(CHUNK_FILE)
+
+
+def _test(options: Dict[str, Any]) -> int:
+    from .retrieval_benchmark import run_retrieval_benchmark
+    from .retrieval_service import RetrievalService
+    from .testing_kb import test_database
+
+    service = RetrievalService(options["backend"], options["store"], options["profile"],
+                               embedding_cache_size=0, result_cache_size=0)
+    try:
+        test_database(service=service)
+        run, regressions = run_retrieval_benchmark(options["backend"], options["store"], options["profile"],
+                                                   golden_file=GOLDEN_FILE, service=service,
+                                                   gate_latency=options["gate_latency"])
+    finally:
+        service.close()
+    if regressions:
+        raise RuntimeError(f"Retrieval regressed: {'; '.join(regressions)}")
+    return len(run["per_query"])
+
+
+STAGES = [
+    Stage("crawl", lambda o: [], lambda o: [INDEX_FILE], _crawl),
+    Stage("download", lambda o: [INDEX_FILE], lambda o: [RAW_FILE], _download),
+    Stage("clean", lambda o: [RAW_FILE], lambda o: [CLEAN_FILE], _clean),
+    Stage("chunk", lambda o: [CLEAN_FILE], lambda o: [CHUNK_FILE], _chunk),
+    Stage("ingest", lambda o: [CHUNK_FILE], lambda o: [_store_path(o)], _ingest, ("backend", "store", "profile")),
+    Stage("test", lambda o: [CHUNK_FILE, GOLDEN_FILE, _store_path(o)], lambda o: [SEARCH_RESULTS_FILE], _test,
+          ("backend", "store", "profile")),
+]
+STAGE_NAMES = [stage.name for stage in STAGES]
+
+
+# ==============================================================================
+# RUNNER
+# ==============================================================================
+def fingerprint(paths: List[str], params: Dict[str, Any]) -> str:
+    """
+    Hash of the size and modification time of every file under `paths` plus `params`:
+    cheap enough to check gigabyte inputs on every run.
+    """
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode())
+    for path in paths:
+        files = [path]
+        if os.path.isdir(path):
+            files = sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+        for file in files:
+            try:
+                st = os.stat(file)
+                digest.update(f"{file}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+            except FileNotFoundError:
+                digest.update(f"{file}:missing\n".encode())
+    return digest.hexdigest()
+
+
+def select_stages(first: Optional[str] = None, last: Optional[str] = None, only: Sequence[str] = ()) -> List[Stage]:
+    """The stages named in `only`, else the range first..last (default: all), in pipeline order."""
+    for name in [first, last, *only]:
+        if name is not None and name not in STAGE_NAMES:
+            raise ValueError(f"Unknown stage '{name}', expected one of {STAGE_NAMES}.")
+    if only:
+        return [stage for stage in STAGES if stage.name in only]
+    start = STAGE_NAMES.index(first) if first else 0
+    end = STAGE_NAMES.index(last) if last else len(STAGES) - 1
+    return STAGES[start:end + 1]
+
+
+def load_state(state_file: str = PIPELINE_STATE_FILE) -> Dict[str, Dict[str, Any]]:
+    if not os.path.exists(state_file):
+        return {}
+    with open(state_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _stage_key(stage: Stage, options: Dict[str, Any]) -> str:
+    return fingerprint(stage.inputs(options), {name: options[name] for name in stage.params})
+
+
+def run_stages(
+    first: Optional[str] = None,
+    last: Optional[str] = None,
+    only: Sequence[str] = (),
+    force: bool = False,
+    dry_run: bool = False,
+    state_file: str = PIPELINE_STATE_FILE,
+    metrics_dir: str = metrics.METRICS_DIR,
+    **options
+) -> List[Dict[str, Any]]:
+    """
+    Runs the selected stages (see select_stages) in order. A stage is skipped when the
+    fingerprint of its inputs and params matches its last successful run and its
+    outputs exist, unless `force`. Wall time and item count of every stage that runs
+    are saved to `state_file` as soon as it finishes; a failing stage stops the run
+    and is retried next time. The metrics of the stages that ran (see backend.metrics)
+    go to `metrics_dir` as a JSON report and a Prometheus textfile; set
+    $PIPELINE_PROFILE to profile stages. `options` override DEFAULT_OPTIONS.
+    Returns one {"stage", "status", "seconds", "items"} entry per selected stage.
+    """
+    options = {**DEFAULT_OPTIONS, **options}
+    state = load_state(state_file)
+    report = []
+    try:
+        for stage in select_stages(first, last, only):
+            missing = [path for path in stage.inputs(options) if not os.path.exists(path)]
+            if missing and not dry_run:
+                raise FileNotFoundError(f"Stage '{stage.name}' needs {missing}; run the stage that writes them first.")
+            key = _stage_key(stage, options)
+            previous = state.get(stage.name, {})
+            # A stage without inputs (the crawl) only reruns when forced or its outputs are gone
+            unchanged = previous.get("fingerprint") == key or not stage.inputs(options)
+            if not force and unchanged and all(map(os.path.exists, stage.outputs(options))):
+                print(f"⏭️  {stage.name}: up to date")
+                report.append({"stage": stage.name, "status": "skipped", "seconds": 0.0, "items": previous.get("items")})
+                continue
+            if dry_run:
+                print(f"▶️  {stage.name}: would run")
+                report.append({"stage": stage.name, "status": "pending", "seconds": 0.0, "items": None})
+                continue
+
+            print(f"▶️  {stage.name}")
+            start = time.perf_counter()
+            with metrics.stage(stage.name):
+                items = stage.run(options)
+            seconds = time.perf_counter() - start
+            # Recomputed, as a stage may touch its own inputs (the test stage opens the store)
+            state[stage.name] = {
+                "fingerprint": _stage_key(stage, options),
+                "seconds": round(seconds, 2),
+                "items": items,
+                "peak_rss_mb": round(metrics.METRICS.stages[stage.name]["peak_rss_mb"], 1),
+                "finished": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            }
+            with open(state_file, 'w', encoding='utf-8') as f:
+                json.dump(state, f, indent=1)
+            print(f"✅ {stage.name}: {items} items in {seconds:.1f}s")
+            report.append({"stage": stage.name, "status": "ran", "seconds": seconds, "items": items})
+    finally:
+        # Per-stage throughput, latency histograms and peak RSS of the stages that ran
+        if metrics.METRICS.stages:
+            metrics.METRICS.write_report(metrics_dir)
+
+    print(f"\n{'stage':>8} {'status':>8} {'seconds':>9} {'items':>9}")
+    for r in report:
+        print(f"{r['stage']:>8} {r['status']:>8} {r['seconds']:>9.1f} {r['items'] if r['items'] is not None else '-':>9}")
+    return report
+
+
+def print_status(state_file: str = PIPELINE_STATE_FILE, **options) -> None:
+    """Last run of every stage and whether its inputs changed since."""
+    options = {**DEFAULT_OPTIONS, **options}
+    state = load_state(state_file)
+    print(f"{'stage':>8} {'state':>10} {'last run':>26} {'seconds':>9} {'items':>9}")
+    for stage in STAGES:
+        last = state.get(stage.name)
+        if last is None and not stage.inputs(options) and all(map(os.path.exists, stage.outputs(options))):
+            print(f"{stage.name:>8} {'up to date':>10}")
+            continue
+        if last is None:
+            print(f"{stage.name:>8} {'never run':>10}")
+            continue
+        unchanged = last["fingerprint"] == _stage_key(stage, options) or not stage.inputs(options)
+        fresh = unchanged and all(map(os.path.exists, stage.outputs(options)))
+        print(f"{stage.name:>8} {'up to date' if fresh else 'stale':>10} {last['finished']:>26} "
+              f"{last['seconds']:>9.1f} {last['items'] if last['items'] is not None else '-':>9}")
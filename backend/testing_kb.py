@@ -1,23 +1,23 @@
-from qdrant_client import QdrantClient
-from sentence_transformers import SentenceTransformer
+from typing import Optional
+
+from .retrieval_service import RetrievalService
 
-COLLECTION_NAME = "Geopolitical_Knowledge_Base"
-LOCAL_DB_PATH = "./qdrant_storage"
 OUTPUT_FILE = "search_results.txt"
 
-def test_database():
-    client = QdrantClient(path=LOCAL_DB_PATH)
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+def test_database(
+    backend: str = "local",
+    profile: Optional[str] = None,
+    store: Optional[str] = None,
+    service: Optional[RetrievalService] = None
+):
+    """Runs the reference query and writes the top 5 hits. Pass a running `service` to reuse its model and store."""
+    owned = service is None
+    service = service or RetrievalService(backend, store, profile)
     
     query_text = "2024 and 2025 recent events degrading relations between france and algeria"
-    query_vector = model.encode(query_text).tolist()
 
     try:
-        results = client.query_points(
-            collection_name=COLLECTION_NAME,
-            query=query_vector,
-            limit=5,
-        ).points
+        results = service.search(query_text, k=5)
 
         with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
             f.write(f"Query: {query_text}\n")
@@ -38,3 +38,6 @@ def test_database():
 
     except Exception as e:
         print(f"❌ Error: {e}")
+    finally:
+        if owned:
+            service.close()
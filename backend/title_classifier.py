@@ -0,0 +1,176 @@
+import threading
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+PRIORITY_KEEPS = [
+    "great game", "shootdown", "spy case", "cold war", "incident", "scandal"
+]
+
+NOISE_KEYWORDS_RAW = [
+    # Substring matches
+    "football", "soccer", "olympic", "championship", "tournament",
+    "movie", "music", "song", "album", "orchestra", "festival",
+    "museum", "exhibition", "theatre", "species", "garden",
+    "list of ambassadors", "list of high commissioners", "list of consuls",
+    "list of diplomatic missions", "list of twin towns", "sister cities",
+    # Exact word matches
+    "film", "park", "cup", "game", "match", "sport", "race"
+]
+EXACT_NOISE_WORDS = ["film", "park", "cup", "game", "match", "sport", "race"]
+
+INTERESTING_KEYWORDS_RAW = [
+    "relations", "embassy", "consulate", "liaison", "mission",
+    "summit", "visit", "trip", "dialogue", "conference", "forum",
+    "treaty", "accord", "agreement", "memorandum", "declaration", "protocol",
+    "alliance", "partnership", "cooperation", "recognition",
+    "affair", "election", "referendum", "protest",
+    "rights", "democracy", "government", "office", "institute",
+    "reconciliation", "repatriation", "party", "authority", "council",
+    "committee", "bloc", "federation", "conquest", "skirmish",
+    "pact", "talks", "hotline", "nunciature", "ambassador",
+    "diplomat", "high commission",
+    "war", "conflict", "dispute", "crisis", "tension", "standoff",
+    "invasion", "occupation", "annexation", "coup", "uprising", "insurgency",
+    "terror", "bombing", "attack", "airstrike", "hostage", "sanction",
+    "intelligence", "espionage", "surveillance", "cyber",
+    "operation", "assassination", "clash",
+    "massacre", "hack", "arrest", "detention", "prisoner",
+    "border", "boundary", "territory", "claim", "eez", "continental shelf",
+    "maritime", "naval", "patrol", "coast guard", "joint exercise",
+    "island", "archipelago", "trade", "tariff", "pipeline", "refugee",
+    "migration", "deportation", "asylum", "loan", "debt",
+    "railway", "highway"
+]
+
+# Strict words: Must be exact whole words (e.g. "aid" but not "raid")
+STRICT_INTEREST_WORDS = ["dam", "act", "aid", "trip", "vote", "gas", "oil", "ban", "party", "zone"]
+
+# (rule, label, substring keywords, whole-word keywords), in priority order: the first
+# rule with a match in the title decides, a title matching none is DEFAULT_LABEL.
+TITLE_RULES: List[Tuple[str, str, List[str], List[str]]] = [
+    ("priority", "KEPT", PRIORITY_KEEPS, []),
+    ("flight", "IGNORED", ["flight"], []),  # conditional noise, before the keywords of interest
+    ("noise", "IGNORED", [w for w in NOISE_KEYWORDS_RAW if w not in EXACT_NOISE_WORDS], EXACT_NOISE_WORDS),
+    ("interest", "KEPT", [w for w in INTERESTING_KEYWORDS_RAW if w not in STRICT_INTEREST_WORDS],
+     STRICT_INTEREST_WORDS),
+]
+DEFAULT_LABEL = "IGNORED"
+SEPARATOR = "\n"  # joins the titles of a batch: never in a title, and not a word character
+# Keywords match like re.IGNORECASE does for ASCII patterns: ASCII letters of either
+# case plus the four non-ASCII characters that fold onto one, character for character
+# (str.lower and str.casefold turn "İ" into two characters and would shift offsets).
+# Rules in LOWERCASE_RULES match like `keyword in title.lower()` instead, as the
+# flight check of categorize_title does.
+_IGNORECASE_FOLD = str.maketrans({
+    **{chr(c): chr(c + 32) for c in range(ord("A"), ord("Z") + 1)},
+    "\u0130": "i",  # İ
+    "\u0131": "i",  # ı
+    "\u017f": "s",  # ſ
+    "\u212a": "k",  # Kelvin sign
+})
+LOWERCASE_RULES = {"flight"}
+
+
+def _is_word_char(char: str) -> bool:
+    # What \w matches in a str pattern
+    return char.isalnum() or char == "_"
+
+
+class TitleClassifier:
+    """
+    KEPT / IGNORED decision for index titles, with the rule that made it:
+    "<rule>:<keyword>" such as "interest:treaty" or "noise:film", "default" when no
+    keyword matched, "invalid" for a missing title.
+
+    Every keyword of every rule is in one Aho-Corasick automaton (pyahocorasick), so
+    a title is scanned once however many keywords there are. Whole-word keywords only
+    count with a non-word character or the end of the title on both sides, like \\b.
+    classify_batch case-folds (see _IGNORECASE_FOLD) and joins a batch into one string
+    and scans it in a single pass. The decisions are the ones of
+    create_wikipedia_index.categorize_title. Keywords must be ASCII.
+    """
+
+    def __init__(self, rules: Sequence[Tuple[str, str, List[str], List[str]]] = TITLE_RULES):
+        import ahocorasick
+
+        self.rules = list(rules)
+        keywords: Dict[str, List[Tuple[int, bool]]] = {}
+        for rank, (_, _, substrings, words) in enumerate(self.rules):
+            if not all(keyword.isascii() for keyword in [*substrings, *words]):
+                raise ValueError(f"Title rule '{self.rules[rank][0]}' has non-ASCII keywords.")
+            for keyword in substrings:
+                keywords.setdefault(keyword.lower(), []).append((rank, False))
+            for keyword in words:
+                keywords.setdefault(keyword.lower(), []).append((rank, True))
+        self.automaton = ahocorasick.Automaton()
+        for keyword, targets in keywords.items():
+            self.automaton.add_word(keyword, (keyword, tuple(targets)))
+        self.automaton.make_automaton()
+
+    def classify_batch(self, titles: Sequence[Any]) -> Tuple[List[str], List[str]]:
+        """The labels and rules of `titles`, in order."""
+        folded = [t.translate(_IGNORECASE_FOLD) if isinstance(t, str) else "" for t in titles]
+        text = SEPARATOR.join(folded)
+        starts = list(accumulate((len(t) + 1 for t in folded[:-1]), initial=0))
+        best: List[Optional[Tuple[int, int, str]]] = [None] * len(folded)  # (rank, start, keyword)
+
+        for end, (keyword, targets) in self.automaton.iter(text):
+            start = end - len(keyword) + 1
+            i = bisect_right(starts, start) - 1
+            bounded = None
+            for rank, whole_word in targets:
+                current = best[i]
+                if current is not None and (current[0], current[1]) <= (rank, start):
+                    continue
+                if self.rules[rank][0] in LOWERCASE_RULES and keyword not in titles[i].lower():
+                    continue
+                if whole_word:
+                    if bounded is None:
+                        bounded = ((start == 0 or not _is_word_char(text[start - 1]))
+                                   and (end + 1 == len(text) or not _is_word_char(text[end + 1])))
+                    if not bounded:
+                        continue
+                best[i] = (rank, start, keyword)
+
+        labels, rules = [], []
+        for title, match in zip(titles, best):
+            if not isinstance(title, str):
+                labels.append(DEFAULT_LABEL)
+                rules.append("invalid")
+            elif match is None:
+                labels.append(DEFAULT_LABEL)
+                rules.append("default")
+            else:
+                name, label = self.rules[match[0]][:2]
+                labels.append(label)
+                rules.append(f"{name}:{match[2]}")
+        return labels, rules
+
+    def classify(self, title: Any) -> Tuple[str, str]:
+        """The label and rule of one title."""
+        labels, rules = self.classify_batch([title])
+        return labels[0], rules[0]
+
+
+_CLASSIFIER: Optional[TitleClassifier] = None
+_CLASSIFIER_LOCK = threading.Lock()
+
+
+def get_classifier() -> TitleClassifier:
+    """The TitleClassifier of TITLE_RULES, built on first use and shared by every thread."""
+    global _CLASSIFIER
+    with _CLASSIFIER_LOCK:
+        if _CLASSIFIER is None:
+            _CLASSIFIER = TitleClassifier()
+        return _CLASSIFIER
+
+
+def classify_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Sets "keep" (KEPT / IGNORED) and "rule" on {"title", ...} rows, in place, and returns them."""
+    if rows:
+        labels, rules = get_classifier().classify_batch([row["title"] for row in rows])
+        for row, label, rule in zip(rows, labels, rules):
+            row["keep"] = label
+            row["rule"] = rule
+    return rows
@@ -0,0 +1,90 @@
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+import numpy as np
+
+# Retrieval store used by ingest_to_qdrant and test_database:
+#   qdrant - the Qdrant collection (local mode or a server), see qdrant_handler.QdrantStore
+#   faiss  - an in-process FAISS index with a SQLite payload side-car, see faiss_store.FaissStore
+VECTOR_STORES = ("qdrant", "faiss")
+VECTOR_STORE = "qdrant"
+# Where each store keeps its data (qdrant_handler.LOCAL_DB_PATH, faiss_store.FAISS_DIR),
+# here so the pipeline can check them without importing the store clients
+STORE_PATHS = {"qdrant": "./qdrant_storage", "faiss": "faiss_store"}
+
+
+def _as_set(value: Any) -> set:
+    return set(value) if isinstance(value, (list, tuple, set)) else {value}
+
+
+def matches_filters(payload: Dict[str, Any], filters: Optional[Dict[str, Any]]) -> bool:
+    """Whether a payload passes VectorStore.search `filters` (for chunks found outside the store)."""
+    return all(_as_set(payload.get(field)) & _as_set(value) for field, value in (filters or {}).items())
+
+
+class SearchHit(NamedTuple):
+    id: str
+    score: float
+    payload: Dict[str, Any]
+
+
+class VectorStore:
+    """
+    What ingestion and search need from a store. Point ids are the md5 hex ids of
+    the chunks, payloads the dicts of qdrant_handler.build_payload. `filters` map a
+    payload field ("title", "country") to a value or a list of accepted values.
+    """
+
+    def retrieve(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Title and revid of the points of `ids` that exist, by id."""
+        raise NotImplementedError
+
+    def fetch(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Full payloads of the points of `ids` that exist, by id."""
+        raise NotImplementedError
+
+    def set_payload(self, ids: List[str], payload: Dict[str, Any]) -> None:
+        """Overwrites the given payload fields of existing points."""
+        raise NotImplementedError
+
+    def upsert(self, ids: List[str], vectors: np.ndarray, payloads: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    def delete_ids(self, ids: List[str]) -> None:
+        raise NotImplementedError
+
+    def delete_titles(self, titles: List[str]) -> None:
+        """Deletes every point of the given titles."""
+        raise NotImplementedError
+
+    def delete_stale(self, title: str, revid: Optional[int], keep_ids: Optional[List[str]] = None) -> None:
+        """
+        Deletes the points of `title` whose revid is not `revid`; with revid None, the
+        points not in `keep_ids` (all of them without keep_ids).
+        """
+        raise NotImplementedError
+
+    def iter_ids(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def search(self, vector: np.ndarray, k: int = 5, filters: Optional[Dict[str, Any]] = None) -> List[SearchHit]:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+def open_store(kind: Optional[str] = None, profile: Optional[str] = None, read_only: bool = False) -> VectorStore:
+    """
+    Opens the configured store (`kind`, default VECTOR_STORE). `profile` is the
+    Qdrant collection profile. `read_only` is for searching: the Qdrant collection is
+    not set up or changed and an IVF-PQ FAISS index is opened memory-mapped (an HNSW one
+    is always loaded into RAM, see FaissStore).
+    """
+    kind = kind or VECTOR_STORE
+    if kind == "qdrant":
+        from .qdrant_handler import QdrantStore
+        return QdrantStore(profile=profile, read_only=read_only)
+    if kind == "faiss":
+        from .faiss_store import FaissStore
+        return FaissStore(read_only=read_only)
+    raise ValueError(f"Unknown vector store '{kind}', expected one of {VECTOR_STORES}.")
@@ -1,28 +1,400 @@
 import requests
-import pandas as pd
 import re
 import time
 import json
 import os
 import html
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
 
+from . import metrics
+from .create_wikipedia_index import TokenBucket
+from .parallel import WorkerStats, ordered_pool_map, timed_task
+from .wikipedia_dump_reader import read_dump_batches
+
 # --- CONFIGURATION ---
 WIKI_API_URL = "https://en.wikipedia.org/w/api.php"
 USER_AGENT = "Geopolitical-Map/3.0 (Contact: robin.mariaccia@gmail.com)"
 CLEAN_CORPUS_FILE = "rag_corpus_clean.txt"
+MANIFEST_FILE = "rag_corpus_manifest.json"
+DELTA_FILE = "rag_corpus_delta.json"
+MISSING_FILE = "rag_corpus_missing.json"
+
+# ==============================================================================
+# MANIFEST: REVIDS ALREADY DOWNLOADED
+# ==============================================================================
+def load_manifest(manifest_file: str) -> Dict[str, Dict[str, int]]:
+    """
+    Manifest layout:
+        {"articles": {title: revid}, "tombstones": {title: last revid}}
+    `articles` holds the revision each downloaded article was fetched at;
+    `tombstones` keeps titles that have since left the index.
+    """
+    if not os.path.exists(manifest_file):
+        return {"articles": {}, "tombstones": {}}
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    manifest.setdefault("articles", {})
+    manifest.setdefault("tombstones", {})
+    return manifest
+
+
+def save_manifest(manifest: Dict[str, Dict[str, int]], manifest_file: str) -> None:
+    tmp_file = manifest_file + ".tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_file, manifest_file)
+
+
+def compute_delta(index: Dict[str, int], manifest: Dict[str, Dict[str, int]]) -> Dict[str, List[str]]:
+    """
+    Compares the index revids against the manifest.
+    An article is 'changed' when the index knows a newer revision than the one downloaded.
+    """
+    articles = manifest["articles"]
+    return {
+        "added": [t for t in index if t not in articles],
+        "changed": [t for t in index if t in articles and index[t] > articles[t]],
+        "removed": [t for t in articles if t not in index]
+    }
+
+
+def delta_path(file_path: str) -> str:
+    """rag_corpus_raw.jsonl -> rag_corpus_raw.delta.jsonl"""
+    root, ext = os.path.splitext(file_path)
+    return f"{root}.delta{ext}"
+
+
+def load_delta(delta_file: str) -> Dict[str, List[str]]:
+    with open(delta_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def merge_raw_corpus(corpus_file: str, delta_file: str, replaced: Set[str]) -> None:
+    """
+    Rewrites the full raw corpus without the `replaced` titles, then appends the delta,
+    so a later full clean/chunk run still sees one entry per live article.
+    """
+    tmp_file = corpus_file + ".tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as fout:
+        if os.path.exists(corpus_file):
+            with open(corpus_file, 'r', encoding='utf-8') as fin:
+                for line in fin:
+                    try:
+                        if json.loads(line)['title'] in replaced:
+                            continue
+                    except (json.JSONDecodeError, KeyError):
+                        continue
+                    fout.write(line)
+        with open(delta_file, 'r', encoding='utf-8') as fin:
+            for line in fin:
+                fout.write(line)
+    os.replace(tmp_file, corpus_file)
+
 
 # ==============================================================================
 # FUNCTION 1: DOWNLOAD RAW CONTENT
 # ==============================================================================
-def download_corpus(input_file = str, output_file = str, limit_debug: int = None):
+class RetryableAPIError(Exception):
+    """HTTP 429/503 or a maxlag error: the request should be retried after a pause."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class APIRejectedError(ValueError):
+    """An error answer from the API (bad title, too many values...): retrying the same request gives the same answer."""
+
+
+def _is_rejection(error: Exception) -> bool:
+    """4xx (other than 429) and API errors: deterministic, so not worth a retry."""
+    if isinstance(error, requests.exceptions.HTTPError):
+        return error.response is not None and 400 <= error.response.status_code < 500
+    return isinstance(error, APIRejectedError)
+
+
+def _retry_after(response: requests.Response) -> Optional[float]:
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _get_with_retry(
+    session: requests.Session,
+    api_url: str,
+    params: Dict[str, Any],
+    limiter: TokenBucket,
+    max_retries: int,
+    backoff_base: float
+) -> Dict[str, Any]:
+    """
+    One API request, retried with exponential backoff. 429/503/maxlag answers pause
+    every worker through the shared limiter for max(Retry-After, backoff).
+    Re-raises the last error once the retries are used up, and a rejection (4xx,
+    API error) at once, so the caller can split the batch without waiting.
+    """
+    for attempt in range(max_retries + 1):
+        limiter.acquire()
+        delay = backoff_base * 2 ** attempt
+        try:
+            with metrics.timer("http_request_seconds", api="download"):
+                response = session.get(api_url, params=params, timeout=15)
+            metrics.inc("http_requests_total", api="download", status=response.status_code)
+            if response.status_code in (429, 503):
+                raise RetryableAPIError(f"HTTP {response.status_code}", _retry_after(response))
+            response.raise_for_status()
+            data = response.json()
+
+            error = data.get('error')
+            if error:
+                if error.get('code') == 'maxlag':
+                    raise RetryableAPIError(f"maxlag: {error.get('info')}", _retry_after(response))
+                raise APIRejectedError(f"API error {error.get('code')}: {error.get('info')}")
+            return data
+
+        except RetryableAPIError as e:
+            metrics.inc("http_retries_total", api="download", reason="throttled")
+            if attempt == max_retries:
+                raise
+            limiter.pause(max(e.retry_after or 0, delay))
+        except (requests.exceptions.RequestException, ValueError) as e:
+            if _is_rejection(e):
+                metrics.inc("http_rejections_total", api="download")
+                raise
+            metrics.inc("http_retries_total", api="download", reason="error")
+            if attempt == max_retries:
+                raise
+            time.sleep(delay)
+
+
+def fetch_raw_batch(
+    session: requests.Session,
+    batch_titles: List[str],
+    api_url: str = WIKI_API_URL,
+    maxlag: Optional[int] = None,
+    limiter: Optional[TokenBucket] = None,
+    max_retries: int = 0,
+    backoff_base: float = 1.0,
+    entries: Optional[Dict[str, Dict[str, Any]]] = None
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Fetches the current wikitext of up to 50 titles, following `continue` when the
+    API cuts an oversized response short. Each request is retried on its own, so a
+    failure halfway through the continuations does not restart the batch; pages
+    already received are kept in `entries` even if a later request fails.
+    Returns ({"title", "revid", "raw_content"} entries for the pages that have content,
+    number of continuation requests that were needed).
+    """
+    params = {
+        "action": "query",
+        "prop": "revisions",
+        "titles": "|".join(batch_titles),
+        "rvprop": "ids|content",
+        "format": "json",
+        "rvslots": "main"
+    }
+    if maxlag is not None:
+        params["maxlag"] = maxlag
+    if limiter is None:
+        limiter = TokenBucket(None)
+    if entries is None:
+        entries = {}
+    continuations = 0
+
+    while True:
+        data = _get_with_retry(session, api_url, params, limiter, max_retries, backoff_base)
+        pages = data.get('query', {}).get('pages', {})
+
+        for page_id, page in pages.items():
+            title = page.get('title', 'Unknown')
+
+            # Extract raw wikitext safely
+            raw_text = ""
+            revid = 0
+            revisions = page.get('revisions', [])
+            if revisions:
+                revid = revisions[0].get('revid', 0)
+                slot = revisions[0].get('slots', {}).get('main', {})
+                raw_text = slot.get('*', '')
+                # Fallback for older API structure
+                if not raw_text and '*' in revisions[0]:
+                    raw_text = revisions[0]['*']
+
+            if raw_text and title not in entries:
+                entries[title] = {"title": title, "revid": revid, "raw_content": raw_text}
+
+        if 'continue' not in data:
+            break
+        params = {**params, **data['continue']}
+        continuations += 1
+
+    return list(entries.values()), continuations
+
+
+def download_batch_with_retry(
+    session: requests.Session,
+    batch_titles: List[str],
+    limiter: TokenBucket,
+    api_url: str = WIKI_API_URL,
+    maxlag: Optional[int] = 5,
+    max_retries: int = 4,
+    backoff_base: float = 1.0
+) -> Dict[str, Any]:
+    """
+    Downloads one batch (see fetch_raw_batch for the per-request retries).
+
+    A batch the API rejects outright (4xx, unreadable JSON) is split in half so one
+    bad title cannot sink the other 49. Titles still unfetched after a failure are
+    reported as failed; titles the API answered without content as missing.
+    Returns {"entries", "missing", "failed", "size", "continuations"}.
+    """
+    pending = [batch_titles]
+    entries: Dict[str, Dict[str, Any]] = {}
+    failed: List[Tuple[str, str]] = []
+    continuations = 0
+
+    while pending:
+        titles = pending.pop(0)
+        try:
+            _, n = fetch_raw_batch(
+                session, titles, api_url, maxlag, limiter, max_retries, backoff_base, entries
+            )
+            continuations += n
+        except (RetryableAPIError, requests.exceptions.RequestException, ValueError) as e:
+            # Rejections and unreadable JSON (a ValueError) may come from one bad title
+            splittable = _is_rejection(e) or isinstance(e, ValueError)
+            remaining = [t for t in titles if t not in entries]
+            if splittable and len(remaining) > 1:
+                mid = len(remaining) // 2
+                pending[:0] = [remaining[:mid], remaining[mid:]]
+            else:
+                failed.extend((title, f"{type(e).__name__}: {e}") for title in remaining)
+
+    failed_titles = {title for title, _ in failed}
+    missing = [t for t in batch_titles if t not in entries and t not in failed_titles]
+    return {
+        "entries": list(entries.values()),
+        "missing": missing,
+        "failed": failed,
+        "size": len(batch_titles),
+        "continuations": continuations
+    }
+
+
+def download_batches(
+    titles: List[str],
+    api_url: str = WIKI_API_URL,
+    max_workers: int = 4,
+    max_batch_size: int = 50,
+    min_batch_size: int = 5,
+    requests_per_second: Optional[float] = 20.0,
+    maxlag: Optional[int] = 5,
+    max_retries: int = 4,
+    backoff_base: float = 1.0
+) -> Iterator[Dict[str, Any]]:
+    """
+    Keeps up to 2 * max_workers batch requests in flight over one pooled session
+    and yields each batch result in submission order, so the caller is the single
+    writer and the output order is deterministic.
+
+    Batches are cut lazily: when responses need continuation (too much content for
+    one response) the batch size halves, and it grows back by 5 while they don't.
+    """
+    session = requests.Session()
+    session.headers.update({'User-Agent': USER_AGENT})
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    limiter = TokenBucket(requests_per_second)
+    batch_size = max_batch_size
+    position = 0
+    window: Deque[Future] = deque()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while position < len(titles) or window:
+            while position < len(titles) and len(window) < 2 * max_workers:
+                batch_titles = titles[position:position + batch_size]
+                position += len(batch_titles)
+                window.append(executor.submit(
+                    download_batch_with_retry, session, batch_titles, limiter,
+                    api_url, maxlag, max_retries, backoff_base
+                ))
+
+            metrics.set_gauge("download_batches_in_flight", len(window))
+            result = window.popleft().result()
+            if result["continuations"]:
+                batch_size = max(min_batch_size, batch_size // 2)
+            else:
+                batch_size = min(max_batch_size, batch_size + 5)
+            yield result
+
+
+def write_missing_report(missing: List[str], failed: List[Tuple[str, str]], report_file: str) -> None:
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            "missing": missing,
+            "failed": [{"title": title, "error": error} for title, error in failed]
+        }, f, ensure_ascii=False, indent=2)
+
+    print(f"{len(missing)} titles returned no content, {len(failed)} failed after retries.")
+    for title in missing[:10]:
+        print(f"  missing: {title}")
+    for title, error in failed[:10]:
+        print(f"  failed:  {title} ({error})")
+    if missing or failed:
+        print(f"Full list in {report_file}")
+
+
+def stream_corpus(
+    input_file = str,
+    output_file: Optional[str] = None,
+    limit_debug: int = None,
+    incremental: bool = False,
+    manifest_file: str = MANIFEST_FILE,
+    delta_file: str = DELTA_FILE,
+    api_url: str = WIKI_API_URL,
+    max_workers: int = 4,
+    requests_per_second: Optional[float] = 20.0,
+    report_file: str = MISSING_FILE,
+    dump_file: Optional[str] = None,
+    dump_index_file: Optional[str] = None
+) -> Iterator[Dict[str, Any]]:
     """
-    Downloads raw Wikitext for 'KEPT' articles and saves them line-by-line as JSON.
-    This preserves the exact raw state from Wikipedia for later processing.
+    Downloads raw Wikitext for 'KEPT' articles and yields them as
+    {"title", "revid", "raw_content"} entries, in index order. When `output_file` is
+    set they are also saved line-by-line as JSON, preserving the exact raw state from
+    Wikipedia for later processing.
+
+    Every run records the downloaded revids in `manifest_file`.
+    With incremental=True only articles that are new, or whose index revid is newer
+    than the manifest's, are fetched. They are written to the delta corpus
+    (e.g. rag_corpus_raw.delta.jsonl) and merged into `output_file`; articles that
+    left the index are tombstoned. The added/changed/removed titles are written to
+    `delta_file` for the clean, chunk and ingest stages.
+
+    Up to 2 * max_workers batches are in flight at once (see download_batches).
+    Titles that come back empty or fail after retries are listed in `report_file`.
+
+    With dump_file (a local pages-articles-multistream.xml.bz2) and dump_index_file
+    (its -index.txt.bz2) the articles are read from the dump instead of the live API;
+    the streams holding KEPT titles are decompressed in parallel on max_workers cores.
+
+    The manifest, missing report and delta summary are written once the generator is
+    exhausted. Incremental mode needs `output_file`, since the delta is merged into it.
     """
+    if incremental and not output_file:
+        raise ValueError("incremental=True needs an output_file to merge the delta into.")
     INPUT_CSV = input_file
     RAW_CORPUS_FILE = output_file
     try:
+        import pandas as pd  # only needed here, and slow to import
         df = pd.read_csv(INPUT_CSV)
         if 'keep' not in df.columns:
             raise ValueError(f"Column 'keep' missing in {INPUT_CSV}.")
@@ -30,7 +402,22 @@ def download_corpus(input_file = str, output_file = str, limit_debug: int = None
         print(f"Error loading CSV: {e}")
         return
 
-    titles_to_fetch = df[df['keep'] == 'KEPT']['title'].tolist()
+    kept = df[df['keep'] == 'KEPT'].drop_duplicates(subset='title')
+    index = dict(zip(kept['title'].tolist(), kept['revid'].astype(int).tolist()))
+
+    if incremental:
+        manifest = load_manifest(manifest_file)
+        delta = compute_delta(index, manifest)
+        titles_to_fetch = delta["added"] + delta["changed"]
+        target_file = delta_path(RAW_CORPUS_FILE)
+        print(
+            f"Incremental refresh: {len(delta['added'])} new, {len(delta['changed'])} changed, "
+            f"{len(delta['removed'])} removed."
+        )
+    else:
+        manifest = {"articles": {}, "tombstones": load_manifest(manifest_file)["tombstones"]}
+        titles_to_fetch = list(index)
+        target_file = RAW_CORPUS_FILE
     
     if limit_debug:
         titles_to_fetch = titles_to_fetch[:limit_debug]
@@ -38,58 +425,63 @@ def download_corpus(input_file = str, output_file = str, limit_debug: int = None
 
     print(f"Downloading {len(titles_to_fetch)} articles...")
 
-    session = requests.Session()
-    session.headers.update({'User-Agent': USER_AGENT})
+    fetched: Set[str] = set()
+    missing: List[str] = []
+    failed: List[Tuple[str, str]] = []
     
-    # Check if file exists to resume? (Simple version: overwrite)
-    # We open in 'a' (append) mode if you wanted to resume, but 'w' for fresh start
-    with open(RAW_CORPUS_FILE, 'w', encoding='utf-8') as f:
-        
-        batch_size = 50
-        for i in tqdm(range(0, len(titles_to_fetch), batch_size), desc="Downloading Batches"):
-            batch_titles = titles_to_fetch[i:i + batch_size]
-            title_string = "|".join(batch_titles)
-
-            params = {
-                "action": "query",
-                "prop": "revisions",
-                "titles": title_string,
-                "rvprop": "content",
-                "format": "json",
-                "rvslots": "main"
-            }
+    with (open(target_file, 'w', encoding='utf-8') if target_file else open(os.devnull, 'w')) as f, \
+         tqdm(total=len(titles_to_fetch), desc="Downloading", unit="article") as pbar:
 
-            try:
-                response = session.get(WIKI_API_URL, params=params, timeout=15)
-                response.raise_for_status()
-                data = response.json()
-                
-                pages = data.get('query', {}).get('pages', {})
-                
-                for page_id, page in pages.items():
-                    title = page.get('title', 'Unknown')
-                    
-                    # Extract raw wikitext safely
-                    raw_text = ""
-                    revisions = page.get('revisions', [])
-                    if revisions:
-                        slot = revisions[0].get('slots', {}).get('main', {})
-                        raw_text = slot.get('*', '')
-                        # Fallback for older API structure
-                        if not raw_text and '*' in revisions[0]:
-                            raw_text = revisions[0]['*']
-                    
-                    # Save RAW entry as JSON line
-                    if raw_text:
-                        entry = {"title": title, "raw_content": raw_text}
-                        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
-
-            except Exception as e:
-                print(f"Batch Error: {e}")
-            
-            time.sleep(0.1) # Rate limit
-
-    print(f"Raw corpus saved to {RAW_CORPUS_FILE}")
+        if dump_file:
+            batches = read_dump_batches(titles_to_fetch, dump_file, dump_index_file, max_workers)
+        else:
+            batches = download_batches(
+                titles_to_fetch,
+                api_url=api_url,
+                max_workers=max_workers,
+                requests_per_second=requests_per_second
+            )
+
+        for result in batches:
+            for entry in result["entries"]:
+                # Save RAW entry as JSON line
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                manifest["articles"][entry["title"]] = entry["revid"]
+                manifest["tombstones"].pop(entry["title"], None)
+                fetched.add(entry["title"])
+                yield entry
+            metrics.inc("download_articles_total", len(result["entries"]))
+            metrics.inc("download_bytes_total", sum(_raw_bytes(e) for e in result["entries"]))
+            missing.extend(result["missing"])
+            failed.extend(result["failed"])
+            pbar.update(result["size"])
+
+    write_missing_report(missing, failed, report_file)
+
+    if incremental:
+        for title in delta["removed"]:
+            manifest["tombstones"][title] = manifest["articles"].pop(title)
+        merge_raw_corpus(RAW_CORPUS_FILE, target_file, fetched | set(delta["removed"]))
+        with open(delta_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                "added": [t for t in delta["added"] if t in fetched],
+                "changed": [t for t in delta["changed"] if t in fetched],
+                "removed": delta["removed"],
+                "raw_file": target_file
+            }, f, ensure_ascii=False)
+        print(f"Delta ({len(fetched)} articles) saved to {target_file}, summary in {delta_file}")
+
+    save_manifest(manifest, manifest_file)
+    if RAW_CORPUS_FILE:
+        print(f"Raw corpus saved to {RAW_CORPUS_FILE}")
+
+
+def download_corpus(input_file = str, output_file = str, **options):
+    """
+    Downloads raw Wikitext for 'KEPT' articles into `output_file` (JSONL).
+    Takes the same options as stream_corpus. Returns the number of articles downloaded.
+    """
+    return sum(1 for _ in stream_corpus(input_file, output_file, **options))
 
 
 # ==============================================================================
@@ -98,6 +490,7 @@ def download_corpus(input_file = str, output_file = str, limit_debug: int = None
 def clean_wikitext_logic(text: str) -> str:
     """
     Refined cleaning logic to handle tables, graphs, HTML entities, and messy links.
+    Kept as the reference implementation for clean_wikitext (see benchmarks.compare_cleaners).
     """
     
     # 0. Strip the entire REFERENCES/SOURCES/EXTERNAL LINKS sections
@@ -162,36 +555,287 @@ def clean_wikitext_logic(text: str) -> str:
     
     return text.strip()
 
-def process_corpus(input_file = str, output_file = str):
-    
-    if not os.path.exists(input_file):
-        return
+# ==============================================================================
+# FUNCTION 2b: SINGLE-PASS CLEANER
+# ==============================================================================
+_TRAILING_SECTIONS_RE = re.compile(
+    r'\n=+\s*(References|Citations|Sources|External links|See also|Notes|Further reading|Bibliography)\s*=+\n',
+    re.IGNORECASE
+)
+
+# Comments, refs and template/table delimiters, scanned up front: comments and
+# <ref>...</ref> bodies are masked, and the delimiters outside them are paired, so the
+# main scan can jump over a whole comment, ref, {{...}} or {|...|} instead of
+# tokenizing its insides. Tag patterns stop at the next '<', which keeps every
+# scan linear on unclosed markup.
+_PREPASS_RE = re.compile(r'<!--|<[rR][eE][fF]\b[^<>]*>|</[rR][eE][fF]\s*>|\{\{|\}\}|\{\||\|\}(?!\})')
+
+# One alternation for the structural markup. The leading lookahead lets the regex
+# engine skip plain prose quickly; text between two tokens is copied as-is.
+_WIKITEXT_TOKEN_RE = re.compile(r"""
+  (?=[<{\[\]])
+  (?:
+    (?P<masked><!--|<[rR][eE][fF]\b[^<>]*>)
+  | (?P<tag></?[A-Za-z][^<>]*>)
+  | (?P<block_open>\{\{|\{\|)
+  | (?P<simple_link>\[\[(?:[^\[\]|]*\|)?(?P<label>[^\[\]]+)\]\])
+  | (?P<link_open>\[\[)
+  | (?P<link_close>\]\])
+  | (?P<external_link>\[https?://[^\]\n]*\])
+  )
+""", re.VERBOSE)
+
+# Line-level and inline leftovers need no structure, so they are removed from the
+# output with linear substitutions rather than making the scan stop on every line.
+# Each pattern starts with a literal ("\n", "http", "''"), which the regex engine
+# finds with a fast string search instead of trying every position; the text gets a
+# leading "\n" so its first line is matched too.
+_LINE_NOISE_RE = re.compile(r"""
+  \n(?:[ \t]*(?:ImageSize|PlotArea|Period|TimeAxis|ScaleMajor|ScaleMinor|PlotData
+               |DateFormat|Define|Legend|BarData|Colors)[^\n]*
+     | File:[^\n]*
+     | \*+)
+""", re.VERBOSE)
+_HEADING_RE = re.compile(r'\n=+[ \t]*([^=\n][^\n]*?)=+[ \t]*(?=\n|\Z)')
+_URL_RE = re.compile(r"https?://[^\s|\[\]{}<>]+")
+_QUOTES_RE = re.compile(r"''+")
+_BLANK_LINES_RE = re.compile(r'\n\n\n+')
+
+_DROPPED_TOKENS = {"tag", "external_link"}
+
 
-    print("Processing and cleaning raw corpus (Streaming Mode)...")
+def _scan_markup(text: str) -> Tuple[Dict[int, int], Dict[int, int]]:
+    """
+    Maps the offset of every comment and ref (with its body) to the offset just past
+    it, and the offset of every balanced '{{' / '{|' outside them to the offset just
+    past its closer. An unclosed comment runs to the end of the text; a <ref> opened
+    again or never closed is not masked, and the braces of its text are paired.
+    """
+    masked: Dict[int, int] = {}
+    pairs: Dict[int, int] = {}
+    stack: List[Tuple[str, int]] = []
+    ref_open: Optional[int] = None
+    ref_braces: List[Tuple[str, int, int]] = []
+
+    def pair(token: str, start: int, end: int) -> None:
+        if token[0] == '{':
+            stack.append((token, start))
+            return
+        opener = '{{' if token == '}}' else '{|'
+        depth = len(stack) - 1
+        while depth >= 0 and stack[depth][0] != opener:
+            depth -= 1
+        if depth >= 0:
+            pairs[stack[depth][1]] = end
+            del stack[depth:]
+
+    def unmask_ref() -> None:
+        for brace in ref_braces:
+            pair(*brace)
+        ref_braces.clear()
+
+    push = stack.append
+    skip_to = 0  # end of the last comment: tokens inside it are ignored
+    for m in _PREPASS_RE.finditer(text):
+        start = m.start()
+        if start < skip_to:
+            continue
+        token = m.group()
+        if ref_open is not None and token[0] != '<':
+            ref_braces.append((token, start, m.end()))
+        elif token[0] == '{':
+            push((token, start))
+        elif token[0] != '<':
+            pair(token, start, m.end())
+        elif token == '<!--':
+            close = text.find('-->', start + 4)
+            skip_to = masked[start] = len(text) if close < 0 else close + 3
+        elif token[1] == '/':
+            if ref_open is not None:
+                masked[ref_open] = m.end()
+                ref_open = None
+                ref_braces.clear()
+        elif token.endswith('/>'):
+            masked[start] = m.end()
+        else:
+            unmask_ref()
+            ref_open = start
+    unmask_ref()
+    return masked, pairs
+
+
+def clean_wikitext(text: str) -> str:
+    """
+    Linear-time replacement for clean_wikitext_logic.
 
-    # Open both files simultaneously for streaming
-    with open(input_file, 'r', encoding='utf-8') as fin, \
-         open(output_file, 'w', encoding='utf-8') as fout:
-        
-        # Iterate over file object directly (lazy loading)
-        for line in tqdm(fin, desc="Cleaning"):
+    Comments and refs are masked and templates and tables paired in one scan of their
+    delimiters (see _scan_markup), and all of them are dropped whole, nesting
+    included. Links, file blocks and tags come from a single tokenizing regex walked
+    once over the article. Plain links are one token;
+    links with links inside (file captions) push a marker on a stack when they open
+    and closing one keeps only its label (or nothing, for File/Image/Category links).
+    Openers that never close stay as literal text, as they did with the cascade.
+    Headings, bullets, timeline and File: lines, bold/italic quotes and bare URLs
+    are then stripped from the output by linear substitutions.
+
+    Deliberate differences from clean_wikitext_logic: HTML comments and <ref> bodies
+    are removed (braces inside them do not open or close templates), headings are
+    only rewritten on heading lines, and bare URLs stop at wiki markup characters.
+    """
+    trailing = _TRAILING_SECTIONS_RE.search(text)
+    if trailing:
+        text = text[:trailing.start()] + '\n'
+
+    masked, blocks = _scan_markup(text)
+    out: List[str] = []
+    append = out.append
+    links: List[int] = []
+    pos = 0
+    search = _WIKITEXT_TOKEN_RE.search
+
+    while True:
+        m = search(text, pos)
+        if m is None:
+            break
+        start, end = m.span()
+        if start > pos:
+            append(text[pos:start])
+        pos = end
+        kind = m.lastgroup
+
+        if kind in _DROPPED_TOKENS:
+            continue
+        elif kind == "masked":
+            # An unmasked <ref> (never closed) only loses its tag
+            pos = masked.get(start, end)
+        elif kind == "block_open":
+            block_end = blocks.get(start)
+            if block_end is not None:
+                pos = block_end
+            else:
+                append(m.group())
+        elif kind == "simple_link":
+            target = m.group()[2:12].lower()
+            if not target.startswith(("file:", "image:", "category:")):
+                append(m.group("label"))
+        elif kind == "link_open":
+            links.append(len(out))
+            append("[[")
+        elif not links:
+            append("]]")
+        else:
+            mark = links.pop()
+            inner = "".join(out[mark + 1:])
+            del out[mark:]
+            if not inner.lower().startswith(("file:", "image:")) and not inner.startswith("Category:"):
+                append(inner.split("|", 1)[1] if "|" in inner else inner)
+
+    append(text[pos:])
+    text = _LINE_NOISE_RE.sub('\n', "\n" + "".join(out))
+    text = _HEADING_RE.sub('\n\\1', text)
+    text = _URL_RE.sub('', text)
+    text = _QUOTES_RE.sub('', text)
+    text = html.unescape(text)
+    text = _BLANK_LINES_RE.sub('\n\n', text)
+    return text.strip()
+
+
+def iter_raw_corpus(input_file: str) -> Iterator[Dict[str, Any]]:
+    """Yields the entries of a raw JSONL corpus, skipping malformed lines."""
+    with open(input_file, 'r', encoding='utf-8') as fin:
+        for line in fin:
             try:
-                data = json.loads(line)
-                cleaned_text = clean_wikitext_logic(data['raw_content'])
-                
-                if len(cleaned_text) < 50: 
-                    continue
-
-                entry = (
-                    f"--- DOC START ---\n"
-                    f"TITLE: {data['title']}\n"
-                    f"CONTENT:\n"
-                    f"{cleaned_text}\n"
-                )
-                
-                fout.write(entry + "\n")
-                
+                yield json.loads(line)
             except json.JSONDecodeError:
                 continue
 
+
+def clean_article(article: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Turns a raw entry into a {"title", "revid", "text"} record, or None if too short."""
+    cleaned_text = clean_wikitext(article['raw_content'])
+
+    if len(cleaned_text) < 50:
+        return None
+
+    return {"title": article['title'], "revid": article.get('revid'), "text": cleaned_text}
+
+
+def format_clean_entry(record: Dict[str, Any]) -> str:
+    """Serializes a cleaned record as a DOC START block of the clean text corpus."""
+    entry = (
+        f"--- DOC START ---\n"
+        f"TITLE: {record['title']}\n"
+        f"CONTENT:\n"
+        f"{record['text']}\n"
+    )
+    return entry + "\n"
+
+
+def _raw_bytes(article: Dict[str, Any]) -> int:
+    return len(article['raw_content'].encode('utf-8'))
+
+
+def clean_articles(
+    articles: Iterable[Dict[str, Any]],
+    workers: int = 1,
+    chunk_size: int = 32,
+    max_pending_chunks: Optional[int] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yields a {"title", "revid", "text"} record per raw article that survives cleaning,
+    in input order.
+
+    With workers > 1 the articles are cleaned in a process pool, `chunk_size` per
+    task, with at most `max_pending_chunks` tasks in flight (see ordered_pool_map).
+    """
+    if workers <= 1:
+        for article in tqdm(articles, desc="Cleaning", unit="article"):
+            record = clean_article(article)
+            metrics.inc("clean_docs_total")
+            metrics.inc("clean_bytes_total", _raw_bytes(article))
+            if record is not None:
+                yield record
+        return
+
+    stats = WorkerStats("MB", scale=1e6)
+    task = partial(timed_task, clean_article, _raw_bytes)
+    with tqdm(desc="Cleaning", unit="article") as pbar:
+        for n_articles, (records, pid, seconds, raw_bytes) in ordered_pool_map(
+            task, articles, workers, chunk_size, max_pending_chunks
+        ):
+            stats.add(pid, seconds, raw_bytes)
+            metrics.inc("clean_docs_total", n_articles)
+            metrics.inc("clean_bytes_total", raw_bytes)
+            pbar.update(n_articles)
+            yield from (record for record in records if record is not None)
+    stats.report("Cleaned")
+
+
+def write_clean_corpus(records: Iterable[Dict[str, Any]], output_file: str) -> Iterator[Dict[str, Any]]:
+    """Passes records through unchanged while writing them to the clean text corpus."""
+    with open(output_file, 'w', encoding='utf-8') as fout:
+        for record in records:
+            fout.write(format_clean_entry(record))
+            yield record
     print(f"Cleaned corpus saved to {output_file}")
+
+
+def process_corpus(
+    input_file = str,
+    output_file = str,
+    workers: int = 1,
+    chunk_size: int = 32,
+    max_pending_chunks: Optional[int] = None
+):
+    """
+    Cleans the raw JSONL corpus into the DOC START text format and returns the number
+    of articles written. With workers > 1 cleaning runs on a process pool (see
+    clean_articles); the output is byte-identical to the serial path.
+    """
+    if not os.path.exists(input_file):
+        return 0
+
+    print(f"Processing and cleaning raw corpus (Streaming Mode, {workers} worker(s))...")
+
+    records = clean_articles(iter_raw_corpus(input_file), workers, chunk_size, max_pending_chunks)
+    return sum(1 for _ in write_clean_corpus(records, output_file))
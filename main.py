@@ -3,27 +3,69 @@
 #from frontend.callbacks import register_callbacks
 #from backend.slave_gpt import generate_geopolitical_summary
 #from backend.data import df_countries
-from backend.input_handler import update_corpus
+import argparse
+import os
+
+from backend.metrics import PROFILE_STAGES_ENV, PROFILER_ENV
+from backend.stages import DEFAULT_OPTIONS, STAGE_NAMES, print_status, run_stages, select_stages
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Builds the RAG knowledge base. Stages whose inputs did not change since their last run are skipped.",
+        epilog=f"stages, in order: {' -> '.join(STAGE_NAMES)}"
+    )
+    parser.add_argument("stages", nargs="*", metavar="STAGE", help="run only these stages (default: all)")
+    parser.add_argument("--from", dest="first", metavar="STAGE", help="first stage of the range to run")
+    parser.add_argument("--to", dest="last", metavar="STAGE", help="last stage of the range to run")
+    parser.add_argument("--force", action="store_true", help="run the selected stages even when up to date")
+    parser.add_argument("--dry-run", action="store_true", help="only print which stages would run")
+    parser.add_argument("--status", action="store_true", help="print the last run of every stage and exit")
+    parser.add_argument("--refresh", action="store_true",
+                        help="incremental update: download, chunk and ingest only the changed articles "
+                             "(with --workers, --backend, --store and --profile)")
+    parser.add_argument("--profile-stage", metavar="STAGE", action="append",
+                        help="profile this stage (repeatable, 'all' for every stage) into ./metrics")
+    parser.add_argument("--profiler", choices=("cprofile", "py-spy"), default="cprofile")
+    parser.add_argument("--workers", type=int, default=DEFAULT_OPTIONS["workers"])
+    parser.add_argument("--backend", default=DEFAULT_OPTIONS["backend"], help="embedding backend: local, pool or onnx")
+    parser.add_argument("--store", default=DEFAULT_OPTIONS["store"], help="vector store: qdrant or faiss")
+    parser.add_argument("--profile", default=DEFAULT_OPTIONS["profile"], help="Qdrant collection profile")
+    parser.add_argument("--gate-latency", action="store_true",
+                        help="fail the test stage on latency regressions too (default: only on quality)")
+    args = parser.parse_args(argv)
+    if args.refresh:
+        # The refresh runs its own download -> ingest pass, not a selection of stages
+        ignored = [flag for flag, value in (("STAGE", args.stages), ("--from", args.first), ("--to", args.last),
+                                            ("--force", args.force), ("--dry-run", args.dry_run),
+                                            ("--status", args.status), ("--gate-latency", args.gate_latency)) if value]
+        if ignored:
+            parser.error(f"--refresh cannot be combined with {', '.join(ignored)}")
+    return args
+
 
 if __name__ == "__main__":
-    print("Select mode : \n1) Update RAG database\n2) Update GPT generated prompts\n3) Launch App")
-    option = input()
-    if option == '1':
-        print("Webscaping and storing info into the RAG database")
-        update_corpus()
-        #df_countries.loc[df_countries['country'] =='Algeria'] = 
-        #print(generate_geopolitical_summary(country="Algeria"))
-        #print(df_countries['Algeria'])
-        #print("fetch1")
-        #pages_content = fetch_wikipedia_pages("Algeria")
-        #print("Add2")
-        #add_country_to_db(pages_content)
-#    elif option =='2':
-#        print("Updating GPT Generated prompts")
-#    else:
-#        app = Dash(__name__)
-#        app.title = "Interactive World Map"
-#        app.layout = layout
-    
-#        register_callbacks(app)
-#        app.run(debug=False)
+    args = parse_args()
+    if args.profile_stage:
+        os.environ[PROFILE_STAGES_ENV] = ",".join(args.profile_stage)
+        os.environ[PROFILER_ENV] = args.profiler
+    options = dict(workers=args.workers, backend=args.backend, store=args.store, profile=args.profile,
+                   gate_latency=args.gate_latency)
+    if args.status:
+        print_status(**options)
+    elif args.refresh:
+        from backend.input_handler import refresh_corpus
+        refresh_corpus(**options)
+    else:
+        try:
+            select_stages(args.first, args.last, args.stages)
+        except ValueError as e:
+            raise SystemExit(f"error: {e}")
+        run_stages(args.first, args.last, args.stages, args.force, args.dry_run, **options)
+
+    # Launch App
+    #app = Dash(__name__)
+    #app.title = "Interactive World Map"
+    #app.layout = layout
+    #register_callbacks(app)
+    #app.run(debug=False)
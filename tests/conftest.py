@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests run from the repository root (python -m pytest) and import the backend package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,84 @@
+import re
+
+import pytest
+
+from backend import chunk_handler
+from backend.chunk_handler import LANGCHAIN_SEPARATORS, ChunkDeduplicator, TokenWindowChunker, chunk_records
+
+TEXTS = [
+    "Short text.",
+    "First paragraph with some words.\n\nSecond one, longer, with more words in it.\nAnd a last line.",
+    "one two three four five six seven eight nine ten eleven twelve thirteen fourteen fifteen sixteen",
+    "Line one\nLine two is a bit longer than one\nLine three\n\nNew paragraph here, with words.\n\n\nTriple break.",
+]
+
+
+class FakeEncoding:
+    """Stands for tiktoken's (downloaded on first use): a token is a space plus up to 4 characters, or one whitespace."""
+
+    TOKEN = re.compile(r" ?[^\s]{1,4}|\s", re.S)
+
+    def encode(self, text, **kwargs):
+        return [t.encode('utf-8') for t in self.TOKEN.findall(text)]
+
+    def decode_tokens_bytes(self, tokens):
+        return tokens
+
+
+@pytest.fixture
+def fake_encoding(monkeypatch):
+    import tiktoken
+    encoding = FakeEncoding()
+    monkeypatch.setattr(tiktoken, "encoding_for_model", lambda model_name: encoding)
+    return encoding
+
+
+def langchain_splitter(chunk_size, chunk_overlap):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        model_name="gpt-4o", chunk_size=chunk_size, chunk_overlap=chunk_overlap
+    )
+
+
+@pytest.mark.parametrize("chunk_size, chunk_overlap", [(8, 2), (12, 3), (20, 5)])
+def test_same_chunks_as_langchain(fake_encoding, chunk_size, chunk_overlap):
+    pytest.importorskip("langchain_text_splitters")
+    ours = TokenWindowChunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap, separators=LANGCHAIN_SEPARATORS)
+    reference = langchain_splitter(chunk_size, chunk_overlap)
+    for text in TEXTS:
+        assert ours.split_text(text) == reference.split_text(text)
+
+
+def test_over_long_words_are_cut_between_tokens(fake_encoding):
+    pytest.importorskip("langchain_text_splitters")
+    text = "A supercalifragilisticexpialidocious word and antidisestablishmentarianism too."
+    ours = TokenWindowChunker(chunk_size=8, chunk_overlap=2, separators=LANGCHAIN_SEPARATORS).split_text(text)
+    reference = langchain_splitter(8, 2).split_text(text)
+    # LangChain cuts an over-long word into characters; ours cuts it between tokens,
+    # so only the chunks around the long word agree
+    assert ours[0] == reference[0] == "A"
+    assert ours[-3:] == reference[-3:]
+    long_word = ours[1:-3]
+    assert long_word[0].startswith("supercal") and long_word[-1].endswith("docious")
+    assert all(len(fake_encoding.encode(chunk)) <= 8 for chunk in ours)
+
+
+def test_split_counts_match_the_encoding(fake_encoding):
+    chunker = TokenWindowChunker(chunk_size=12, chunk_overlap=3)
+    text = "First paragraph with some words.\n\nSecond one, longer, with more words in it.\nAnd a last line."
+    pairs = chunker.split_counted(text)
+    assert [chunk for chunk, _ in pairs] == chunker.split_text(text)
+    assert len(pairs) > 1
+    assert all(tokens == len(fake_encoding.encode(chunk)) for chunk, tokens in pairs)
+
+
+def test_chunk_records_takes_the_splitter_counts(fake_encoding, monkeypatch):
+    monkeypatch.setattr(chunk_handler, "make_splitter", lambda kind: TokenWindowChunker(chunk_size=12, chunk_overlap=3))
+    records = [{"title": "A", "revid": 1, "text": "Some words for a first chunk.\n\nAnd some for a second one."}]
+
+    def no_counting(text):
+        raise AssertionError("chunk tokens were counted again")
+
+    chunks = list(chunk_records(records, ChunkDeduplicator(count_tokens=no_counting)))
+    assert chunks
+    assert all(c["metadata"]["tokens"] == len(fake_encoding.encode(c["text"])) for c in chunks)
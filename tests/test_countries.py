@@ -0,0 +1,25 @@
+import pytest
+
+from backend.countries import pair_key, parse_pair
+
+
+@pytest.mark.parametrize("pair, expected", [
+    ("DZ-FR", "DZ-FR"),
+    ("FR-DZ", "DZ-FR"),
+    ("France–Algeria", "DZ-FR"),
+    ("Algeria–France relations", "DZ-FR"),
+    (("France", "DZ"), "DZ-FR"),
+    ("Guinea-Bissau-France", "FR-GW"),
+    ("Timor-Leste-FR", "FR-TL"),
+    ("Guinea-Bissau-Timor-Leste", "GW-TL"),
+    ("Guinea-Bissau–Portugal", "GW-PT"),
+    ("FR", None),
+    ("Foo-Bar", None),
+])
+def test_parse_pair(pair, expected):
+    assert parse_pair(pair) == expected
+
+
+def test_pair_key_needs_two_codes():
+    assert pair_key(["FR", "DZ", "FR"]) == "DZ-FR"
+    assert pair_key(["FR"]) is None
@@ -0,0 +1,80 @@
+import pytest
+import requests
+
+from backend.crawl_checkpoint import CrawlCheckpoint
+from backend.create_wikipedia_index import collect_category_titles
+from backend.mock_mediawiki import MockMediaWikiServer, build_synthetic_wiki
+
+USER_AGENT = "Geopolitical-Map-Test/1.0"
+MAX_DEPTH = 2
+
+
+class Interrupted(BaseException):
+    """Stands for a Ctrl+C halfway through the crawl."""
+
+
+@pytest.fixture(scope="module")
+def server():
+    with MockMediaWikiServer(build_synthetic_wiki(n_countries=8, pages_per_category=12), latency=0, page_size=5) as s:
+        yield s
+
+
+def crawl(server, checkpoint, workers=1):
+    return collect_category_titles(server.wiki["root"], MAX_DEPTH, USER_AGENT, max_workers=workers,
+                                   requests_per_second=None, api_url=server.url, checkpoint=checkpoint)
+
+
+def interrupt_after(monkeypatch, requests_allowed):
+    get = requests.Session.get
+    calls = []
+
+    def counted_get(self, *args, **kwargs):
+        if len(calls) >= requests_allowed:
+            raise Interrupted()
+        calls.append(kwargs.get("params", {}).get("gcmtitle"))
+        return get(self, *args, **kwargs)
+
+    monkeypatch.setattr(requests.Session, "get", counted_get)
+    return calls
+
+
+@pytest.mark.parametrize("requests_allowed", [1, 7, 15])
+def test_resume_gives_the_same_rows_in_the_same_order(server, tmp_path, monkeypatch, requests_allowed):
+    expected = crawl(server, None)
+    path = str(tmp_path / "crawl.sqlite")
+
+    calls = interrupt_after(monkeypatch, requests_allowed)
+    checkpoint = CrawlCheckpoint(path, server.wiki["root"], MAX_DEPTH)
+    with pytest.raises(Interrupted):
+        crawl(server, checkpoint)
+    frontier = checkpoint.frontier()
+    resume_points = {name: checkpoint.resume_point(name) for name in frontier[1]}
+    checkpoint.close()
+    monkeypatch.undo()
+
+    resumed = CrawlCheckpoint(path, server.wiki["root"], MAX_DEPTH)
+    assert resumed.frontier() == frontier
+    assert {name: resumed.resume_point(name) for name in frontier[1]} == resume_points
+
+    calls_after = interrupt_after(monkeypatch, 10 ** 6)
+    assert crawl(server, resumed, workers=4) == expected
+    resumed.close()
+    monkeypatch.undo()
+    # Nothing stored before the interruption is fetched again
+    full = interrupt_after(monkeypatch, 10 ** 6)
+    crawl(server, CrawlCheckpoint(":memory:", server.wiki["root"], MAX_DEPTH))
+    assert len(calls) < len(full)
+    assert len(calls_after) == len(full) - len(calls)
+
+
+def test_checkpoint_for_another_crawl_starts_fresh(server, tmp_path):
+    path = str(tmp_path / "crawl.sqlite")
+    checkpoint = CrawlCheckpoint(path, server.wiki["root"], MAX_DEPTH)
+    crawl(server, checkpoint)
+    assert checkpoint.frontier() == (0, [])
+    checkpoint.close()
+
+    other = CrawlCheckpoint(path, server.wiki["root"], MAX_DEPTH + 1)
+    assert other.frontier() == (0, [server.wiki["root"]])
+    assert other.members() == {server.wiki["root"]: {"pages": [], "complete": False}}
+    other.close()
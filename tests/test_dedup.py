@@ -0,0 +1,46 @@
+from backend.chunk_handler import ChunkDeduplicator, HashStore, NearDuplicateFilter, hash_value
+from backend.qdrant_handler import point_id
+
+TEXT = ("France and Germany signed the Elysee Treaty in 1963, opening an era of "
+        "cooperation between the two countries after decades of conflict in Europe.")
+
+
+def test_near_duplicate_dropped_and_distinct_kept():
+    near = NearDuplicateFilter(threshold=0.7)
+    assert not near.is_duplicate(TEXT)
+    assert near.is_duplicate(TEXT.replace("Europe.", "Western Europe."))
+    assert not near.is_duplicate("Brazil and Argentina agreed on a common market with "
+                                 "Paraguay and Uruguay in the Treaty of Asuncion of 1991.")
+
+
+def test_near_duplicate_check_counts_tokens():
+    dedup = ChunkDeduplicator(near_threshold=0.7, count_tokens=len)
+    edited = TEXT.replace("Europe.", "Western Europe.")
+    assert dedup.check(point_id(TEXT), TEXT) == "kept"
+    assert dedup.check(point_id(edited), edited, tokens=7) == "near_duplicate"
+    assert dedup.stats["near_duplicate"] == [1, 7]
+
+
+def test_hash_store_membership_survives_reopen(tmp_path):
+    path = str(tmp_path / "hashes.u64")
+    store = HashStore(path)
+    store.add(hash_value(point_id("kept")))
+    store.save()
+    store.add(hash_value(point_id("unsaved")))
+
+    reopened = HashStore(path)
+    assert hash_value(point_id("kept")) in reopened
+    assert hash_value(point_id("unsaved")) not in reopened
+    assert len(reopened) == 1
+
+
+def test_check_reports_stored_hashes_as_ingested(tmp_path):
+    path = str(tmp_path / "hashes.u64")
+    store = HashStore(path)
+    store.add(hash_value(point_id(TEXT)))
+    store.save()
+
+    dedup = ChunkDeduplicator(path, count_tokens=len)
+    assert dedup.check(point_id(TEXT), TEXT) == "ingested"
+    assert dedup.check(point_id("a new chunk"), "a new chunk") == "kept"
+    assert dedup.stats["ingested"] == [1, len(TEXT)]
@@ -0,0 +1,110 @@
+import pytest
+import requests
+
+from backend import wikipedia_downloader_cleaner
+from backend.mock_mediawiki import MockMediaWikiServer, build_synthetic_wiki
+from backend.wikipedia_downloader_cleaner import (
+    APIRejectedError,
+    TokenBucket,
+    _get_with_retry,
+    download_batch_with_retry
+)
+
+
+@pytest.fixture(scope="module")
+def wiki():
+    return build_synthetic_wiki(n_countries=4, pages_per_category=3)
+
+
+def download(server, titles, **kwargs):
+    with requests.Session() as session:
+        return download_batch_with_retry(session, titles, TokenBucket(None), api_url=server.url,
+                                         backoff_base=0.01, **kwargs)
+
+
+def expected_entries(wiki, titles):
+    return [{"title": t, "revid": wiki["pages"][t]["revid"], "raw_content": wiki["pages"][t]["content"]}
+            for t in titles]
+
+
+def test_continuation_returns_every_page(wiki):
+    titles = sorted(wiki["pages"])[:10]
+    with MockMediaWikiServer(wiki, latency=0, max_response_chars=1) as server:
+        result = download(server, titles)
+    # Only one page fits per response, so each further page needs a continuation
+    assert result["continuations"] == len(titles) - 1
+    assert result["entries"] == expected_entries(wiki, titles)
+    assert result["missing"] == [] and result["failed"] == []
+
+
+def test_transient_errors_are_retried(wiki):
+    titles = sorted(wiki["pages"])[:10]
+    with MockMediaWikiServer(wiki, latency=0, error_rate=0.5, retry_after=0, max_response_chars=1000) as server:
+        result = download(server, titles, max_retries=20)
+    assert sorted(e["title"] for e in result["entries"]) == titles
+    assert result["failed"] == []
+
+
+def test_exhausted_retries_report_the_batch_failed(wiki):
+    titles = sorted(wiki["pages"])[:4]
+    with MockMediaWikiServer(wiki, latency=0, error_rate=1.0, retry_after=0) as server:
+        result = download(server, titles, max_retries=1)
+    assert result["entries"] == []
+    assert [title for title, _ in result["failed"]] == titles
+    assert result["missing"] == []
+
+
+def test_rejected_batch_is_split_around_the_bad_title(wiki):
+    titles = sorted(wiki["pages"])[:9]
+    bad = titles[4]
+    with MockMediaWikiServer(wiki, latency=0, rejected_titles=[bad]) as server:
+        result = download(server, titles + ["Not a page"])
+    assert result["entries"] == expected_entries(wiki, [t for t in titles if t != bad])
+    assert [title for title, _ in result["failed"]] == [bad]
+    assert "HTTPError" in result["failed"][0][1]
+    assert result["missing"] == ["Not a page"]
+
+
+class CountingSession(requests.Session):
+    def __init__(self):
+        super().__init__()
+        self.requests = 0
+
+    def get(self, *args, **kwargs):
+        self.requests += 1
+        return super().get(*args, **kwargs)
+
+
+def test_rejections_are_split_without_retry_or_sleep(wiki, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(wikipedia_downloader_cleaner.time, "sleep", sleeps.append)
+    monkeypatch.setattr(TokenBucket, "pause", lambda self, seconds: sleeps.append(seconds))
+    titles = sorted(wiki["pages"])[:8]
+    with MockMediaWikiServer(wiki, latency=0, rejected_titles=[titles[0]]) as server, CountingSession() as session:
+        result = download_batch_with_retry(session, titles, TokenBucket(None), api_url=server.url,
+                                           max_retries=4, backoff_base=1.0)
+    assert [title for title, _ in result["failed"]] == [titles[0]]
+    assert not any(sleeps)  # the unthrottled limiter may sleep(0)
+    # 8 -> 4 + 4 -> 2 + 2 -> 1 + 1: one request per batch, none repeated
+    assert session.requests == 7
+
+
+class ErrorResponse:
+    status_code = 200
+    headers = {}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"error": {"code": "toomanyvalues", "info": "Too many values supplied"}}
+
+
+def test_api_error_is_not_retried(monkeypatch):
+    sleeps, calls = [], []
+    monkeypatch.setattr(wikipedia_downloader_cleaner.time, "sleep", sleeps.append)
+    session = requests.Session()
+    monkeypatch.setattr(session, "get", lambda *args, **kwargs: calls.append(1) or ErrorResponse())
+    with pytest.raises(APIRejectedError):
+        _get_with_retry(session, "http://api", {}, TokenBucket(None), max_retries=4, backoff_base=1.0)
+    assert calls == [1] and sleeps == []
@@ -0,0 +1,80 @@
+import csv
+import json
+
+import pytest
+
+pytest.importorskip("pandas")
+
+from backend.mock_mediawiki import MockMediaWikiServer, build_synthetic_wiki
+from backend.wikipedia_downloader_cleaner import stream_corpus
+from backend.wikipedia_dump_reader import read_multistream_index, write_multistream_dump
+
+
+@pytest.fixture(scope="module")
+def wiki():
+    return build_synthetic_wiki(n_countries=6, pages_per_category=3)
+
+
+def write_index(path, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["title", "revid", "keep"])
+        writer.writerows(rows)
+
+
+def test_stream_corpus_from_dump(tmp_path, wiki):
+    titles = sorted(wiki["pages"])
+    in_dump, not_in_dump = titles[:-3], titles[-3:]
+    empty = in_dump[5]
+    pages = [{"title": t, "revid": wiki["pages"][t]["revid"],
+              "raw_content": "" if t == empty else wiki["pages"][t]["content"]} for t in in_dump]
+    dump_file, dump_index = str(tmp_path / "dump.xml.bz2"), str(tmp_path / "index.txt.bz2")
+    write_multistream_dump(pages, dump_file, dump_index, pages_per_stream=4)
+
+    index_file = str(tmp_path / "index.csv")
+    write_index(index_file, [(t, wiki["pages"][t]["revid"], "KEPT") for t in titles]
+                + [("Ignored page", 1, "IGNORED")])
+    rows = list(stream_corpus(
+        index_file, str(tmp_path / "raw.jsonl"), dump_file=dump_file, dump_index_file=dump_index, max_workers=2,
+        manifest_file=str(tmp_path / "manifest.json"), report_file=str(tmp_path / "missing.json")
+    ))
+
+    assert rows == [page for page in pages if page["title"] != empty]
+    assert all(set(row) == {"title", "revid", "raw_content"} for row in rows)
+    with open(tmp_path / "raw.jsonl", encoding='utf-8') as f:
+        assert [json.loads(line) for line in f] == rows
+    with open(tmp_path / "manifest.json", encoding='utf-8') as f:
+        assert json.load(f)["articles"] == {row["title"]: row["revid"] for row in rows}
+    with open(tmp_path / "missing.json", encoding='utf-8') as f:
+        report = json.load(f)
+    assert sorted(report["missing"]) == sorted(not_in_dump + [empty])
+    assert report["failed"] == []
+
+
+def test_multistream_index_blocks(tmp_path, wiki):
+    pages = [{"title": t, "revid": 1, "raw_content": "x"} for t in sorted(wiki["pages"])[:10]]
+    dump_file, dump_index = str(tmp_path / "dump.xml.bz2"), str(tmp_path / "index.txt.bz2")
+    write_multistream_dump(pages, dump_file, dump_index, pages_per_stream=4)
+
+    wanted = [pages[0]["title"], pages[5]["title"], pages[9]["title"], "Not in the dump"]
+    blocks, missing = read_multistream_index(dump_index, wanted)
+    assert [block[2] for block in blocks] == [[wanted[0]], [wanted[1]], [wanted[2]]]
+    assert blocks[-1][1] is None and blocks[0][1] == blocks[1][0]
+    assert missing == ["Not in the dump"]
+
+
+def test_dump_matches_api(tmp_path, wiki):
+    titles = sorted(wiki["pages"])[:12]
+    pages = [{"title": t, "revid": wiki["pages"][t]["revid"], "raw_content": wiki["pages"][t]["content"]}
+             for t in titles]
+    dump_file, dump_index = str(tmp_path / "dump.xml.bz2"), str(tmp_path / "index.txt.bz2")
+    write_multistream_dump(pages, dump_file, dump_index, pages_per_stream=5)
+    index_file = str(tmp_path / "index.csv")
+    write_index(index_file, [(t, wiki["pages"][t]["revid"], "KEPT") for t in titles])
+
+    options = dict(manifest_file=str(tmp_path / "manifest.json"), report_file=str(tmp_path / "missing.json"))
+    from_dump = list(stream_corpus(index_file, dump_file=dump_file, dump_index_file=dump_index, max_workers=2,
+                                   **options))
+    with MockMediaWikiServer(wiki, latency=0) as server:
+        from_api = list(stream_corpus(index_file, api_url=server.url, requests_per_second=None, **options))
+    assert from_dump == from_api == pages
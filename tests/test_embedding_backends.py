@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from backend import embedding_backends
+from backend.embedding_backends import Encoder, PoolEncoder, load_onnx_int8
+
+DIM = 3
+
+
+class FakeModel:
+    """The parts of SentenceTransformer the encoders use; a text's vector is its length."""
+
+    device = "cpu"
+    max_seq_length = 256
+
+    def __init__(self):
+        self.calls = []
+
+    def get_sentence_embedding_dimension(self):
+        return DIM
+
+    def _vectors(self, texts):
+        return np.array([[len(t)] * DIM for t in texts], dtype=np.float32).reshape(-1, DIM)
+
+    def encode(self, texts, batch_size, convert_to_numpy):
+        self.calls.append((len(texts), batch_size))
+        return self._vectors(texts)
+
+    def start_multi_process_pool(self, target_devices):
+        return {"processes": target_devices}
+
+    def encode_multi_process(self, texts, pool, batch_size, chunk_size):
+        self.calls.append((len(texts), batch_size))
+        return self._vectors(texts)
+
+    def stop_multi_process_pool(self, pool):
+        pass
+
+
+TEXTS = ["x" * n for n in (900, 3, 40, 3, 2000, 120, 7)]
+
+
+def test_encoder_buckets_by_length():
+    model = FakeModel()
+    vectors = Encoder(model).encode(TEXTS)
+    assert vectors[:, 0].tolist() == [len(t) for t in TEXTS]
+    assert sum(n for n, _ in model.calls) == len(TEXTS)
+
+
+def test_pool_encoder_sends_everything_in_one_call():
+    model = FakeModel()
+    encoder = PoolEncoder(model, workers=2)
+    vectors = encoder.encode(TEXTS * 50)
+    assert vectors[:, 0].tolist() == [len(t) for t in TEXTS * 50]
+    assert len(model.calls) == 1 and model.calls[0][0] == len(TEXTS) * 50
+    assert encoder.encode([]).shape == (0, DIM)
+    encoder.close()
+
+
+def test_onnx_backend_without_optimum(monkeypatch):
+    monkeypatch.setattr(embedding_backends.importlib.util, "find_spec", lambda name: None)
+    with pytest.raises(ImportError, match=r"optimum\[onnxruntime\]"):
+        load_onnx_int8()
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from backend.embedding_cache import EmbeddingCache, chunk_key
+
+DIM = 4
+
+
+def vectors(*rows):
+    return np.array(rows, dtype=np.float32).reshape(-1, DIM)
+
+
+def test_get_and_put(tmp_path):
+    cache = EmbeddingCache("org/model v1", DIM, str(tmp_path))
+    found, cached = cache.get([1, 2])
+    assert not found.any() and cached.shape == (0, DIM)
+
+    stored = cache.put([1, 2], vectors([0.1] * DIM, [0.2] * DIM))
+    assert stored.dtype == np.float32
+    found, cached = cache.get([2, 3, 1])
+    assert found.tolist() == [True, False, True]
+    # What comes back is the float16 value put() returned, not the float32 input
+    assert np.array_equal(cached, stored[[1, 0]])
+    assert not np.array_equal(cached[0], vectors([0.2] * DIM)[0])
+
+
+def test_rows_survive_a_reload(tmp_path):
+    cache = EmbeddingCache("model", DIM, str(tmp_path))
+    first = cache.put([10, 5], vectors([1, 2, 3, 4], [5, 6, 7, 8]))
+    cache.put([7], vectors([9, 9, 9, 9]))
+
+    reopened = EmbeddingCache("model", DIM, str(tmp_path))
+    assert len(reopened) == 3
+    found, cached = reopened.get([5, 10, 6])
+    assert found.tolist() == [True, True, False]
+    assert np.array_equal(cached, first[[1, 0]])
+    # Rows appended after the load are found as well
+    fresh = reopened.put([6], vectors([0, 1, 0, 1]))
+    assert np.array_equal(reopened.get([6, 7])[1], np.vstack([fresh, vectors([9, 9, 9, 9])]))
+
+
+def test_partial_row_is_dropped_on_load(tmp_path):
+    cache = EmbeddingCache("model", DIM, str(tmp_path))
+    cache.put([1, 2], vectors([1] * DIM, [2] * DIM))
+    with open(cache.vectors_path, 'ab') as f:
+        f.write(np.ones(DIM, dtype='<f2').tobytes()[:5])  # a run that died mid-write
+
+    reopened = EmbeddingCache("model", DIM, str(tmp_path))
+    assert len(reopened) == 2
+    reopened.put([3], vectors([3] * DIM))
+    assert reopened.get([1, 2, 3])[0].all()
+    assert np.array_equal(EmbeddingCache("model", DIM, str(tmp_path)).get([3])[1], vectors([3] * DIM))
+
+
+def test_dimension_mismatch(tmp_path):
+    EmbeddingCache("model", DIM, str(tmp_path))
+    with pytest.raises(ValueError):
+        EmbeddingCache("model", DIM + 1, str(tmp_path))
+
+
+def test_compact_keeps_live_rows_once(tmp_path):
+    cache = EmbeddingCache("model", DIM, str(tmp_path))
+    cache.put([1, 2, 3], vectors([1] * DIM, [2] * DIM, [3] * DIM))
+    cache.put([2], vectors([2] * DIM))
+
+    assert cache.compact([3, 2, 99]) == (2, 2)
+    assert len(cache) == 2
+    found, cached = cache.get([1, 2, 3])
+    assert found.tolist() == [False, True, True]
+    assert np.array_equal(cached, vectors([2] * DIM, [3] * DIM))
+    assert len(EmbeddingCache("model", DIM, str(tmp_path))) == 2
+
+
+def test_only_uncached_chunks_are_encoded(tmp_path):
+    pytest.importorskip("faiss")
+    pytest.importorskip("qdrant_client")
+    from backend.faiss_store import FaissStore
+    from backend.qdrant_handler import embed_and_upload, point_id
+    from test_ingest import DIM as STORE_DIM, HashEncoder, chunk
+
+    cache = EmbeddingCache("model", STORE_DIM, str(tmp_path / "cache"))
+    db = FaissStore(str(tmp_path / "faiss"), dim=STORE_DIM)
+    try:
+        first = HashEncoder()
+        embed_and_upload(db, [chunk("a paragraph"), chunk("b paragraph")], model=first, cache=cache,
+                         skip_existing=False)
+        second = HashEncoder()
+        embed_and_upload(db, [chunk("b paragraph"), chunk("c paragraph")], model=second, cache=cache,
+                         skip_existing=False)
+    finally:
+        db.close()
+    assert sorted(first.encoded) == ["a paragraph", "b paragraph"]
+    assert second.encoded == ["c paragraph"]
+    assert cache.get([chunk_key(point_id("b paragraph"))])[0].all()
@@ -0,0 +1,86 @@
+import shutil
+
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+from backend import faiss_store
+from backend.faiss_store import FaissStore
+
+DIM = 96  # a multiple of PQ_M
+N = 2000
+
+
+@pytest.fixture(scope="module")
+def points():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(N, DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [f"{i:016x}" * 2 for i in range(1, N + 1)]  # the store keys points by their first 16 hex digits
+    # 20 points of country "FR", the rest split between two other countries
+    payloads = [{"title": f"Article {i // 4}", "revid": 1, "country": ["FR" if i % 100 == 0 else f"C{i % 2}"],
+                 "pair": None, "text": f"chunk {i}"} for i in range(N)]
+    return ids, vectors, payloads
+
+
+def build(path, index_type, points):
+    ids, vectors, payloads = points
+    store = FaissStore(str(path), index_type, DIM)
+    for i in range(0, N, 500):
+        store.upsert(ids[i:i + 500], vectors[i:i + 500], payloads[i:i + 500])
+    return store
+
+
+def exact_top(points, query, k, rows=None):
+    ids, vectors, _ = points
+    rows = np.arange(N) if rows is None else rows
+    return [ids[i] for i in rows[np.argsort(-(vectors[rows] @ query))[:k]]]
+
+
+@pytest.mark.parametrize("index_type", ["hnsw", "ivfpq"])
+def test_narrow_filter_returns_the_exact_top_k(tmp_path, monkeypatch, points, index_type):
+    monkeypatch.setattr(faiss_store, "IVF_TRAIN_SIZE", 1000)
+    store = build(tmp_path, index_type, points)
+    fr = np.arange(0, N, 100)
+    for query in points[1][[3, 500, 1999]]:
+        hits = store.search(query, 10, {"country": "FR"})
+        assert [hit.id for hit in hits] == exact_top(points, query, 10, fr)
+        assert all(hit.payload["country"] == ["FR"] for hit in hits)
+    store.close()
+
+
+def test_ivfpq_candidates_are_rescored_with_stored_vectors(tmp_path, monkeypatch, points):
+    monkeypatch.setattr(faiss_store, "IVF_TRAIN_SIZE", 1000)
+    build(tmp_path, "ivfpq", points).close()
+
+    store = FaissStore(str(tmp_path), read_only=True)
+    assert store._is_ivf()
+    recalls = []
+    for query in points[1][:50]:
+        hits = store.search(query, 10)
+        # Scores are exact inner products of the float16 vectors, not PQ estimates
+        expected = points[1][[int(hit.id[:16], 16) - 1 for hit in hits]].astype(np.float16).astype(np.float32) @ query
+        assert np.allclose([hit.score for hit in hits], expected, atol=1e-3)
+        recalls.append(len({hit.id for hit in hits} & set(exact_top(points, query, 10))) / 10)
+    assert np.mean(recalls) > 0.8
+    store.close()
+
+
+def test_ivfpq_store_without_stored_vectors_still_searches(tmp_path, monkeypatch, points):
+    monkeypatch.setattr(faiss_store, "IVF_TRAIN_SIZE", 1000)
+    build(tmp_path, "ivfpq", points).close()
+    shutil.rmtree(tmp_path / "vectors")  # a store written before the float16 vectors were kept
+
+    store = FaissStore(str(tmp_path))
+    assert len(store.search(points[1][0], 10)) == 10
+    assert len(store.search(points[1][0], 10, {"country": "FR"})) == 10
+    store.close()
+
+
+def test_deleted_points_leave_the_stored_vectors(tmp_path, monkeypatch, points):
+    monkeypatch.setattr(faiss_store, "IVF_TRAIN_SIZE", 1000)
+    store = build(tmp_path, "ivfpq", points)
+    store.delete_ids(points[0][:N // 2])
+    store.close()
+    assert len(FaissStore(str(tmp_path)).vectors) == N // 2
@@ -0,0 +1,9 @@
+import pytest
+
+from backend.benchmarks import IMPORT_BUDGETS, benchmark_import_time
+
+
+@pytest.mark.parametrize("module, budget", IMPORT_BUDGETS.items())
+def test_import_budget(module, budget):
+    # Within budget, and none of DEFERRED_MODULES (torch, qdrant_client, ...) loaded
+    assert benchmark_import_time({module: budget}) == []
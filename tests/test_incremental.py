@@ -0,0 +1,102 @@
+import csv
+import json
+
+import pytest
+
+from backend.wikipedia_downloader_cleaner import (
+    compute_delta,
+    delta_path,
+    load_manifest,
+    merge_raw_corpus,
+    stream_corpus
+)
+
+
+def write_jsonl(path, rows):
+    with open(path, 'w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+
+def read_jsonl(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_compute_delta():
+    manifest = {"articles": {"A": 1, "B": 2, "C": 3}, "tombstones": {}}
+    index = {"A": 1, "B": 5, "D": 4}
+    assert compute_delta(index, manifest) == {"added": ["D"], "changed": ["B"], "removed": ["C"]}
+    # An older revid in the index (e.g. a stale crawl) is not a change
+    assert compute_delta({"A": 0, "B": 2, "C": 3}, manifest) == {"added": [], "changed": [], "removed": []}
+
+
+def test_delta_path():
+    assert delta_path("rag_corpus_raw.jsonl") == "rag_corpus_raw.delta.jsonl"
+    assert delta_path("out/chunks.arrow") == "out/chunks.delta.arrow"
+
+
+def test_merge_raw_corpus(tmp_path):
+    corpus, delta = tmp_path / "raw.jsonl", tmp_path / "raw.delta.jsonl"
+    write_jsonl(corpus, [{"title": "A", "revid": 1, "raw_content": "a"},
+                         {"title": "B", "revid": 2, "raw_content": "b"},
+                         {"title": "C", "revid": 3, "raw_content": "c"}])
+    with open(corpus, 'a', encoding='utf-8') as f:
+        f.write("not json\n")
+    write_jsonl(delta, [{"title": "B", "revid": 5, "raw_content": "b2"},
+                        {"title": "D", "revid": 4, "raw_content": "d"}])
+
+    merge_raw_corpus(str(corpus), str(delta), replaced={"B", "C", "D"})
+    assert read_jsonl(corpus) == [{"title": "A", "revid": 1, "raw_content": "a"},
+                                  {"title": "B", "revid": 5, "raw_content": "b2"},
+                                  {"title": "D", "revid": 4, "raw_content": "d"}]
+    assert not (tmp_path / "raw.jsonl.tmp").exists()
+
+
+def test_merge_into_missing_corpus(tmp_path):
+    delta = tmp_path / "raw.delta.jsonl"
+    write_jsonl(delta, [{"title": "A", "revid": 1, "raw_content": "a"}])
+    merge_raw_corpus(str(tmp_path / "raw.jsonl"), str(delta), replaced={"A"})
+    assert read_jsonl(tmp_path / "raw.jsonl") == read_jsonl(delta)
+
+
+def test_incremental_refresh_against_mock_api(tmp_path):
+    pytest.importorskip("pandas")
+    from backend.mock_mediawiki import MockMediaWikiServer, build_synthetic_wiki
+
+    wiki = build_synthetic_wiki(n_countries=4, pages_per_category=3)
+    titles = sorted(wiki["pages"])[:8]
+    files = {name: str(tmp_path / name) for name in ("index.csv", "raw.jsonl", "manifest.json", "delta.json", "missing.json")}
+    options = dict(manifest_file=files["manifest.json"], delta_file=files["delta.json"],
+                   report_file=files["missing.json"], requests_per_second=None)
+
+    def index(rows):
+        with open(files["index.csv"], 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["title", "revid", "keep"])
+            writer.writerows((t, wiki["pages"][t]["revid"], "KEPT") for t in rows)
+
+    with MockMediaWikiServer(wiki, latency=0) as server:
+        index(titles[:6])
+        assert len(list(stream_corpus(files["index.csv"], files["raw.jsonl"], api_url=server.url, **options))) == 6
+
+        # One article edited, one removed from the index, one new
+        changed, removed, added = titles[1], titles[2], titles[6]
+        wiki["pages"][changed] = {**wiki["pages"][changed], "revid": wiki["pages"][changed]["revid"] + 1,
+                                  "content": "Edited content."}
+        index([t for t in titles[:6] if t != removed] + [added])
+        fetched = list(stream_corpus(files["index.csv"], files["raw.jsonl"], api_url=server.url,
+                                     incremental=True, **options))
+
+    assert [row["title"] for row in fetched] == [added, changed]
+    with open(files["delta.json"], encoding='utf-8') as f:
+        delta = json.load(f)
+    assert (delta["added"], delta["changed"], delta["removed"]) == ([added], [changed], [removed])
+    assert delta["raw_file"] == delta_path(files["raw.jsonl"])
+
+    corpus = {row["title"]: row for row in read_jsonl(files["raw.jsonl"])}
+    assert sorted(corpus) == sorted(t for t in titles[:7] if t != removed)
+    assert corpus[changed]["raw_content"] == "Edited content."
+    manifest = load_manifest(files["manifest.json"])
+    assert manifest["articles"] == {t: row["revid"] for t, row in corpus.items()}
+    assert removed in manifest["tombstones"]
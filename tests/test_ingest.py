@@ -0,0 +1,142 @@
+import hashlib
+
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("qdrant_client")
+
+from backend import chunk_handler
+from backend.chunk_handler import ChunkDeduplicator, HashStore, chunk_records, hash_value
+from backend.faiss_store import FaissStore
+from backend.qdrant_handler import embed_and_upload, garbage_collect, point_id, remove_stale_points
+
+DIM = 8
+
+
+class HashEncoder:
+    """Deterministic vectors from the text hash, and the texts it was asked to encode."""
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, **_):
+        self.encoded.extend(texts)
+        seeds = [int(hashlib.md5(t.encode()).hexdigest()[:8], 16) for t in texts]
+        return np.array([np.random.RandomState(s).rand(DIM) for s in seeds], dtype=np.float32).reshape(-1, DIM)
+
+    def close(self):
+        pass
+
+
+def chunk(text, title="France–Germany relations", revid=1):
+    return {"id": point_id(text), "title": title, "text": text,
+            "metadata": {"source": title, "type": "geopolitical_event", "revid": revid}}
+
+
+def ingest(db, chunks, hashes=None, gc=True):
+    encoder = HashEncoder()
+    embed_and_upload(db, chunks, model=encoder, hashes=hashes)
+    if gc:
+        garbage_collect(db, {c["id"] for c in chunks})
+    return encoder
+
+
+@pytest.fixture
+def db(tmp_path):
+    store = FaissStore(str(tmp_path / "faiss"), dim=DIM)
+    yield store
+    store.close()
+
+
+def test_hash_store_roundtrip(tmp_path):
+    path = str(tmp_path / "hashes.u64")
+    store = HashStore(path)
+    values = [hash_value(point_id(t)) for t in ("a", "b", "c")]
+    store.add(values[0])
+    store.add(values[1])
+    assert values[0] in store and values[2] not in store
+    store.save()
+    reopened = HashStore(path)
+    assert len(reopened) == 2 and values[1] in reopened and values[2] not in reopened
+
+
+def test_ingested_chunks_are_still_written(tmp_path, monkeypatch):
+    path = str(tmp_path / "hashes.u64")
+    store = HashStore(path)
+    store.add(hash_value(point_id("old paragraph")))
+    store.save()
+
+    dedup = ChunkDeduplicator(path, count_tokens=len)
+    assert dedup.check(point_id("old paragraph"), "old paragraph") == "ingested"
+    assert dedup.check(point_id("new paragraph"), "new paragraph") == "kept"
+    assert dedup.check(point_id("old paragraph"), "old paragraph") == "duplicate"
+    assert dedup.stats["ingested"] == [1, len("old paragraph")]
+
+    monkeypatch.setattr(chunk_handler, "make_splitter", lambda kind: None)
+    monkeypatch.setattr(chunk_handler, "_split_with", lambda splitter, record: [("old paragraph", None), ("new paragraph", None)])
+    records = [{"title": "France–Germany relations", "revid": 2, "text": "x"}]
+    written = list(chunk_records(records, ChunkDeduplicator(path, count_tokens=len)))
+    assert [c["text"] for c in written] == ["old paragraph", "new paragraph"]
+    assert all(c["metadata"]["revid"] == 2 for c in written)
+
+
+def test_gc_keeps_unchanged_chunks_and_relabels_them(db, tmp_path):
+    hashes = HashStore(str(tmp_path / "hashes.u64"))
+    first = [chunk("kept paragraph"), chunk("dropped paragraph")]
+    assert sorted(ingest(db, first, hashes).encoded) == ["dropped paragraph", "kept paragraph"]
+    hashes.save()
+    assert hash_value(point_id("kept paragraph")) in HashStore(hashes.path)
+
+    second = [chunk("kept paragraph", revid=2), chunk("new paragraph", revid=2)]
+    encoder = ingest(db, second, HashStore(hashes.path))
+    assert encoder.encoded == ["new paragraph"]
+    assert set(db.iter_ids()) == {point_id("kept paragraph"), point_id("new paragraph")}
+    assert db.retrieve([point_id("kept paragraph")])[point_id("kept paragraph")]["revid"] == 2
+
+
+def test_stale_revision_delete_keeps_unchanged_chunks(db, tmp_path):
+    delta = tmp_path / "delta.json"
+    delta.write_text('{"changed": ["France–Germany relations"], "removed": []}')
+    ingest(db, [chunk("kept paragraph"), chunk("dropped paragraph")], gc=False)
+
+    second = [chunk("kept paragraph", revid=2), chunk("new paragraph", revid=2)]
+    ingest(db, second, gc=False)
+    remove_stale_points(db, str(delta), {"France–Germany relations": 2}, {}, None)
+    assert set(db.iter_ids()) == {point_id("kept paragraph"), point_id("new paragraph")}
+
+
+def test_unknown_hash_is_uploaded_without_lookup(db, tmp_path):
+    hashes = HashStore(str(tmp_path / "hashes.u64"))
+    lookups = []
+    retrieve = db.retrieve
+    db.retrieve = lambda ids: lookups.append(list(ids)) or retrieve(ids)  # counts the lookups
+    ingest(db, [chunk("a paragraph")], hashes)
+    assert lookups == []
+    ingest(db, [chunk("a paragraph", revid=3)], hashes)
+    assert lookups == [[point_id("a paragraph")]]
+    assert db.retrieve([point_id("a paragraph")])[point_id("a paragraph")]["revid"] == 3
+
+
+def test_unchanged_chunks_are_skipped(db):
+    ingest(db, [chunk("a paragraph"), chunk("b paragraph")])
+    updates = []
+    db.set_payload = lambda ids, payload: updates.append((ids, payload))
+    encoder = ingest(db, [chunk("a paragraph"), chunk("b paragraph"), chunk("c paragraph")])
+    assert encoder.encoded == ["c paragraph"]
+    assert updates == []
+
+
+def test_text_shared_with_another_title_keeps_its_point(db, tmp_path, capsys):
+    first, other = "France–Germany relations", "France–Italy relations"
+    ingest(db, [chunk("shared paragraph", title=first), chunk("own paragraph", title=first)], gc=False)
+    encoder = ingest(db, [chunk("shared paragraph", title=other, revid=7)], gc=False)
+    assert encoder.encoded == []
+    assert "shared with another title 1" in capsys.readouterr().out
+    assert db.retrieve([point_id("shared paragraph")])[point_id("shared paragraph")] == {"title": first, "revid": 1}
+
+    # A new revision of the other article does not take the point away from the first
+    delta = tmp_path / "delta.json"
+    delta.write_text(f'{{"changed": ["{other}"], "removed": []}}')
+    remove_stale_points(db, str(delta), {other: 7}, {}, None)
+    assert set(db.iter_ids()) == {point_id("shared paragraph"), point_id("own paragraph")}
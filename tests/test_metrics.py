@@ -0,0 +1,45 @@
+from backend.metrics import METRIC_PREFIX, Histogram, MetricsRegistry
+
+
+def test_histogram_percentiles():
+    h = Histogram(buckets=(0.01, 0.1, 1.0))
+    for latency in [0.005] * 50 + [0.05] * 45 + [0.5] * 4 + [2.0]:
+        h.observe(latency)
+    # Each quantile is the upper bound of its bucket, and the largest value past the last bound
+    assert h.quantile(0.5) == 0.01
+    assert h.quantile(0.95) == 0.1
+    assert h.quantile(0.99) == 1.0
+    assert h.quantile(1.0) == 2.0
+    summary = h.summary()
+    assert summary["count"] == 100 and summary["max"] == 2.0
+    assert abs(summary["mean"] - (0.25 + 2.25 + 2.0 + 2.0) / 100) < 1e-12
+    assert (summary["p50"], summary["p95"], summary["p99"]) == (0.01, 0.1, 1.0)
+
+
+def test_quantile_capped_at_largest_value():
+    h = Histogram(buckets=(0.01, 0.1, 1.0))
+    h.observe(0.02)
+    assert h.quantile(0.5) == 0.02
+
+
+def test_prometheus_histogram_lines():
+    registry = MetricsRegistry()
+    for latency in (0.003, 0.03, 0.03, 0.3):
+        registry.observe("query_seconds", latency, api="search")
+    registry.inc("queries_total", 4, api="search")
+    lines = registry.prometheus().splitlines()
+    metric = METRIC_PREFIX + "query_seconds"
+
+    assert f"# TYPE {metric} histogram" in lines
+    assert f'{metric}_bucket{{api="search",le="0.005"}} 1' in lines
+    assert f'{metric}_bucket{{api="search",le="0.05"}} 3' in lines
+    assert f'{metric}_bucket{{api="search",le="0.5"}} 4' in lines
+    assert f'{metric}_bucket{{api="search",le="+Inf"}} 4' in lines
+    assert f'{metric}_count{{api="search"}} 4' in lines
+    sum_line = next(line for line in lines if line.startswith(f"{metric}_sum"))
+    assert abs(float(sum_line.split()[-1]) - 0.363) < 1e-9
+    assert f'{METRIC_PREFIX}queries_total{{api="search"}} 4' in lines
+
+    snapshot = registry.snapshot()
+    assert snapshot["histograms"]["query_seconds{api=search}"]["p50"] == 0.05
+    assert snapshot["counters"]["queries_total{api=search}"] == 4
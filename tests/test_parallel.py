@@ -0,0 +1,44 @@
+import functools
+import os
+import time
+
+from backend.parallel import iter_chunks, ordered_pool_map, timed_task
+
+CHUNK_SIZE = 3
+MAX_PENDING = 4
+
+
+def slow_square(chunk):
+    # Some chunks are slow, so later ones finish first
+    time.sleep(0.02 * (chunk[0] % 5 == 0))
+    return [x * x for x in chunk]
+
+
+def test_iter_chunks():
+    assert list(iter_chunks(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(iter_chunks([], 3)) == []
+
+
+def test_results_keep_input_order_with_bounded_reads():
+    read = []
+
+    def items():
+        for x in range(50):
+            read.append(x)
+            yield x
+
+    results = []
+    for size, squares in ordered_pool_map(slow_square, items(), workers=2, chunk_size=CHUNK_SIZE,
+                                          max_pending_chunks=MAX_PENDING):
+        results.extend(squares)
+        # The input is read at most MAX_PENDING chunks ahead of what was handed back
+        assert len(read) <= len(results) + MAX_PENDING * CHUNK_SIZE
+        assert size == len(squares)
+    assert results == [x * x for x in range(50)]
+
+
+def test_timed_task_reports_the_worker():
+    task = functools.partial(timed_task, abs, abs)
+    ((results, pid, seconds, total),) = [r for _, r in ordered_pool_map(task, [-1, -2, 3], workers=1)]
+    assert results == [1, 2, 3] and total == 6
+    assert pid != os.getpid() and seconds >= 0
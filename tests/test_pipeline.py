@@ -0,0 +1,48 @@
+import pytest
+
+from backend import chunk_handler, pipeline
+from backend.chunk_handler import ChunkDeduplicator
+from backend.mock_mediawiki import build_synthetic_wiki
+from backend.pipeline import stream_chunks
+
+
+class SentenceSplitter:
+    """Stands for the token window chunker (whose encoding is downloaded on first use)."""
+
+    def split_text(self, text):
+        return [s.strip() + "." for s in text.split(".") if s.strip()]
+
+
+@pytest.fixture
+def articles(monkeypatch):
+    # Set before the pool starts, so its forked workers split the same way
+    monkeypatch.setattr(chunk_handler, "make_splitter", lambda kind: SentenceSplitter())
+    wiki = build_synthetic_wiki(n_countries=5, pages_per_category=2)
+    pages = [{"title": t, "revid": p["revid"], "raw_content": p["content"]} for t, p in sorted(wiki["pages"].items())]
+    # A duplicated article, and one too short to keep once cleaned
+    return pages + [dict(pages[0], title="Copy"), {"title": "Stub", "revid": 1, "raw_content": "{{stub}} Short."}]
+
+
+def run(articles, tmp_path, workers):
+    clean_file = tmp_path / f"clean_{workers}.txt"
+    chunks = list(stream_chunks(articles, clean_file=str(clean_file), workers=workers,
+                                dedup=ChunkDeduplicator(count_tokens=len)))
+    return chunks, clean_file.read_text(encoding='utf-8')
+
+
+def test_one_pool_gives_the_serial_output(articles, tmp_path, monkeypatch):
+    pools = []
+    pool_map = pipeline.ordered_pool_map
+    monkeypatch.setattr(pipeline, "ordered_pool_map", lambda task, items, workers, *args, **kwargs:
+                        pools.append(workers) or pool_map(task, items, workers, *args, **kwargs))
+
+    serial_chunks, serial_clean = run(articles, tmp_path, 1)
+    assert pools == []
+    pooled_chunks, pooled_clean = run(articles, tmp_path, 3)
+    # Cleaning and splitting share one pool of `workers` processes
+    assert pools == [3]
+
+    assert pooled_chunks == serial_chunks
+    assert pooled_clean == serial_clean
+    assert "Stub" not in serial_clean
+    assert serial_chunks and not any(c["title"] == "Copy" for c in serial_chunks)
@@ -0,0 +1,47 @@
+import pytest
+
+pytest.importorskip("qdrant_client")
+
+import main
+from backend import bm25_index, countries, input_handler, pipeline, qdrant_handler, wikipedia_downloader_cleaner
+
+
+class FakePairIndex:
+    articles = {}
+
+    @classmethod
+    def load(cls, path):
+        return cls()
+
+    def update(self, other, drop_titles):
+        pass
+
+    def save(self, path):
+        pass
+
+
+def test_refresh_rejects_stage_selection():
+    with pytest.raises(SystemExit):
+        main.parse_args(["--refresh", "--from", "chunk"])
+    with pytest.raises(SystemExit):
+        main.parse_args(["--refresh", "--gate-latency"])
+    assert main.parse_args(["--refresh", "--workers", "3", "--store", "faiss"]).workers == 3
+
+
+def test_refresh_passes_the_run_options(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    calls = {}
+    monkeypatch.setattr(wikipedia_downloader_cleaner, "download_corpus", lambda **kwargs: 0)
+    monkeypatch.setattr(wikipedia_downloader_cleaner, "load_delta",
+                        lambda path: {"added": [], "changed": ["A"], "removed": [], "raw_file": "raw.delta.jsonl"})
+    monkeypatch.setattr(pipeline, "run_pipeline", lambda **kwargs: calls.setdefault("pipeline", kwargs))
+    monkeypatch.setattr(qdrant_handler, "ingest_to_qdrant", lambda path, **kwargs: calls.setdefault("ingest", kwargs))
+    monkeypatch.setattr(bm25_index, "merge_bm25_index", lambda *args, **kwargs: None)
+    monkeypatch.setattr(countries, "PairIndex", FakePairIndex)
+
+    input_handler.refresh_corpus(workers=3, backend="pool", store="faiss", profile="int8")
+    assert calls["pipeline"]["workers"] == 3
+    assert {k: calls["ingest"][k] for k in ("backend", "store", "profile")} == \
+        {"backend": "pool", "store": "faiss", "profile": "int8"}
+    # The run is reported like a stage run
+    assert list((tmp_path / "metrics").glob("run_*.json"))
@@ -0,0 +1,95 @@
+import json
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from backend import retrieval_benchmark
+from backend.retrieval_benchmark import compare_runs, latest_run, load_baseline, promote_baseline, run_retrieval_benchmark
+
+GOLDEN = {"version": 1, "queries": [
+    {"id": "a", "query": "france germany", "relevant": {"France–Germany relations": 2}},
+    {"id": "b", "query": "france italy", "relevant": {"France–Italy relations": 2, "France–Germany relations": 1}},
+]}
+
+
+def _later_clock(seconds):
+    # Distinct timestamps, so every run gets its own results file
+    class Clock(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime(2026, 1, 1, tzinfo=timezone.utc) + timedelta(seconds=seconds)
+    return Clock
+
+
+@pytest.fixture(autouse=True)
+def fixed_clock(monkeypatch):
+    monkeypatch.setattr(retrieval_benchmark, "datetime", _later_clock(0))
+
+
+class FakeService:
+    """Ranks the same titles for every query."""
+
+    default_mode = "dense"
+
+    def __init__(self, titles):
+        self.titles = titles
+
+    def search(self, query, k, mode=None):
+        return [SimpleNamespace(payload={"title": t}) for t in self.titles[:k]]
+
+    def search_batch(self, queries, k, mode=None):
+        return [self.search(q, k, mode) for q in queries]
+
+
+def run(tmp_path, titles, **kwargs):
+    golden = tmp_path / "golden.json"
+    golden.write_text(json.dumps(GOLDEN), encoding='utf-8')
+    return run_retrieval_benchmark(golden_file=str(golden), results_dir=str(tmp_path / "results"),
+                                   baseline_file=str(tmp_path / "baseline.json"), service=FakeService(titles),
+                                   **kwargs)
+
+
+def test_latency_only_warns_unless_gated():
+    baseline = {"quality": {"recall@5": 0.9}, "latency": {"p50_ms": 10.0, "batch_qps": 100.0}}
+    slower = {"quality": {"recall@5": 0.9}, "latency": {"p50_ms": 20.0, "batch_qps": 50.0}}
+    regressions, warnings = compare_runs(slower, baseline)
+    assert regressions == [] and len(warnings) == 2
+    regressions, warnings = compare_runs(slower, baseline, gate_latency=True)
+    assert len(regressions) == 2 and warnings == []
+
+    worse = {"quality": {"recall@5": 0.8}, "latency": baseline["latency"]}
+    assert compare_runs(worse, baseline) == (["recall@5 dropped 0.900 -> 0.800 (threshold 0.03)"], [])
+
+
+def test_runs_compare_with_the_pinned_baseline_only(tmp_path, monkeypatch):
+    good = ["France–Germany relations", "France–Italy relations"]
+    first, regressions = run(tmp_path, good)
+    assert first["baseline"] is None and regressions == []
+
+    # Without a pinned baseline the previous run is not used as one
+    monkeypatch.setattr(retrieval_benchmark, "datetime", _later_clock(1))
+    worse, regressions = run(tmp_path, ["Unrelated", "Other"])
+    assert worse["baseline"] is None and regressions == []
+
+    promote_baseline(latest_run(str(tmp_path / "results")), str(tmp_path / "baseline.json"))
+    pinned = load_baseline(worse["config"], str(tmp_path / "baseline.json"))
+    assert pinned["quality"] == worse["quality"] and "per_query" not in pinned
+
+    # Promoting another run of the same config replaces the pinned one
+    monkeypatch.setattr(retrieval_benchmark, "datetime", _later_clock(2))
+    run(tmp_path, good)
+    promote_baseline(latest_run(str(tmp_path / "results")), str(tmp_path / "baseline.json"))
+    with open(tmp_path / "baseline.json", encoding='utf-8') as f:
+        assert len(json.load(f)["baselines"]) == 1
+
+    monkeypatch.setattr(retrieval_benchmark, "datetime", _later_clock(3))
+    last, regressions = run(tmp_path, ["Unrelated", "Other"])
+    assert last["baseline"].startswith(str(tmp_path / "baseline.json"))
+    assert regressions and all("dropped" in r for r in regressions)
+
+
+def test_baseline_of_another_config_is_ignored(tmp_path):
+    first, _ = run(tmp_path, ["France–Germany relations"])
+    promote_baseline(latest_run(str(tmp_path / "results")), str(tmp_path / "baseline.json"))
+    assert load_baseline({**first["config"], "golden_version": 2}, str(tmp_path / "baseline.json")) is None
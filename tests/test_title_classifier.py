@@ -0,0 +1,67 @@
+import random
+import re
+import sys
+
+import pytest
+
+pytest.importorskip("ahocorasick")
+
+from backend.create_wikipedia_index import categorize_title
+from backend.title_classifier import _IGNORECASE_FOLD, TITLE_RULES, TitleClassifier, classify_rows
+
+# Case variants and look-alikes on which str.lower, str.casefold and re.IGNORECASE disagree
+TRICKY_TITLES = [
+    "FİLM partnership", "ﬁlm partnership", "ſport treaty", "ſſ", "parK treaty",
+    "FLİGHT relations", "flıght relations", "FLIGHT relations", "Swiss Air Flight 111 treaty",
+    "Straße treaty", "STRASSE", "Filmmaker visit", "film_festival treaty", "gas_pipe", "Gas-field",
+    "Raid on X", "Oil crisis", "Act", "X–Y Cup", "İstanbul pact", "Party-time", "", "Cold War",
+    "GREAT GAME", "Great Gaме", "µ-war", "ΣΑΣ relations", "Ⅷ war",
+]
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    return TitleClassifier()
+
+
+def test_fold_table_matches_ignorecase():
+    # Every character re.IGNORECASE matches to an ASCII letter, and no other, is folded
+    chars = "".join(map(chr, range(sys.maxunicode + 1)))
+    expected = {c: c.lower() if c.isascii() else next(a for a in "abcdefghijklmnopqrstuvwxyz" if re.fullmatch(a, c, re.I))
+                for c in re.findall("[a-z]", chars, re.I) if c not in "abcdefghijklmnopqrstuvwxyz"}
+    assert {chr(k): v for k, v in _IGNORECASE_FOLD.items()} == expected
+
+
+@pytest.mark.parametrize("title", TRICKY_TITLES)
+def test_matches_reference_on_tricky_titles(classifier, title):
+    assert classifier.classify(title)[0] == categorize_title(title)
+
+
+def test_matches_reference_on_random_titles(classifier):
+    rng = random.Random(0)
+    keywords = [k for _, _, substrings, words in TITLE_RULES for k in [*substrings, *words]]
+    odd = ["İ", "ı", "ſ", "K", "ﬁ", "ß", "_", "-", " ", "–", "é", "1", "x", "S", "K"]
+    titles = []
+    for _ in range(3000):
+        parts = []
+        for _ in range(rng.randint(1, 4)):
+            keyword = rng.choice(keywords)
+            keyword = "".join(c.upper() if rng.random() < 0.3 else c for c in keyword)
+            keyword = keyword.replace("i", rng.choice(["i", "İ", "ı"])).replace("s", rng.choice(["s", "ſ"]))
+            parts.append(keyword)
+            parts.append("".join(rng.choice(odd) for _ in range(rng.randint(0, 2))))
+        titles.append("".join(parts))
+    labels, _ = classifier.classify_batch(titles)
+    assert labels == [categorize_title(t) for t in titles]
+
+
+def test_rules_and_invalid_titles(classifier):
+    labels, rules = classifier.classify_batch(["Cold War", "Swiss Air flight war", "Foo", None, "Film festival"])
+    assert labels == ["KEPT", "IGNORED", "IGNORED", "IGNORED", "IGNORED"]
+    assert rules == ["priority:cold war", "flight:flight", "default", "invalid", "noise:film"]
+
+
+def test_classify_rows_in_place():
+    rows = [{"title": "France–Algeria relations", "revid": 1}]
+    assert classify_rows(rows) is rows
+    assert rows[0]["keep"] == "KEPT" and rows[0]["rule"] == "interest:relations"